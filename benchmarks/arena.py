@@ -0,0 +1,81 @@
+#----------------------------------------------------------------------
+# "Synthetic arena"
+#
+# Description: Draws arena frames with robots carrying the markers of
+# marcadores.pdf (a body circle of the robot color and a yellow circle of
+# the same size touching it) at known positions and orientations.
+#----------------------------------------------------------------------
+import math
+import numpy as np
+import cv2
+
+# BGR values inside the default thresholds (default.def_vals), far enough
+# from their limits to stand the noise and lighting of arena_frame
+bgr_colors = {'red': (0,0,150), 'green': (40,70,0), 'blue': (100,0,0),
+'yellow': (0,95,95)}
+
+# This module places n robots on a regular grid of the arena with random
+# orientations. Colors cycle through the given list. It returns a list of
+# [row, column, orientation, color] (orientation in degrees, 0 to the
+# right of the image and 90 to the top). jitter moves each robot randomly
+# inside its grid cell (fraction of the cell size).
+def grid_poses(n, width, height, colors, seed=0, jitter=0.0):
+	random = np.random.RandomState(seed)
+	cols = int(math.ceil(math.sqrt(n * float(height) / width)))
+	rows = int(math.ceil(n / float(cols)))
+	poses = []
+	for k in range(n):
+		row = int((k / cols + 0.5 + jitter * random.uniform(-0.5, 0.5)) * \
+		width / rows)
+		col = int((k % cols + 0.5 + jitter * random.uniform(-0.5, 0.5)) * \
+		height / cols)
+		poses.append([row, col, int(random.randint(0, 360)), \
+		colors[k % len(colors)]])
+	return poses
+
+# This module draws the robots of the poses over a gray background
+def robot_frame(width, height, poses, radius=6, background=40):
+	image = np.full((width, height, 3), background, np.uint8)
+	for row, col, angle, color in poses:
+		yellow = (int(round(col + 2 * radius * math.cos(math.radians(angle)))),
+		int(round(row - 2 * radius * math.sin(math.radians(angle)))))
+		cv2.circle(image, (col, row), radius, bgr_colors[color], -1)
+		cv2.circle(image, yellow, radius, bgr_colors['yellow'], -1)
+	return image
+
+# This module draws a less ideal arena: clutter (objects that are not
+# markers), uneven lighting and camera noise.
+#  - clutter: number of objects. Half are gray or white patches (tape,
+#    cables), half are specks of the marker colors smaller than a marker.
+#  - lighting: brightness changes linearly from 1 - lighting on the left
+#    of the image to 1 + lighting on the right.
+#  - noise: standard deviation of the gaussian noise of each channel.
+def arena_frame(width, height, poses, radius=6, background=40, noise=0.0, \
+lighting=0.0, clutter=0, seed=0):
+	random = np.random.RandomState(seed)
+	image = np.full((width, height, 3), background, np.uint8)
+	names = ['red', 'green', 'blue', 'yellow']
+	for k in range(clutter):
+		center = (int(random.randint(0, height)), int(random.randint(0, width)))
+		if k % 2 == 0:
+			gray = int(random.randint(90, 230))
+			size = (int(random.randint(radius, 6 * radius)), \
+			int(random.randint(1, radius)))
+			cv2.ellipse(image, center, size, int(random.randint(0, 180)), 0, \
+			360, (gray, gray, gray), -1)
+		else:
+			color = bgr_colors[names[random.randint(0, len(names))]]
+			cv2.circle(image, center, max(radius / 4, 1), color, -1)
+	
+	# Robots over the clutter
+	robots = robot_frame(width, height, poses, radius, background)
+	mask = np.any(robots != background, axis=2)
+	image[mask] = robots[mask]
+	
+	image = image.astype(np.float32)
+	if lighting != 0:
+		gain = np.linspace(1 - lighting, 1 + lighting, height, dtype=np.float32)
+		image *= gain[np.newaxis, :, np.newaxis]
+	if noise > 0:
+		image += random.normal(0, noise, image.shape).astype(np.float32)
+	return np.clip(image, 0, 255).astype(np.uint8)
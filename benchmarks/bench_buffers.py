@@ -0,0 +1,119 @@
+#----------------------------------------------------------------------
+# "Frame buffers benchmark"
+#
+# Description: Runs the detection (detect_frame) on a synthetic arena
+# with the frame buffers reused (default.reuse_buffers) and made again on
+# every frame, for several modes. For each one it prints the frames per
+# second, the allocations of the frame buffers per frame (frame_buffers),
+# all the NumPy data allocations per frame and their size (every array,
+# OpenCV images included: see numpy_allocations) and the minor page
+# faults per frame (memory the process touches for the first time: a new
+# big array makes them, a reused one does not). The first frames set the
+# sizes and are not counted.
+#
+# Usage: python benchmarks/bench_buffers.py [width height frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import ctypes
+import resource
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+from bench_pipeline import moving_poses
+
+# Configurations: name, multi robot, tracking, pyramid, multiple, radius
+modes = [['serial', False, False, False, 1.0, 6],
+['serial', False, False, False, 0.5, 12], ['tracking', False, True, False, \
+1.0, 6], ['pyramid', False, False, True, 0.5, 12], ['N robots', True, False, \
+False, 1.0, 6]]
+
+warm_up = 3
+
+# This class counts the data allocations of NumPy (the memory of every
+# array; the images OpenCV returns are NumPy arrays too) with the event
+# hook of its C API (PyDataMem_SetEventHook, entry 291 of the table). Small
+# blocks NumPy takes again from its cache of freed ones are not
+# allocations and are not seen.
+class numpy_allocations:
+
+	hook_type = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, \
+	ctypes.c_size_t, ctypes.c_void_p)
+
+	def __init__(self):
+		api = ctypes.pythonapi
+		api.PyCObject_AsVoidPtr.restype = ctypes.c_void_p
+		api.PyCObject_AsVoidPtr.argtypes = [ctypes.py_object]
+		table = ctypes.cast(api.PyCObject_AsVoidPtr( \
+		np.core.multiarray._ARRAY_API), ctypes.POINTER(ctypes.c_void_p))
+		self._set = ctypes.CFUNCTYPE(ctypes.c_void_p, self.hook_type, \
+		ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p))(table[291])
+		self._count, self._bytes = 0, 0
+		self._hook = self.hook_type(self.event)
+		self._old = ctypes.c_void_p()
+		self._set(self._hook, None, ctypes.byref(self._old))
+
+	# Called by NumPy on every allocation, reallocation and free
+	def event(self, old, new, size, user):
+		if new:
+			self._count += 1
+			self._bytes += size
+
+	# Allocations and bytes since the last call
+	def take(self):
+		counted = self._count, self._bytes
+		self._count, self._bytes = 0, 0
+		return counted
+
+	# Removing the hook (it must not be called after the exit)
+	def close(self):
+		self._set(self.hook_type(), None, ctypes.byref(self._old))
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	width, height, frames = (args + [480, 640, 40][len(args):])
+	thr_data = rt.threshold_data(rt.default.def_vals)
+	counter = numpy_allocations()
+
+	print 'Frame size = %dx%d' % (width, height)
+	print '   %-16s %6s %8s %8s %8s %10s %8s' % ('mode', 'reuse', 'fps', \
+	'buffers', 'numpy', 'numpy KB', 'faults')
+	for name, multi_robot, tracking, pyramid, multiple, radius in modes:
+		rt.default.multi_robot, rt.default.tracking = multi_robot, tracking
+		rt.default.pyramid, rt.default.multiple = pyramid, multiple
+		n = 10 if multi_robot else 3
+		poses = grid_poses(n, width, height, ['red', 'green', 'blue'], seed=n, \
+		jitter=0.4)
+		rt.default.robot_colors = [p[3] for p in poses]
+		sequence = moving_poses(poses, frames)
+		images = [arena_frame(width, height, sequence[f], radius, noise=4, \
+		lighting=0.15, clutter=20, seed=f) for f in range(frames)]
+
+		for reuse in [True, False]:
+			rt.default.reuse_buffers = reuse
+			rt.default.buffers = rt.frame_buffers()
+			state = rt.detection_state()
+			allocations, numpy_count, numpy_bytes, elapsed = [], 0, 0, 0.0
+			for f in range(frames):
+				if f == warm_up:
+					faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+					counter.take()
+				t1 = time.time()
+				rt.detect_frame(images[f], thr_data, state)
+				if f >= warm_up:
+					elapsed += time.time() - t1
+				allocations.append(rt.default.buffers.frame_allocations())
+			faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+			numpy_count, numpy_bytes = counter.take()
+			state.close()
+			counted = float(frames - warm_up)
+			print '   %-16s %6s %8.1f %8.1f %8.1f %10.1f %8.1f' % ('%s %.1f' % \
+			(name, multiple), reuse, counted / elapsed, \
+			np.mean(allocations[warm_up:]), numpy_count / counted, \
+			numpy_bytes / counted / 1024, faults / counted)
+	counter.close()
+	rt.default.reuse_buffers = True
+	rt.default.buffers = None
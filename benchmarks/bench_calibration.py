@@ -0,0 +1,209 @@
+#----------------------------------------------------------------------
+# "Calibration benchmark"
+#
+# Description: Simulates a tilted camera with barrel distortion over a
+# floor of 80x60 cm. Robots are placed at known floor poses, drawn on
+# the undistorted image and distorted like the lens would. It prints
+# the floor errors (cm, degrees) of camera_calibration.locate and of the
+# old model (one pixels/cm value, fitted at best), the time of locate
+# and of undistorting the whole frame (remap), and the time to make the
+# lookup map. Then calibrate runs on rendered chessboard views: it prints
+# the camera found and the errors of the distances between robots with
+# that calibration.
+#
+# Usage: python benchmarks/bench_calibration.py [frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import math
+import shutil
+import tempfile
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import arena_frame
+
+rows, cols = 480, 640
+matrix = np.array([[600.0, 0, 320], [0, 600.0, 240], [0, 0, 1]])
+distortion = np.array([-0.3, 0.1, 0, 0, 0])
+# Floor corners (cm) and where they are on the undistorted image (x, y)
+floor = np.float32([[0, 0], [80, 0], [80, 60], [0, 60]])
+image = np.float32([[70, 430], [570, 430], [500, 70], [140, 70]])
+to_image = cv2.getPerspectiveTransform(floor, image)
+
+# This module gives the maps to distort an undistorted image (remap)
+def lens_maps():
+	points = np.empty((rows, cols, 2), np.float64)
+	points[:, :, 0] = np.arange(cols)[None, :]
+	points[:, :, 1] = np.arange(rows)[:, None]
+	undistorted = cv2.undistortPoints(points.reshape(-1, 1, 2), matrix, \
+	distortion, P=matrix).reshape(rows, cols, 2).astype(np.float32)
+	return undistorted[:, :, 0], undistorted[:, :, 1]
+
+# This module gives the pixel (x, y) of the undistorted image of floor
+# points (cm)
+def floor_pixels(points):
+	return cv2.perspectiveTransform(np.float64(points).reshape(-1, 1, 2), \
+	to_image).reshape(-1, 2)
+
+# This module makes the camera image of robots at floor poses ([x, y,
+# orientation, color])
+def camera_frame(poses, maps, seed):
+	arena = []
+	for x, y, angle, color in poses:
+		body, ahead = floor_pixels([[x, y], [x + math.cos(math.radians(angle)), \
+		y + math.sin(math.radians(angle))]])
+		# Image orientation: counter-clockwise from the columns, rows up
+		image_angle = math.degrees(math.atan2(body[1] - ahead[1], \
+		ahead[0] - body[0]))
+		arena.append([int(round(body[1])), int(round(body[0])), image_angle, \
+		color])
+	img = arena_frame(rows, cols, arena, 7, noise=3, seed=seed)
+	return cv2.remap(img, maps[0], maps[1], cv2.INTER_LINEAR)
+
+# This module renders the chessboard (default.board) lying on the floor,
+# moved and turned (cm, degrees), with the camera of the given rotation
+# vector (a board held in front of the camera)
+def board_frame(maps, rvec=None, offset=(10, 10), turn=0):
+	columns, board_rows = rt.default.board
+	square = rt.default.board_square
+	texture = np.full(((board_rows + 3) * 20, (columns + 3) * 20), 255, np.uint8)
+	for r in range(board_rows + 1):
+		for c in range(columns + 1):
+			if (r + c) % 2 == 0:
+				texture[(r + 1) * 20:(r + 2) * 20, (c + 1) * 20:(c + 2) * 20] = 0
+	# Texture pixels to board cm (first inner corner at 0, 0)
+	to_board = np.array([[square / 20.0, 0, -2 * square], \
+	[0, square / 20.0, -2 * square], [0, 0, 1]])
+	if rvec is None:
+		a = math.radians(turn)
+		place = np.array([[math.cos(a), -math.sin(a), offset[0]], \
+		[math.sin(a), math.cos(a), offset[1]], [0, 0, 1]])
+		homography = to_image.dot(place).dot(to_board)
+	else:
+		rotation = cv2.Rodrigues(np.float64(rvec))[0]
+		pose = np.column_stack((rotation[:, :2], [-10, -8, 45]))
+		homography = matrix.dot(pose).dot(to_board)
+	ideal = cv2.warpPerspective(texture, homography, (cols, rows), \
+	borderValue=128)
+	img = cv2.remap(ideal, maps[0], maps[1], cv2.INTER_LINEAR, \
+	borderValue=128)
+	return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+# This module gives the floor errors of the robots found
+def floor_errors(colors, poses):
+	position, angle = [], []
+	for x in range(len(colors)):
+		if colors[x]._pix_number == 0 or len(colors[x]._floor) == 0:
+			continue
+		position.append(rt.euclidean_dist(colors[x]._floor, poses[x][:2]))
+		if colors[x]._correspondence >= 0:
+			diff = abs(colors[x]._floor_orientation - poses[x][2]) % 360
+			angle.append(min(diff, 360 - diff))
+	return position, angle
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	frames = (args + [20])[0]
+	rt.default.cache_dir = tempfile.mkdtemp()
+	thr_data = rt.threshold_data(rt.default.def_vals)
+	maps = lens_maps()
+	random = np.random.RandomState(1)
+
+	# Floor poses near the corners of the image (most distorted) and center
+	sequence = []
+	for f in range(frames):
+		places = [[8, 8], [72, 52], [40, 30]]
+		sequence.append([[px + random.uniform(-4, 4), py + random.uniform(-4, 4), \
+		random.randint(0, 360), color] for (px, py), color in zip(places, \
+		['red', 'green', 'blue'])])
+	images = [camera_frame(sequence[f], maps, f) for f in range(frames)]
+
+	calibration = rt.camera_calibration()
+	calibration._size, calibration._matrix = [cols, rows], matrix
+	calibration._distortion = distortion
+	calibration._homography = np.linalg.inv(to_image)
+	t1 = time.time()
+	calibration.lookup((rows, cols))
+	made = time.time() - t1
+	calibration._map = None
+	t1 = time.time()
+	calibration.lookup((rows, cols))
+	loaded = time.time() - t1
+
+	state = rt.detection_state()
+	position, angle, pixels, truth = [], [], [], []
+	locate_time, remap_time = 0.0, 0.0
+	undistort = cv2.initUndistortRectifyMap(matrix, distortion, None, matrix, \
+	(cols, rows), cv2.CV_16SC2)
+	for f in range(frames):
+		colors, yellow_colors = rt.detect_frame(images[f], thr_data, state)[:2]
+		t1 = time.time()
+		calibration.locate(colors, yellow_colors, images[f].shape)
+		locate_time += time.time() - t1
+		t1 = time.time()
+		cv2.remap(images[f], undistort[0], undistort[1], cv2.INTER_LINEAR)
+		remap_time += time.time() - t1
+		f_position, f_angle = floor_errors(colors, sequence[f])
+		position += f_position
+		angle += f_angle
+		for x in range(len(colors)):
+			if colors[x]._pix_number > 0:
+				pixels.append([colors[x]._center_mass[1], -colors[x]._center_mass[0]])
+				truth.append(sequence[f][x][:2])
+
+	# Old model: floor = image / pixels_cm + offset (best values)
+	pixels, truth = np.float64(pixels), np.float64(truth)
+	system = np.zeros((2 * len(pixels), 3))
+	system[0::2, 0], system[0::2, 1] = pixels[:, 0], 1
+	system[1::2, 0], system[1::2, 2] = pixels[:, 1], 1
+	fit = np.linalg.lstsq(system, truth.ravel(), rcond=None)[0]
+	old = np.sqrt(((system.dot(fit).reshape(-1, 2) - truth) ** 2).sum(axis=1))
+
+	print 'Robots found = %d/%d' % (len(truth), 3 * frames)
+	print '   %-28s mean %6.2f  max %6.2f' % ('calibration position (cm)', \
+	np.mean(position), np.max(position))
+	print '   %-28s mean %6.2f  max %6.2f' % ('calibration angle (deg)', \
+	np.mean(angle), np.max(angle))
+	print '   %-28s mean %6.2f  max %6.2f  (%.1f pixels/cm)' % \
+	('pixels/cm position (cm)', np.mean(old), np.max(old), 1 / fit[0])
+	print 'locate = %.1f us/frame, remap of the frame = %.2f ms/frame' % \
+	(locate_time / frames * 1e6, remap_time / frames * 1e3)
+	print 'lookup map: made in %.2f s, loaded in %.1f ms' % (made, loaded * 1e3)
+
+	# Calibrating with chessboard views
+	folder = tempfile.mkdtemp()
+	views = [[0, 0, 0], [0.4, 0, 0], [-0.4, 0, 0], [0, 0.4, 0], [0, -0.4, 0], \
+	[0.3, 0.3, 0.2], [-0.3, 0.3, -0.2], [0.3, -0.3, 0.4], [-0.3, -0.2, -0.4]]
+	for k in range(len(views)):
+		cv2.imwrite(os.path.join(folder, 'view%d.png' % k), \
+		board_frame(maps, views[k]))
+	floor_name = os.path.join(rt.default.cache_dir, 'floor.png')
+	cv2.imwrite(floor_name, board_frame(maps, offset=(30, 20), turn=10))
+	found = rt.calibrate(folder, floor_name, os.path.join(folder, 'cal.json'))
+	if found is not None:
+		print 'fx, fy, cx, cy = %.1f %.1f %.1f %.1f (true 600 600 320 240)' % \
+		(found._matrix[0, 0], found._matrix[1, 1], found._matrix[0, 2], \
+		found._matrix[1, 2])
+		print 'k1, k2 = %.3f %.3f (true -0.3 0.1)' % tuple(found._distortion[:2])
+		# Distances between the robots of each frame (the floor of the
+		# board has its own origin)
+		distances = []
+		for f in range(frames):
+			colors, yellow_colors = rt.detect_frame(images[f], thr_data, \
+			state)[:2]
+			found.locate(colors, yellow_colors, images[f].shape)
+			for a in range(3):
+				for b in range(a + 1, 3):
+					if len(colors[a]._floor) > 0 and len(colors[b]._floor) > 0:
+						distances.append(abs(rt.euclidean_dist(colors[a]._floor, \
+						colors[b]._floor) - rt.euclidean_dist(sequence[f][a][:2], \
+						sequence[f][b][:2])))
+		print '   %-28s mean %6.2f  max %6.2f' % ('distance error (cm)', \
+		np.mean(distances), np.max(distances))
+	state.close()
+	shutil.rmtree(folder)
+	shutil.rmtree(rt.default.cache_dir)
@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------
+# "Multi-camera benchmark"
+#
+# Description: Records an arena wider than one camera as overlapping
+# views (640 columns each, lossless videos), one per camera, and tracks it
+# with multi_camera. Each camera has a homography to the arena (a shift
+# of its columns, with the y axis up). For 1 to N cameras it prints the
+# merged frames per second, the robots found, the duplicates merged in
+# the overlaps and the position and orientation errors on the arena.
+# Robots move to the right, so they cross the overlaps.
+#
+# Usage: python benchmarks/bench_cameras.py [cameras frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import json
+import tempfile
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+from bench_pipeline import moving_poses, print_stats
+
+rows, view, overlap = 480, 640, 160
+
+# This module writes the view of each camera of the frames as a video
+# and the cameras file. It returns the name of the file.
+def record_cameras(folder, images, cameras):
+	config = {'merge_radius': 20, 'cameras': []}
+	for number in range(cameras):
+		offset = number * (view - overlap)
+		name = os.path.join(folder, 'camera%d.avi' % number)
+		writer = cv2.VideoWriter(name, cv2.VideoWriter_fourcc(*'FFV1'), 30, \
+		(view, rows))
+		for img in images:
+			writer.write(np.ascontiguousarray(img[:, offset:offset + view]))
+		writer.release()
+		config['cameras'].append({'source': name, 'homography': [[1, 0, offset], \
+		[0, -1, rows - 1], [0, 0, 1]]})
+	file_name = os.path.join(folder, 'cameras.json')
+	with open(file_name, 'w') as f:
+		json.dump(config, f)
+	return file_name
+
+# This module compares the poses of the CSV of multi_camera with the
+# poses of the arena (same color, closest one)
+def arena_errors(output_name, sequence):
+	found, position, angle = 0, [], []
+	with open(output_name) as f:
+		lines = [line.strip().split(',') for line in f.readlines()[1:]]
+	for frame, robot, x, y, orientation, yellow, pixels, camera in lines:
+		if int(pixels) == 0:
+			continue
+		poses = sequence[int(frame)]
+		color = {'R': 'red', 'G': 'green', 'B': 'blue'}[robot[0]]
+		distances = [rt.euclidean_dist([int(x), int(y)], [p[1], rows - 1 - p[0]]) \
+		if p[3] == color else float('inf') for p in poses]
+		distance = min(distances)
+		if distance > 6:
+			continue
+		found += 1
+		position.append(distance)
+		if int(yellow) >= 0:
+			diff = abs(int(orientation) - poses[distances.index(distance)][2]) % 360
+			angle.append(min(diff, 360 - diff))
+	return found, position, angle
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	cameras, frames = (args + [3, 30][len(args):])
+	folder = tempfile.mkdtemp()
+	output_name = os.path.join(folder, 'poses.csv')
+
+	for number in range(1, cameras + 1):
+		width = number * (view - overlap) + overlap
+		poses = grid_poses(3 * number, rows, width, ['red', 'green', 'blue'], \
+		seed=number, jitter=0.4)
+		rt.default.multi_robot = True
+		rt.default.robot_colors = [p[3] for p in poses]
+		sequence = moving_poses(poses, frames, step=4)
+		images = [arena_frame(rows, width, sequence[f], 6, noise=4, \
+		lighting=0.15, clutter=10 * number, seed=f) for f in range(frames)]
+		file_name = record_cameras(folder, images, number)
+
+		t1 = time.time()
+		rt.multi_camera(file_name, output_name)
+		elapsed = time.time() - t1
+		found, position, angle = arena_errors(output_name, sequence)
+		print 'Cameras = %d, robots = %d: %.1f s, found %d/%d' % (number, \
+		len(poses), elapsed, found, len(poses) * frames)
+		print_stats('position', position)
+		print_stats('angle (deg)', angle)
+		print
@@ -0,0 +1,79 @@
+#----------------------------------------------------------------------
+# "Labelling benchmark"
+#
+# Description: Compares the DFS2 scan used before by color_det_dfs and
+# yellow_det_dfs with label_objects on noisy binary frames. The time of
+# each one, the speedup and the objects found by each are printed. DFS2
+# may split an object in two and counts most pixels twice, so only the
+# number of objects is compared.
+#
+# Usage: python benchmarks/bench_labeling.py [width height noise frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+
+# This module makes a binary frame with some circles (markers) and salt
+# noise, cleaned with the same opening used in robot_detection.
+def noisy_frame(width, height, noise, seed):
+	random = np.random.RandomState(seed)
+	image = np.zeros((width, height), np.uint8)
+	for x in range(6):
+		center = (int(random.randint(20, height - 20)), \
+		int(random.randint(20, width - 20)))
+		cv2.circle(image, center, int(random.randint(6, 14)), 255, -1)
+	salt = random.random_sample((width, height)) < noise
+	image[salt] = 255
+	kernel = np.ones((3,3), np.uint8)
+	image = cv2.dilate(image, kernel, iterations=1)
+	return image
+
+# This module is the old scan: DFS2 started from every unlabelled pixel
+def dfs_objects(image):
+	width, height = image.shape
+	labels = np.zeros((width, height), np.int32)
+	count = 0
+	objects = []
+	for y in range(height):
+		for x in range(width):
+			if image[x,y] > 0 and labels[x,y] == 0:
+				labels, count, pixels, cumulatives, limits = rt.DFS2(image, \
+				labels, x, y, count)
+				objects.append([pixels, cumulatives[0]/pixels, \
+				cumulatives[1]/pixels, limits[0], limits[1], limits[2], \
+				limits[3]])
+	return objects
+
+if __name__ == "__main__":
+	args = [float(a) for a in sys.argv[1:]]
+	width, height, noise, frames = (args + [240, 320, 0.002, 3][len(args):])
+	width, height, frames = int(width), int(height), int(frames)
+
+	dfs_time, label_time = 0.0, 0.0
+	dfs_found, label_found = 0, 0
+	for n in range(frames):
+		image = noisy_frame(width, height, noise, n)
+
+		t1 = time.time()
+		old = dfs_objects(image)
+		t2 = time.time()
+		new = rt.label_objects(image)
+		t3 = time.time()
+
+		dfs_time += t2 - t1
+		label_time += t3 - t2
+		dfs_found += len(old)
+		label_found += len(new)
+
+	print 'Frame size = ' + str(width) + 'x' + str(height) + \
+	', noise = ' + str(noise) + ', frames = ' + str(frames)
+	print 'Objects found: DFS2 = ' + str(dfs_found) + \
+	', label_objects = ' + str(label_found)
+	print 'DFS2 time per frame = ' + str(dfs_time / frames)
+	print 'label_objects time per frame = ' + str(label_time / frames)
+	print 'Speedup = ' + str(dfs_time / max(label_time, 1e-9))
@@ -0,0 +1,101 @@
+#----------------------------------------------------------------------
+# "Morphology benchmark"
+#
+# Description: Compares the two morphologies of segmentation: an opening
+# and a dilation for each of the four class masks (eight calls, used on
+# whole images) and the fused one (the masks as tiles of one image: one
+# erosion and one dilation, used on the windows of the tracking and
+# pyramid modes). Both read the class masks from the same coded images
+# (see segmentation) of synthetic arenas, whole frames and tracking sized
+# windows. It prints the time of each one and checks that the images are
+# identical. The fused one only pays off on windows.
+#
+# Usage: python benchmarks/bench_morphology.py [frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+
+# Sizes: name, rows, columns (windows are cut from a 640x480 arena)
+sizes = [['640x480', 480, 640], ['1920x1080', 1080, 1920],
+['window 41x41', 41, 41], ['window 120x90', 90, 120]]
+
+# This module is the morphology of whole images: opening and dilation of
+# each mask
+def separate_morphology(coded, thr_data):
+	kernel = np.ones((5,5),np.uint8)
+	openings = []
+	for k in range(4):
+		mask = cv2.LUT(coded, thr_data._classes[k])
+		opening = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+		openings.append(cv2.dilate(opening, kernel, iterations=1))
+	return openings
+
+# This module is the fused one of the windows, as in segmentation (with
+# its buffers)
+def fused_morphology(coded, thr_data):
+	rows, cols = coded.shape
+	gap = rt.default.dilation_kernel.shape[0] / 2
+	buffers = rt.get_buffers()
+	tiles = buffers.get('masks', (4, rows + gap, cols))
+	eroded = buffers.get('eroded', tiles.shape)
+	for k in range(4):
+		cv2.LUT(coded, thr_data._classes[k], tiles[k, :rows])
+	tiles[:, rows:] = 255
+	cv2.erode(tiles.reshape(-1, cols), rt.default.kernel, \
+	eroded.reshape(-1, cols), iterations=1)
+	eroded[:, rows:] = 0
+	cv2.dilate(eroded.reshape(-1, cols), rt.default.dilation_kernel, \
+	tiles.reshape(-1, cols), iterations=1)
+	return [tiles[k, :rows] for k in range(4)]
+
+# This module gets the coded image of an image (see segmentation)
+def coded_image(img, thr_data):
+	hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+	coded_h, coded_s, coded_v = cv2.split(cv2.LUT(hsv, thr_data._lut))
+	return cv2.bitwise_and(cv2.bitwise_and(coded_h, coded_s), coded_v)
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	frames = (args + [20])[0]
+	thr_data = rt.threshold_data(rt.default.def_vals)
+
+	print '   %-16s %10s %10s %8s %10s' % ('size', 'classes ms', 'fused ms', \
+	'speedup', 'identical')
+	for name, rows, cols in sizes:
+		width, height = max(rows, 480), max(cols, 640)
+		poses = grid_poses(3, width, height, ['red', 'green', 'blue'], seed=2, \
+		jitter=0.4)
+		images = []
+		for f in range(frames):
+			img = arena_frame(width, height, poses, 6, noise=8, lighting=0.2, \
+			clutter=40, seed=f)
+			# Windows start on a robot (or at the border of the image)
+			if rows < width:
+				minx = [0, max(poses[f % 3][0] - rows / 2, 0)][f % 2]
+				miny = [0, max(poses[f % 3][1] - cols / 2, 0)][f % 2]
+				img = img[minx:minx + rows, miny:miny + cols]
+			images.append(coded_image(img, thr_data))
+
+		identical = 0
+		for coded in images:
+			before = separate_morphology(coded, thr_data)
+			after = fused_morphology(coded, thr_data)
+			identical += all((before[k] == after[k]).all() for k in range(4))
+
+		times = []
+		for function in [separate_morphology, fused_morphology]:
+			t1 = time.time()
+			for repeat in range(5):
+				for coded in images:
+					function(coded, thr_data)
+			times.append((time.time() - t1) / (5 * frames) * 1000)
+		print '   %-16s %10.3f %10.3f %8.2f %7d/%d' % (name, times[0], times[1], \
+		times[0] / times[1], identical, frames)
+	rt.default.buffers = None
@@ -0,0 +1,137 @@
+#----------------------------------------------------------------------
+# "Pipeline benchmark"
+#
+# Description: Runs the whole detection (detect_frame) on synthetic
+# arenas with moving robots of known position and orientation, for
+# several processing sizes (default.multiple), detection modes and
+# numbers of robots. For each one it prints the frames per second, the
+# percentiles of the time of each stage, the robots found and the
+# position and orientation errors. Clutter, lighting and noise make the
+# arena less ideal. Robots move to the right and some leave the image:
+# the robots in view (body and yellow inside the image) are printed too.
+#
+# Usage: python benchmarks/bench_pipeline.py [--size 480x640] [--frames 30]
+#        [--noise 4] [--lighting 0.15] [--clutter 20]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import math
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+
+# Configurations: name, multi robot, tracking, number of robots
+modes = [['serial', False, False, 3], ['tracking', False, True, 3],
+['N robots', True, False, 3], ['N robots', True, False, 10],
+['N robots', True, False, 30]]
+
+# This module moves the robots of the first poses: a few pixels to the
+# right and a few degrees counter-clockwise on each frame
+def moving_poses(poses, frames, step=2, turn=3):
+	sequence = []
+	for f in range(frames):
+		sequence.append([[p[0], p[1] + step * f, (p[2] + turn * f) % 360, p[3]] \
+		for p in poses])
+	return sequence
+
+# This module compares the robots found with the poses. Robots of the
+# same color can swap indices, so each one is compared with the closest
+# pose of its color. It returns found, position errors and angle errors.
+def pose_errors(colors, poses, robot_colors, radius):
+	found, position, angle = 0, [], []
+	for x in range(len(colors)):
+		if colors[x]._pix_number == 0 or colors[x]._correspondence < 0:
+			continue
+		distances = [rt.euclidean_dist(colors[x]._center_mass, p[:2]) \
+		if p[3] == robot_colors[x] else float('inf') for p in poses]
+		distance = min(distances)
+		if distance > radius:
+			continue
+		pose = poses[distances.index(distance)]
+		diff = abs(colors[x]._orientation - pose[2]) % 360
+		found += 1
+		position.append(distance)
+		angle.append(min(diff, 360 - diff))
+	return found, position, angle
+
+# This module counts the robots of the poses with the body and the yellow
+# marker (see arena.robot_frame) inside the image: robots moving out of
+# it can not be found.
+def in_view(poses, width, height, radius):
+	count = 0
+	for row, col, angle, color in poses:
+		yellow_row = row - 2 * radius * math.sin(math.radians(angle))
+		yellow_col = col + 2 * radius * math.cos(math.radians(angle))
+		count += all(radius <= r < width - radius for r in (row, yellow_row)) \
+		and all(radius <= c < height - radius for c in (col, yellow_col))
+	return count
+
+def print_stats(label, values):
+	if len(values) == 0:
+		values = [float('nan')]
+	print '   %-16s mean %7.2f  max %7.2f' % (label, np.mean(values), \
+	np.max(values))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Pipeline benchmark')
+	parser.add_argument('--size', default='480x640', help='rows x columns')
+	parser.add_argument('--frames', type=int, default=30)
+	parser.add_argument('--multiples', default='1.0,0.5')
+	parser.add_argument('--noise', type=float, default=4.0)
+	parser.add_argument('--lighting', type=float, default=0.15)
+	parser.add_argument('--clutter', type=int, default=20)
+	args = parser.parse_args()
+	width, height = [int(v) for v in args.size.split('x')]
+	thr_data = rt.threshold_data(rt.default.def_vals)
+
+	print 'Frame size = ' + str(width) + 'x' + str(height) + ', noise = ' + \
+	str(args.noise) + ', lighting = ' + str(args.lighting) + ', clutter = ' + \
+	str(args.clutter)
+	for multiple in [float(m) for m in args.multiples.split(',')]:
+		# Markers keep their size on the processing image (and so the
+		# distance of a yellow to its robot grows on the original image)
+		radius = int(round(6 / multiple))
+		rt.default.multiple = multiple
+		for name, multi_robot, tracking, n in modes:
+			rt.default.multi_robot, rt.default.tracking = multi_robot, tracking
+			poses = grid_poses(n, width, height, ['red', 'green', 'blue'], \
+			seed=n, jitter=0.4)
+			rt.default.robot_colors = [p[3] for p in poses]
+			sequence = moving_poses(poses, args.frames)
+			images = [arena_frame(width, height, sequence[f], radius, \
+			noise=args.noise, lighting=args.lighting, clutter=args.clutter, \
+			seed=f) for f in range(args.frames)]
+
+			state = rt.detection_state()
+			rt.default.stages = rt.stage_timer()
+			found, position, angle, total = 0, [], [], []
+			visible = sum(in_view(poses, width, height, radius) for poses in \
+			sequence)
+			for f in range(args.frames):
+				t1 = time.time()
+				rt.default.stages.start()
+				colors = rt.detect_frame(images[f], thr_data, state)[0]
+				rt.default.stages.stop()
+				total.append((time.time() - t1) * 1000)
+
+				f_found, f_position, f_angle = pose_errors(colors, sequence[f], \
+				rt.default.robot_colors, radius)
+				found += f_found
+				position += f_position
+				angle += f_angle
+			state.close()
+
+			print
+			print 'multiple = %.2f, %s, %d robots: %.1f fps, found %d/%d ' \
+			'(%d in view)' % (multiple, name, n, 1000 / np.mean(total), found, \
+			n * args.frames, visible)
+			print '   %-16s %7s %7s %7s' % ('stage (ms)', 'p50', 'p95', 'p99')
+			for stage, values in rt.default.stages.percentiles():
+				print '   %-16s %7.2f %7.2f %7.2f' % tuple([stage] + values)
+			print_stats('position (px)', position)
+			print_stats('angle (deg)', angle)
+	rt.default.stages = None
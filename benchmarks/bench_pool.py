@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------
+# "Execution mode benchmark"
+#
+# Description: Compares the 'serial' full image detection with the
+# 'pool' execution mode (bands of the frame segmented by the processes of
+# a pool, shared memory) on synthetic arenas with clutter, so both the
+# pixel count and the labelled objects paths are used. The mean time per
+# frame of each mode and the speedup are printed, and the results of
+# both modes (centers, boundaries and pixels of every color and yellow)
+# are compared frame by frame. The speedup needs a machine with as many
+# cores as processes.
+#
+# Usage: python benchmarks/bench_pool.py [width height frames processes]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+from bench_pipeline import moving_poses
+
+# This module gives the data of the colors and yellow colors of a frame
+def frame_data(colors, yellow_colors):
+	return [[c._center_mass[:], c._minx, c._miny, c._maxx, c._maxy, \
+	c._pix_number] for c in colors + yellow_colors]
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	width, height, frames, processes = (args + [1080, 1920, 20, 4][len(args):])
+	rt.default.pool_size = processes
+	thr_data = rt.threshold_data(rt.default.def_vals)
+
+	# Robots close together without clutter on even frames (pixel count
+	# path), spread over the arena with clutter on odd frames (labelled
+	# objects path)
+	close = grid_poses(3, width / 5, height / 5, ['red', 'green', 'blue'], \
+	seed=4, jitter=0.4)
+	close = [[x + 2 * width / 5, y + 2 * height / 5, angle, color] for x, y, \
+	angle, color in close]
+	spread = grid_poses(3, width, height, ['red', 'green', 'blue'], seed=4, \
+	jitter=0.4)
+	sequences = [moving_poses(close, frames), moving_poses(spread, frames)]
+	images = [arena_frame(width, height, sequences[f % 2][f], 8, noise=4, \
+	lighting=0.15, clutter=40 * (f % 2), seed=f) for f in range(frames)]
+	seg_pool = rt.segmentation_pool(images[0].shape)
+
+	serial, pool = [], []
+	t1 = time.time()
+	for img in images:
+		serial.append(frame_data(*rt.full_detection(img, thr_data, 3)[:2]))
+	t2 = time.time()
+	for img in images:
+		pool.append(frame_data(*rt.pool_detection(img, thr_data, 3, \
+		seg_pool)[:2]))
+	t3 = time.time()
+	seg_pool.close()
+
+	same = sum(serial[f] == pool[f] for f in range(frames))
+	print 'Frame size = %dx%d, processes = %d, cores = %d' % (height, width, \
+	processes, cpu_count())
+	print 'Serial time per frame = %.2f ms' % ((t2 - t1) / frames * 1000)
+	print 'Pool time per frame = %.2f ms' % ((t3 - t2) / frames * 1000)
+	print 'Speedup = %.2f' % ((t2 - t1) / (t3 - t2))
+	print 'Same results = %d/%d frames' % (same, frames)
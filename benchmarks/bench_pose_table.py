@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------
+# "Pose table benchmark"
+#
+# Description: One process writes the pose table (pose_table) as fast as
+# it can while this one reads it. Every robot of a frame is written with
+# the frame number as its position, so a table mixing two frames is seen.
+# It prints the write and read times, the repeated reads and the mixed
+# tables returned (must be 0).
+#
+# Usage: python benchmarks/bench_pose_table.py [robots seconds]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import tempfile
+from multiprocessing import Process, Value
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+
+def writer(file_name, robots, running, writes):
+	table = rt.pose_table(file_name, robots)
+	colors = [rt.circle_data() for x in range(robots)]
+	t1 = time.time()
+	frame = 0
+	while running.value:
+		frame += 1
+		for x in range(robots):
+			colors[x]._center_mass = [frame % 30000, frame % 30000]
+		table.write(frame, time.time(), colors)
+	writes.value = (time.time() - t1) / max(frame, 1)
+	table.close()
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	robots, seconds = (args + [10, 2][len(args):])
+	file_name = os.path.join(tempfile.mkdtemp(), 'poses')
+	running, writes = Value('i', 1), Value('d', 0)
+
+	process = Process(target=writer, args=(file_name, robots, running, writes))
+	process.start()
+	while not os.path.exists(file_name) or os.path.getsize(file_name) == 0:
+		time.sleep(0.01)
+	time.sleep(0.1)
+	table = rt.pose_table(file_name)
+
+	reads, mixed, failed = 0, 0, 0
+	t1 = time.time()
+	while time.time() - t1 < seconds:
+		result = table.read()
+		if result is None:
+			failed += 1
+			continue
+		sequence, frame, stamp, data = result
+		if (data['center_mass'] != frame % 30000).any():
+			mixed += 1
+		reads += 1
+	elapsed = time.time() - t1
+	running.value = 0
+	process.join()
+
+	print 'Robots = %d' % robots
+	print 'Write time = %.2f us' % (writes.value * 1e6)
+	print 'Read time = %.2f us, reads = %d, repeated = %d, failed = %d' % \
+	(elapsed / max(reads, 1) * 1e6, reads, table._retries, failed)
+	print 'Mixed tables = %d' % mixed
+	table.close()
+	os.remove(file_name)
@@ -0,0 +1,94 @@
+#----------------------------------------------------------------------
+# "Pyramid benchmark"
+#
+# Description: Compares the single size detection (full_detection on the
+# processing image) with the pyramid mode (pyramid_detection: found on
+# the processing image, measured again on the original one) at 640x480
+# and 1920x1080. For each one it prints the frames per second, the
+# processed pixels and the position and orientation errors.
+#
+# Usage: python benchmarks/bench_pyramid.py [frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+from bench_pipeline import moving_poses, pose_errors
+
+# Frame sizes and marker radius (a camera with more pixels sees bigger
+# markers)
+sizes = [[480, 640, 12], [1080, 1920, 24]]
+
+# This module measures the area of a marker of the given radius on the
+# processing image (after the opening and dilation)
+def marker_area(radius, multiple, thr_data):
+	img = arena_frame(8 * radius, 8 * radius, [[4 * radius, 4 * radius, 0, \
+	'red']], radius)
+	img = rt.cv2.resize(img, None, fx=multiple, fy=multiple, \
+	interpolation=rt.cv2.INTER_LINEAR)
+	return rt.label_objects(rt.segmentation(img, thr_data)[0])[0][0]
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	frames = (args + [20])[0]
+	thr_data = rt.threshold_data(rt.default.def_vals)
+
+	for width, height, radius in sizes:
+		poses = grid_poses(3, width, height, ['red', 'green', 'blue'], seed=1, \
+		jitter=0.4)
+		sequence = moving_poses(poses, frames)
+		images = [arena_frame(width, height, sequence[f], radius, noise=4, \
+		lighting=0.15, clutter=20, seed=f) for f in range(frames)]
+
+		print
+		print 'Frame size = %dx%d, marker radius = %d' % (height, width, radius)
+		print '   %-20s %8s %10s %9s %9s %9s %9s' % ('mode', 'fps', 'pixels', \
+		'pos.mean', 'pos.max', 'ang.mean', 'ang.max')
+		for multiple in [1.0, 0.5, 0.25]:
+			# Markers must stand the opening on the processing image
+			if radius * multiple < 6:
+				continue
+			for pyramid in [False, True]:
+				if pyramid and multiple == 1.0:
+					continue
+				rt.default.multiple, rt.default.pyramid = multiple, pyramid
+				# Marker areas of the processing image (limits set for the
+				# markers of radius 6 of the arena)
+				rt.default.area_scale = marker_area(radius, multiple, \
+				thr_data) / float(marker_area(6, 1.0, thr_data))
+				state = rt.detection_state()
+				found, position, angle, pixels = 0, [], [], 0
+				t1 = time.time()
+				results = []
+				for f in range(frames):
+					colors, yellows, matches, unmatched, count = \
+					rt.detect_frame(images[f], thr_data, state)
+					results.append([[c._center_mass[:], c._orientation, \
+					c._correspondence, c._pix_number] for c in colors])
+					pixels += count
+				elapsed = time.time() - t1
+				for f in range(frames):
+					colors = []
+					for center, orientation, correspondence, count in results[f]:
+						c = rt.circle_data()
+						c._center_mass, c._orientation = center, orientation
+						c._correspondence, c._pix_number = correspondence, count
+						colors.append(c)
+					f_found, f_position, f_angle = pose_errors(colors, \
+					sequence[f], rt.default.robot_colors, radius)
+					found += f_found
+					position += f_position
+					angle += f_angle
+				state.close()
+				position, angle = position or [np.nan], angle or [np.nan]
+				print '   %-20s %8.1f %10d %9.2f %9.2f %9.2f %9.2f' % \
+				(('pyramid ' if pyramid else 'single ') + str(multiple), \
+				frames / elapsed, pixels / frames, np.mean(position), \
+				np.max(position), np.mean(angle), np.max(angle)) + \
+				('' if found == 3 * frames else ' (found %d/%d)' % (found, \
+				3 * frames))
+	rt.default.area_scale = 1.0
@@ -0,0 +1,85 @@
+#----------------------------------------------------------------------
+# "N robots benchmark"
+#
+# Description: Runs the N robot mode (multi_detection) on synthetic
+# arenas with an increasing number of robots. For each N it prints the
+# frames per second, the robots found and the max. orientation error.
+# It also compares the yellow to robot matching of the grid index with
+# comparing every pair of points, for many points.
+#
+# Usage: python benchmarks/bench_robots.py [width height frames]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, robot_frame
+
+# This module matches every query point with the closest point comparing
+# all of them (what the grid index avoids). It returns the index of the
+# point of each query (-1 if none is inside the radius).
+def all_pairs(points, queries, radius):
+	matches = []
+	for q in queries:
+		best, best_dist = -1, radius
+		for x in range(len(points)):
+			distance = rt.euclidean_dist(q, points[x])
+			if distance <= best_dist:
+				best, best_dist = x, distance
+		matches.append(best)
+	return matches
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	width, height, frames = (args + [1080, 1920, 10][len(args):])
+	thr_data = rt.threshold_data(rt.default.def_vals)
+	rt.default.multi_robot = True
+
+	print 'Frame size = ' + str(width) + 'x' + str(height)
+	for n in [3, 10, 20, 30, 50]:
+		poses = grid_poses(n, width, height, ['red', 'green', 'blue'])
+		img = robot_frame(width, height, poses)
+		rt.default.robot_colors = [p[3] for p in poses]
+		robots = [rt.circle_data() for x in range(n)]
+		yellows = [rt.circle_data() for x in range(n)]
+
+		t1 = time.time()
+		for f in range(frames):
+			matches = rt.multi_detection(img, thr_data, robots, yellows)
+		t2 = time.time()
+
+		# Robots of the same color get their index in the order they are
+		# found, so each one is compared with the closest pose
+		found, error = 0, 0
+		for x in range(n):
+			distances = [rt.euclidean_dist(robots[x]._center_mass, p[:2]) \
+			for p in poses]
+			pose = poses[distances.index(min(distances))]
+			if robots[x]._correspondence >= 0 and min(distances) < 3 and \
+			pose[3] == rt.default.robot_colors[x]:
+				found += 1
+				diff = abs(robots[x]._orientation - pose[2]) % 360
+				error = max(error, min(diff, 360 - diff))
+		print 'N = ' + str(n) + ': ' + str(frames / (t2 - t1)) + \
+		' frames/s, found = ' + str(found) + ', max. angle error = ' + \
+		str(error)
+
+	# Matching only: grid index against all pairs (radius of a body of 6
+	# pixels, see match_radius)
+	random = np.random.RandomState(0)
+	radius = rt.default.match_factor * 6
+	for n in [50, 200, 1000]:
+		points = (random.random_sample((n, 2)) * [width, height]).tolist()
+		queries = [[p[0] + 10, p[1]] for p in points]
+		t1 = time.time()
+		grid = rt.spatial_grid(points, radius)
+		for q in queries:
+			grid.nearest(q, radius)
+		t2 = time.time()
+		all_pairs(points, queries, radius)
+		t3 = time.time()
+		print 'Matching ' + str(n) + ' points: grid = ' + str(t2 - t1) + \
+		' s, all pairs = ' + str(t3 - t2) + ' s'
@@ -0,0 +1,62 @@
+#----------------------------------------------------------------------
+# "Serial writer benchmark"
+#
+# Description: Sends poses to a pseudo-terminal standing in for the
+# serial port of a robot (serial_writer). The other end of the terminal
+# is read slowly, like a Bluetooth link. It prints the max. time the
+# detection loop waited to post a pose and the counters of the writer.
+# The port appears one second after starting, to show the reconnection.
+#
+# Usage: python benchmarks/bench_serial.py [seconds rate bytes_per_second]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import tempfile
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+
+# This module reads the other end of the terminal at the given speed
+def slow_link(master, speed, received):
+	while True:
+		try:
+			data = os.read(master, 64)
+		except OSError:
+			break
+		received[0] += len(data)
+		time.sleep(64.0 / speed)
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	seconds, rate, speed = (args + [4, 100, 1000][len(args):])
+	rt.default.serial_retry = 0.2
+
+	master, slave = os.openpty()
+	port = os.path.join(tempfile.mkdtemp(), 'robot0')
+	writer = rt.serial_writer(port)
+	received = [0]
+	reader = Thread(target=slow_link, args=(master, speed, received))
+	reader.daemon = True
+	reader.start()
+
+	posted, wait = 0, 0.0
+	start = time.time()
+	while time.time() - start < seconds:
+		if not os.path.exists(port) and time.time() - start > 1:
+			os.symlink(os.ttyname(slave), port)
+		message = '%d %d %d 0 0' % (posted % 640, posted % 480, posted % 360)
+		t1 = time.time()
+		writer.post(message)
+		wait = max(wait, time.time() - t1)
+		posted += 1
+		time.sleep(1.0 / rate)
+	writer.close()
+	os.remove(port)
+
+	sent, dropped, failures, mean, maximum = writer.stats()
+	print 'Posted = %d, max. post time = %.3f ms' % (posted, wait * 1000)
+	print 'Sent = %d, dropped = %d, failures = %d' % (sent, dropped, failures)
+	print 'Write time = %.3f ms (max. %.3f ms), bytes read = %d' % (mean, \
+	maximum, received[0])
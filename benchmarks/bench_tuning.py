@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------
+# "Threshold tuning benchmark"
+#
+# Description: Compares the loop of thres_adj on live frames (HSV
+# conversion, thresholds and opening on every iteration) with the frozen
+# clip of threshold_tuner (HSV and histograms made once) on synthetic
+# arenas. Sliders move on some iterations only, as they do while tuning.
+# For each frame size it prints the time of freezing the clip, the time
+# per iteration of each one (slider moved, slider still) with the pixels
+# of each class counted, and checks that the images are identical.
+#
+# Usage: python benchmarks/bench_tuning.py [iterations clip]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robot_tracker as rt
+from arena import grid_poses, arena_frame
+
+sizes = [[480, 640], [1080, 1920]]
+
+# This module is the old iteration of thres_adj (the pixels of each class
+# counted with the thresholds of each one)
+def live_iteration(img, low, up, thresholds):
+	hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+	mask = cv2.inRange(hsv, low, up)
+	opening = cv2.morphologyEx(mask, cv2.MORPH_OPEN, rt.default.kernel)
+	pixels = [cv2.countNonZero(cv2.inRange(hsv, np.array(thresholds[c][:3]), \
+	np.array(thresholds[c][3:]))) for c in rt.default.colors_used]
+	return mask, opening, pixels
+
+if __name__ == "__main__":
+	args = [int(a) for a in sys.argv[1:]]
+	iterations, clip = (args + [60, 5][len(args):])
+	values = rt.default.def_vals
+	base = dict((rt.default.colors_used[k], values[6 * k:6 * k + 6]) \
+	for k in range(5))
+
+	print '   %-10s %10s %12s %12s %12s %12s %10s' % ('size', 'freeze ms', \
+	'live moved', 'live still', 'frozen moved', 'frozen still', 'identical')
+	for rows, cols in sizes:
+		poses = grid_poses(3, rows, cols, ['red', 'green', 'blue'], seed=3, \
+		jitter=0.4)
+		images = [arena_frame(rows, cols, poses, rows / 40, noise=4, \
+		lighting=0.15, clutter=20, seed=f) for f in range(clip)]
+		# Slider values: the green thresholds, one value moved every 4
+		# iterations
+		steps = []
+		low, up = list(base['green'][:3]), list(base['green'][3:])
+		for i in range(iterations):
+			if i % 4 == 0:
+				low[i % 3] = max(low[i % 3] - 1, 0)
+			steps.append([np.array(low), np.array(up), i % 4 == 0])
+
+		t1 = time.time()
+		tuner = rt.threshold_tuner(images)
+		freeze = time.time() - t1
+
+		times = {'live': [[], []], 'frozen': [[], []]}
+		identical = 0
+		for i in range(iterations):
+			low, up, moved = steps[i]
+			thresholds = dict(base)
+			thresholds['green'] = list(low) + list(up)
+			t1 = time.time()
+			mask, opening, pixels = live_iteration(images[0], low, up, thresholds)
+			times['live'][moved].append(time.time() - t1)
+			t1 = time.time()
+			f_mask, f_opening = tuner.update(low, up)
+			f_pixels = tuner.counts(thresholds)
+			times['frozen'][moved].append(time.time() - t1)
+			identical += (mask == f_mask).all() and \
+			(opening == f_opening).all() and pixels == f_pixels
+		tuner.histogram_image(low, up, f_pixels)
+
+		print '   %-10s %10.1f %12.2f %12.2f %12.3f %12.3f %7d/%d' % \
+		('%dx%d' % (cols, rows), freeze * 1e3, \
+		np.mean(times['live'][True]) * 1e3, np.mean(times['live'][False]) * 1e3, \
+		np.mean(times['frozen'][True]) * 1e3, \
+		np.mean(times['frozen'][False]) * 1e3, identical, iterations)
@@ -14,7 +14,9 @@
 #
 #	* thres_adj .- This module helps with the threshold adjustment while
 #				showing the real-time result of binarization and after
-#				applying the thresholds.
+#				applying the thresholds. A frozen frame (or clip) makes
+#				the slider changes instant and counts the pixels of
+#				each class.
 #
 #	* show_hsv_binary.- This module shows the binary images of all 
 #						colors after binarization.
@@ -36,18 +38,42 @@ import cv2					# For image preprocessing and printing
 import numpy as np			# Requirement for OpenCV
 import math					# To calculate data
 import time
+import os
+import sys
+import hashlib
+import json
+import copy
+import signal
+import argparse
+import socket
+import struct
+import mmap
+import tempfile
 #import nxt.locator			# Tests with NXT
 #from nxt.motor import *	# Tests with NXT
 from Tkinter import *		# To make the GUI
 #from nxt.motor import Motor, PORT_B, PORT_C	# Distance tests with NXT
 #from nxt.sensor import Ultrasonic, PORT_4	# Distance tests with NXT
 import serial
-from threading import Thread
+from threading import Thread, Condition, Lock
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, Process, Queue, Event
+from Queue import Empty
+from multiprocessing.sharedctypes import RawArray
+try:
+	from scipy import ndimage	# Object labelling with OpenCV 2.4
+except ImportError:
+	ndimage = None
 
 # This class includes all the needed data of a detected object.
 class circle_data:
 	
 	def __init__(self):
+		self.clear()
+	
+	# Clearing the data (structures are reused from frame to frame)
+	def clear(self):
 		self._color = ()
 		# Coordinates for bounding box
 		#-------------
@@ -60,17 +86,97 @@ class circle_data:
 		self._cumulative_x = 0
 		self._cumulative_y = 0
 		self._center_mass = []
-		self._correspondence = 0
+		self._correspondence = -1	# Index of its yellow (-1: not matched)
 		self._orientation = 0
+		# Position (cm) and orientation on the floor (camera_calibration)
+		self._floor = []
+		self._floor_orientation = 0
+		
+# This class keeps a constant-velocity model of a robot for the tracking
+# mode. Values are in original image coordinates.
+class robot_track:
+	
+	def __init__(self):
+		self._center = []		# Last center of mass
+		self._velocity = [0, 0]	# Pixels per frame
+		self._size = [0, 0]		# Bounding box size
+		self._lost = 1
+	
+	# Predicted center of mass for the next frame
+	def predict(self):
+		return [self._center[0] + self._velocity[0], \
+		self._center[1] + self._velocity[1]]
+	
+	# Updating the model with the detected data of the robot
+	def update(self, colour):
+		if colour._pix_number == 0:
+			self._lost = 1
+			return
+		center = colour._center_mass
+		if self._lost == 0:
+			# Smoothing the velocity with the last displacement
+			self._velocity = [(self._velocity[0] + center[0] - self._center[0]) / 2.0,
+			(self._velocity[1] + center[1] - self._center[1]) / 2.0]
+		else:
+			self._velocity = [0, 0]
+		self._center = center
+		self._size = [colour._maxx - colour._minx, colour._maxy - colour._miny]
+		self._lost = 0
 		
+# This class is a grid index of 2D points (cells of a given size) used to
+# find the closest point to another one without comparing all of them.
+class spatial_grid:
+	
+	def __init__(self, points, cell):
+		self._points = points
+		self._cell = float(cell)
+		self._cells = {}
+		for x in range(len(points)):
+			key = (int(points[x][0] // self._cell), int(points[x][1] // self._cell))
+			self._cells.setdefault(key, []).append(x)
+	
+	# Indexes and distances of all the points within radius
+	def within(self, point, radius):
+		reach = int(math.ceil(radius / self._cell))
+		cx, cy = int(point[0] // self._cell), int(point[1] // self._cell)
+		near = []
+		for a in range(cx - reach, cx + reach + 1):
+			for b in range(cy - reach, cy + reach + 1):
+				for x in self._cells.get((a, b), ()):
+					distance = euclidean_dist(point, self._points[x])
+					if distance <= radius:
+						near.append([x, distance])
+		return near
+	
+	# Index of the closest point within radius (-1 if there is none).
+	# Points in skip are not taken into account.
+	def nearest(self, point, radius, skip=()):
+		reach = int(math.ceil(radius / self._cell))
+		cx, cy = int(point[0] // self._cell), int(point[1] // self._cell)
+		best, best_dist = -1, radius
+		for a in range(cx - reach, cx + reach + 1):
+			for b in range(cy - reach, cy + reach + 1):
+				for x in self._cells.get((a, b), ()):
+					if x in skip:
+						continue
+					distance = euclidean_dist(point, self._points[x])
+					if distance <= best_dist:
+						best, best_dist = x, distance
+		return best
+
 class default:
 	def_vals = [0, 42, 0, 12, 255, 182, 155, 42, 0, 179, 255, 182,
 	60, 100, 0, 96, 255, 91, 104, 78, 0, 130, 255, 124, 21, 50, 65,
 	36, 255, 122]
 	
 	file_name = 'vals.txt'
+	cache_dir = 'cache'	# Compiled thresholds
+	
+	colors_used = ['red2','red3','green','blue','yellow']
 	
-	colors_used = ['red2\n','red3\n','green\n','blue\n','yellow\n']
+	image_types = ['.png', '.jpg', '.jpeg', '.bmp']	# Replayed image files
+	
+	config = None	# Configuration store shared by all modules (get_config)
 	
 	cam_num = 0
 	
@@ -83,15 +189,1364 @@ class default:
 	
 	multiple = 1.0	# Size of processing image from original
 	
+	# Frame deadline (ms), if any. The scheduler lowers default.multiple
+	# by the steps (fractions of the chosen multiple) while the frames
+	# take longer, and raises it again when the bigger size would fit in
+	# adaptive_headroom of the deadline. Changes wait adaptive_window frames.
+	# On the smallest step the markers must still be bigger than the
+	# opening kernel (5x5).
+	deadline = None
+	adaptive_steps = [1.0, 0.75, 0.5]
+	adaptive_window = 15
+	adaptive_headroom = 0.8
+	
 	pixels_cm = 10 # Conversion value
+	
+	# Calibration file of the camera (see camera_calibration and
+	# calibrate), if any. With it the robots also get floor poses (cm).
+	calibration = None
+	calibration_file = 'calibration.json'	# Made by calibrate
+	board = (9, 6)		# Inner corners of the chessboard (columns, rows)
+	board_square = 2.5	# Size of its squares (cm)
+	
+	# Size limits (in pixels) of a labelled marker. DFS2 counted most
+	# pixels twice while backtracking, so these are half of its 320-520.
+	min_area = 160
+	max_area = 260
+	area_scale = 1.0	# Change of the marker areas (see deadline_scheduler)
+	
+	# Robots. Each one is identified by the color of its body circle and
+	# its index in this list. In N robot mode any number of robots of each
+	# color can be used; robots of the same color keep their index by
+	# taking the object closest to their last position.
+	robot_colors = ['red', 'green', 'blue']
+	multi_robot = False	# N robot mode
+	# Max. distance of a yellow center to its robot, in radii of the robot
+	# body (see match_radius). The yellow is about 2 radii away.
+	match_factor = 3.0
+	
+	# Tracking mode. Only windows around the predicted robot positions
+	# are processed; a lost robot makes a full image search.
+	tracking = False
+	track_window = 1.6	# Window half size, in bounding box sizes
+	track_min_window = 20	# Min. window half size (processing pixels)
+	
+	# Pyramid mode. Robots are found on the processing image (make
+	# default.multiple small) and then measured on the original image
+	# inside windows of the tracking sizes (original pixels).
+	pyramid = False
+	
+	# Threshold adjustment on a frozen clip (see threshold_tuner): frames
+	# kept when freezing the camera or reading a recorded video
+	freeze_frames = 1
+	
+	grab_buffer = 3		# Frames kept by the frame grabber
+	grab_timeout = 1.0	# Max. time (s) waiting for a new frame
+	
+	# Execution mode of the full image detection. 'serial' runs it on this
+	# process; 'pool' runs the segmentation of bands of the frame on the
+	# processes of a pool, sharing the frame through shared memory. Its
+	# speedup needs several cores (see benchmarks/bench_pool.py): it is
+	# not the default.
+	exec_mode = 'serial'
+	pool_size = 4
+	
+	# Images the detection writes on every frame (frame_buffers, see
+	# get_buffers), made with the first frames. Without reuse_buffers
+	# they are made again every time (to compare).
+	buffers = None
+	reuse_buffers = True
+	
+	kernel = np.ones((5,5),np.uint8)	# Opening and dilation of the masks
+	# The two dilations after the erosion of the opening, in one pass (the
+	# kernel dilated by itself)
+	dilation_kernel = np.ones((9,9),np.uint8)
+	
+	stages = None	# Timer of the detection stages (stage_timer), if any
+	
+	# Metrics of the stage times: percentiles of the last frames, written
+	# periodically to metrics_file (.csv, .json or Prometheus text)
+	metrics_window = 300	# Frames
+	metrics_file = None
+	metrics_period = 5.0	# Seconds
+	
+	# Result window of the detection. 'window' draws and shows every frame
+	# in the detection loop; 'thread' does it on its own thread, at most
+	# display_rate times per second; 'off' shows nothing (quit with Ctrl+C,
+	# a SIGTERM or 'q' and Enter on the console).
+	display = 'window'
+	display_rate = 10
+	
+	# Serial ports of the robots (same index as the robots; None for a
+	# robot without port). Each port has its own writer thread.
+	serial_ports = []
+	serial_baudrate = 115200
+	serial_write_timeout = 0.5	# Max. time (s) of a write
+	serial_retry = 1.0			# Time (s) between reconnection tries
+	
+	# UDP datagram with the poses of all robots, sent once per frame to
+	# 'host:port' (unicast or multicast address), if any
+	udp_address = None
+	udp_ttl = 1		# Routers a multicast datagram can go through
+	
+	# Memory mapped file with the poses of the last frame for programs on
+	# the same computer (e.g. '/dev/shm/robot_poses'), if any
+	pose_table = None
+	
+	# Binary file where the poses of every frame are appended, if any
+	# (see trajectory_log), and frames written at once
+	trajectory_log = None
+	log_batch = 100
+	
+	# Cameras of an arena bigger than one field of view (see multi_camera
+	# and load_cameras). Each camera has its own process, thresholds and
+	# homography from its image to the arena coordinates (any unit, e.g.
+	# mm). Detections of a color from different cameras closer than
+	# merge_radius (arena units) are the same robot.
+	merge_radius = 50
+	camera_queue = 4	# Frames a camera process can be ahead of the merge
+
+# This class reads the camera on its own thread and keeps the last
+# captures in a small ring buffer, so the processing loop always gets the
+# newest frame instead of the ones queued by the driver. It is used like
+# cv2.VideoCapture (read and release).
+class frame_grabber:
+	
+	def __init__(self, cam_num):
+		self._cap = cv2.VideoCapture(cam_num)
+		self._buffer = deque(maxlen=default.grab_buffer)
+		self._condition = Condition()
+		self._running = 1
+		self._captured = 0		# Frames read from the camera
+		self._delivered = 0		# Frames given to the processing loop
+		self._dropped = 0		# Frames never given (a newer one was read)
+		self._stale = 0			# Reads without a new frame (last one repeated)
+		self._frame_num = 0		# Number of the last given frame
+		self._frame_time = 0	# Capture time of the last given frame
+		self._late = 0			# No frame in default.grab_timeout
+		self._thread = Thread(target=self._grab)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	# Thread loop. Reads frames and appends them to the ring buffer. If the
+	# camera gives nothing for default.grab_timeout seconds, the reader is
+	# woken up to give the last frame again.
+	def _grab(self):
+		last = time.time()
+		while self._running:
+			ret, frame = self._cap.read()
+			if not ret:
+				time.sleep(0.005)
+				if time.time() - last > default.grab_timeout:
+					with self._condition:
+						self._late = 1
+						self._condition.notify()
+					last = time.time()
+				continue
+			last = time.time()
+			with self._condition:
+				self._captured += 1
+				self._buffer.append((self._captured, time.time(), frame))
+				self._condition.notify()
+	
+	# Returns the newest frame. It waits for a frame newer than the last
+	# one given; if none arrives in time, the last one is given again. The
+	# wait has no timeout (a timed wait polls on Python 2): the grabbing
+	# thread wakes it up.
+	def read(self):
+		with self._condition:
+			self._late = 0
+			while self._captured == self._frame_num and self._running and \
+			not self._late:
+				self._condition.wait()
+			if len(self._buffer) == 0:
+				return False, None
+			number, stamp, frame = self._buffer[-1]
+			if number == self._frame_num:
+				self._stale += 1
+			else:
+				self._dropped += number - self._frame_num - 1
+				self._delivered += 1
+			self._frame_num, self._frame_time = number, stamp
+		return True, frame
+	
+	# Captured, delivered, dropped and stale frames
+	def stats(self):
+		with self._condition:
+			return self._captured, self._delivered, self._dropped, self._stale
+	
+	# Stopping the thread and releasing the capture
+	def release(self):
+		with self._condition:
+			self._running = 0
+			self._condition.notify_all()
+		self._thread.join()
+		self._cap.release()
+
+# This class sends the poses of a robot through its serial port on its
+# own thread, so a slow link (Bluetooth) never stops the detection. It
+# has a mailbox of one message: a pose not sent yet is replaced by the
+# newest one (and counted as dropped). If the port fails it is closed and
+# opened again every default.serial_retry seconds.
+class serial_writer:
+	
+	def __init__(self, port, baudrate=None):
+		self._port = port
+		self._baudrate = baudrate or default.serial_baudrate
+		self._serial = None
+		self._condition = Condition()
+		self._message = None	# Mailbox
+		self._sent = 0			# Messages written
+		self._dropped = 0		# Messages replaced before being written
+		self._failures = 0		# Failed opens and writes
+		self._latency = deque(maxlen=default.metrics_window)	# Write times (ms)
+		self._running = 1
+		self._thread = Thread(target=self._write)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	# Leaves a message in the mailbox. It never waits for the port.
+	def post(self, message):
+		with self._condition:
+			if self._message is not None:
+				self._dropped += 1
+			self._message = message
+			self._condition.notify()
+	
+	# Opening the port, if it is not open
+	def _connect(self):
+		if self._serial is None:
+			try:
+				self._serial = serial.Serial(self._port, self._baudrate, \
+				timeout=0, writeTimeout=default.serial_write_timeout)
+			except (serial.SerialException, OSError, ValueError):
+				self._failures += 1
+		return self._serial is not None
+	
+	# Thread loop. Writes the newest message when the port is ready.
+	def _write(self):
+		while self._running:
+			if not self._connect():
+				time.sleep(default.serial_retry)
+				continue
+			with self._condition:
+				if self._message is None:
+					self._condition.wait(0.1)
+				message, self._message = self._message, None
+			if message is None:
+				continue
+			t1 = time.time()
+			try:
+				self._serial.write(message)
+				self._sent += 1
+				self._latency.append((time.time() - t1) * 1000)
+			except (serial.SerialException, OSError):
+				self._failures += 1
+				self.disconnect()
+		self.disconnect()
+	
+	def disconnect(self):
+		if self._serial is not None:
+			try:
+				self._serial.close()
+			except (serial.SerialException, OSError):
+				pass
+			self._serial = None
+	
+	# Sent, dropped, failures, mean and max. write time (ms)
+	def stats(self):
+		latency = list(self._latency) or [0.0]
+		return self._sent, self._dropped, self._failures, \
+		np.mean(latency), max(latency)
+	
+	# Stopping the thread and closing the port
+	def close(self):
+		self._running = 0
+		with self._condition:
+			self._condition.notify()
+		self._thread.join()
+
+# This class sends the poses of all robots in one UDP datagram per frame
+# (unicast or multicast), so any number of programs on the network can
+# read them. Datagram (little endian): header 'RT', version, number of
+# robots, frame number and capture time (s), then for each robot its
+# index, color (0 red, 1 green, 2 blue), row, column, orientation and
+# whether its yellow was found. See decode_poses.
+# Version 2 has 32 bit positions (arena units of a calibration or of
+# several cameras can be big) and 16 bit robot numbers; version 1 had 16
+# and 8 bits.
+class pose_publisher:
+	
+	version = 2
+	header = struct.Struct('<2sBHId')
+	robot = struct.Struct('<HBiihB')
+	# Layouts of each version (header, robot), read by decode_poses
+	layouts = {1: (struct.Struct('<2sBBId'), struct.Struct('<BBhhhB')), \
+	2: (header, robot)}
+	
+	def __init__(self, address):
+		host, port = address.rsplit(':', 1)
+		host = socket.gethostbyname(host)
+		self._address = (host, int(port))
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self._socket.setblocking(0)
+		if multicast_address(host):
+			self._socket.setsockopt(socket.IPPROTO_IP, \
+			socket.IP_MULTICAST_TTL, default.udp_ttl)
+		self._sent = 0
+		self._failures = 0	# Datagrams not sent (e.g. full buffer)
+	
+	def publish(self, frame_num, frame_time, colors):
+		data = [self.header.pack('RT', self.version, len(colors), frame_num, \
+		frame_time)]
+		for x in range(len(colors)):
+			data.append(self.robot.pack(x, \
+			robot_color_code(x), colors[x]._center_mass[0], \
+			colors[x]._center_mass[1], colors[x]._orientation, \
+			colors[x]._correspondence >= 0))
+		try:
+			self._socket.sendto(''.join(data), self._address)
+			self._sent += 1
+		except socket.error:
+			self._failures += 1
+	
+	def close(self):
+		self._socket.close()
+
+# This class keeps the poses of the last frame in a memory mapped file
+# with a fixed layout, so programs on the same computer read them without
+# parsing (header_type and robot_type describe it for numpy). The header
+# has a sequence number: odd while the tracker writes, even when the table
+# is complete. A reader copies the table and checks the number did not
+# change, so a table written while it was read is read again.
+class pose_table:
+	
+	header_type = np.dtype([('magic', 'S4'), ('version', '<u4'), \
+	('robots', '<u4'), ('reserved', '<u4'), ('sequence', '<u8'), \
+	('frame', '<u8'), ('time', '<f8')])
+	robot_type = np.dtype([('center_mass', '<i4', 2), ('orientation', '<i4'), \
+	('bbox', '<i4', 4), ('correspondence', '<i4'), ('pix_number', '<i4'), \
+	('color', '<i4')])
+	
+	# Same layout, for struct (sequence at byte 16, frame and time at 24)
+	header = struct.Struct('<4sIII')
+	sequence = struct.Struct('<Q')
+	frame_time = struct.Struct('<Qd')
+	robot = struct.Struct('<10i')
+	
+	# A new table for the given number of robots (writer), or an existing
+	# one (robots = None, reader)
+	def __init__(self, file_name, robots=None):
+		size = self.header_type.itemsize
+		if robots is not None:
+			with open(file_name, 'wb') as f:
+				f.write(self.header.pack('RTPT', 1, robots, 0) + \
+				'\0' * (size - self.header.size + robots * self.robot.size))
+		with open(file_name, 'r+b' if robots is not None else 'rb') as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE \
+			if robots is not None else mmap.ACCESS_READ)
+		magic, version, count, reserved = self.header.unpack_from(self._map)
+		if magic != 'RTPT' or version != 1:
+			self._map.close()
+			raise ValueError(file_name + ' is not a pose table')
+		self._robots = count
+		self._start, self._end = size, size + count * self.robot.size
+		self._retries = 0	# Reads repeated (table written meanwhile)
+	
+	def write(self, frame_num, frame_time, colors):
+		data = pack_robots(colors, self._robots)
+		sequence = self.sequence.unpack_from(self._map, 16)[0]
+		self.sequence.pack_into(self._map, 16, sequence + 1)
+		self._map[self._start:self._start + len(data)] = data
+		self.frame_time.pack_into(self._map, 24, frame_num, frame_time)
+		self.sequence.pack_into(self._map, 16, sequence + 2)
+	
+	# Latest complete table: sequence, frame number, capture time and a
+	# copy of the robots (numpy array of robot_type). None if the table
+	# was always being written.
+	def read(self, tries=1000):
+		for k in xrange(tries):
+			sequence = self.sequence.unpack_from(self._map, 16)[0]
+			if sequence % 2 == 0:
+				frame_num, frame_time = self.frame_time.unpack_from(self._map, 24)
+				data = self._map[self._start:self._end]
+				if self.sequence.unpack_from(self._map, 16)[0] == sequence:
+					return sequence, frame_num, frame_time, \
+					np.frombuffer(data, self.robot_type)
+			self._retries += 1
+		return None
+	
+	def close(self):
+		self._map.close()
+
+# This class appends the poses of every frame to a binary file: a header
+# (header_type) and then one record per frame (record_type: frame number,
+# capture time and the robots as in the pose table). Records are kept in
+# memory and written by a thread every default.log_batch frames, so the
+# detection never waits for the disk. See read_trajectory.
+class trajectory_log:
+	
+	header_type = np.dtype([('magic', 'S4'), ('version', '<u4'), \
+	('robots', '<u4'), ('record_size', '<u4'), ('start', '<f8')])
+	header = struct.Struct('<4sIIId')
+	frame_time = struct.Struct('<Qd')
+	
+	@staticmethod
+	def record_type(robots):
+		return np.dtype([('frame', '<u8'), ('time', '<f8'), \
+		('robots', pose_table.robot_type, (robots,))])
+	
+	# A log of a number of robots. An existing log of the same number of
+	# robots is continued (an incomplete last record is removed).
+	def __init__(self, file_name, robots):
+		self._robots = robots
+		size = self.record_type(robots).itemsize
+		if os.path.exists(file_name) and \
+		os.path.getsize(file_name) >= self.header.size:
+			with open(file_name, 'r+b') as f:
+				magic, version, count, record_size, start = \
+				self.header.unpack(f.read(self.header.size))
+				if magic != 'RTLG' or count != robots or record_size != size:
+					raise ValueError(file_name + ' is not a log of ' + \
+					str(robots) + ' robots')
+				f.truncate(self.header.size + (os.path.getsize(file_name) - \
+				self.header.size) / size * size)
+		else:
+			with open(file_name, 'wb') as f:
+				f.write(self.header.pack('RTLG', 1, robots, size, time.time()))
+		self._file = open(file_name, 'ab')
+		self._batch = []		# Records not given to the thread
+		self._pending = deque()	# Batches not written
+		self._condition = Condition()
+		self._written = 0		# Records written
+		self._running = 1
+		self._thread = Thread(target=self._write)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	def append(self, frame_num, frame_time, colors):
+		self._batch.append(self.frame_time.pack(frame_num, frame_time) + \
+		pack_robots(colors, self._robots))
+		if len(self._batch) >= default.log_batch:
+			self.flush()
+	
+	# Giving the records kept to the thread
+	def flush(self):
+		if len(self._batch) > 0:
+			with self._condition:
+				self._pending.append(self._batch)
+				self._condition.notify()
+			self._batch = []
+	
+	# Thread loop. Writes the batches given.
+	def _write(self):
+		while True:
+			with self._condition:
+				while self._running and len(self._pending) == 0:
+					self._condition.wait()
+				if len(self._pending) == 0:
+					break
+				batch = self._pending.popleft()
+			self._file.write(''.join(batch))
+			self._file.flush()
+			self._written += len(batch)
+	
+	# Writing the last records and closing the file
+	def close(self):
+		self.flush()
+		with self._condition:
+			self._running = 0
+			self._condition.notify()
+		self._thread.join()
+		self._file.close()
+
+# This class holds the frame rate by changing the processing size. After
+# every frame it gets the processing time; when the frames of the last
+# default.adaptive_window go over the deadline (90th percentile) the next
+# smaller step is used, and when the next bigger one would still fit in
+# the headroom (time grows with the pixels) it goes back up.
+class deadline_scheduler:
+	
+	def __init__(self, deadline):
+		self._deadline = deadline	# ms
+		self._base = default.multiple
+		self._level = 0				# Step used
+		self._times = deque(maxlen=default.adaptive_window)
+		self._frames = 0
+		self._overruns = 0			# Frames over the deadline
+		self._changes = 0			# Changes of scale
+		self.set_level(0)
+	
+	def set_level(self, level):
+		step = default.adaptive_steps[level]
+		self._level = level
+		self._times.clear()
+		default.multiple = self._base * step
+		default.area_scale = step * step
+	
+	# Time (ms) of the last frame
+	def update(self, frame_time):
+		self._frames += 1
+		if frame_time > self._deadline:
+			self._overruns += 1
+		self._times.append(frame_time)
+		if len(self._times) == self._times.maxlen:
+			steps = default.adaptive_steps
+			recent = np.percentile(self._times, 90)
+			if recent > self._deadline and self._level < len(steps) - 1:
+				self.set_level(self._level + 1)
+				self._changes += 1
+			elif self._level > 0 and recent * (steps[self._level - 1] / \
+			steps[self._level]) ** 2 < self._deadline * default.adaptive_headroom:
+				self.set_level(self._level - 1)
+				self._changes += 1
+		if default.stages is not None:
+			default.stages.gauge('scale', default.multiple)
+			default.stages.gauge('deadline_ms', self._deadline)
+			default.stages.gauge('overruns_total', self._overruns)
+			default.stages.gauge('scale_changes_total', self._changes)
+	
+	# Back to the chosen size
+	def close(self):
+		default.multiple = self._base
+		default.area_scale = 1.0
+
+# This class keeps the thresholds ready to be used: the values and the
+# lookup tables.
+class threshold_data:
+	
+	def __init__(self, thr, tables=None):
+		self._values = list(thr)
+		if tables is None:
+			tables = threshold_tables(thr)
+		self._lut, self._classes = tables
+
+# This class keeps the thresholds of a file compiled (threshold_data) and
+# stores the compiled tables on disk, named by a hash of the file. The
+# file is checked every frame (modification time and size); when it
+# changes, the new thresholds replace the old ones in one assignment, so
+# a frame always uses a complete set of them.
+class threshold_cache:
+	
+	# Layout of the compiled tables (threshold_tables). It is part of the
+	# hash and stored in the cache file: a file of another layout is
+	# compiled again. Change it when the tables change.
+	version = 1
+	
+	def __init__(self, file_name):
+		self._file_name = file_name
+		self._stamp = None		# (modification time, size) of the file
+		self._key = None		# Hash of the file contents
+		self._data = None
+		self._reloads = 0
+		if self.check() is None:
+			print 'File not found or corrupted. Using threshold defaults.'
+			self._data = threshold_data(default.def_vals)
+	
+	# Returns the current thresholds, reloading them if the file changed
+	def check(self):
+		try:
+			info = os.stat(self._file_name)
+		except OSError:
+			return self._data
+		stamp = (info.st_mtime, info.st_size)
+		if stamp != self._stamp:
+			try:
+				self.reload()
+				self._stamp = stamp
+			except (IOError, IndexError, ValueError):
+				# File being written or corrupted, trying next frame
+				pass
+		return self._data
+	
+	# Reads the file and gets its compiled thresholds from the cache (or
+	# compiles and stores them)
+	def reload(self):
+		with open(self._file_name, 'rb') as f:
+			contents = f.read()
+		key = hashlib.sha1('%d\n' % self.version + contents).hexdigest()
+		if key == self._key:
+			return
+		cache_name = os.path.join(default.cache_dir, key + '.npz')
+		data = None
+		if os.path.exists(cache_name):
+			data = self.load(cache_name)
+		if data is None:
+			thr = config_store(self._file_name, contents).thresholds()
+			data = threshold_data(thr)
+			if not os.path.isdir(default.cache_dir):
+				os.makedirs(default.cache_dir)
+			f, temp_name = temp_file(cache_name)
+			with f:
+				np.savez(f, version=self.version, values=np.array(data._values), \
+				lut=data._lut, classes=data._classes)
+			replace_file(temp_name, cache_name)
+		self._data, self._key = data, key
+		self._reloads += 1
+	
+	# Compiled thresholds of a cache file. None if the file has no version,
+	# another one or cannot be read (it is compiled again).
+	def load(self, cache_name):
+		try:
+			stored = np.load(cache_name)
+			if 'version' not in stored.files or \
+			int(stored['version']) != self.version:
+				return None
+			return threshold_data(stored['values'].tolist(), \
+			(stored['lut'], stored['classes']))
+		except (IOError, ValueError, KeyError):
+			return None
+
+# This class keeps the values of the configuration file (vals.txt) in
+# memory: the low and up (h, s, v) thresholds of each color and the units
+# (diameter in pixels, size in cms and pixels/cm). The file is parsed
+# once; changes are done in memory and written together by save(), to a
+# temporary file that then replaces the old one. The layout of the file
+# does not change.
+class config_store:
+	
+	def __init__(self, file_name, contents=None):
+		self._file_name = file_name
+		self._lock = Lock()
+		self._thresholds = {}	# Color: [h, s, v low, h, s, v up]
+		self._pixels = 0		# Diameter of the known circle in pixels
+		self._cms = 0.0			# Size of the known circle in cms
+		self._pixels_cm = 0.0	# Conversion value
+		self._stamp = None
+		if contents is None:
+			self._stamp = self.file_stamp()
+			with open(file_name, 'rb') as f:
+				contents = f.read()
+		self.parse(contents)
+	
+	# Modification time and size of the file
+	def file_stamp(self):
+		info = os.stat(self._file_name)
+		return (info.st_mtime, info.st_size)
+	
+	# Reads the thresholds and units from the contents of a file
+	def parse(self, contents):
+		lines = [line.strip() for line in contents.splitlines()]
+		thresholds = {}
+		pixels = None
+		for y in range(len(lines)):
+			if lines[y] in default.colors_used and y + 4 < len(lines) and \
+			lines[y + 1] in ('low', 'up'):
+				values = thresholds.setdefault(lines[y], [None] * 6)
+				first = 0 if lines[y + 1] == 'low' else 3
+				for a in range(3):
+					values[first + a] = int(lines[y + 2 + a].split('=')[1])
+			if lines[y] == 'units' and y + 3 < len(lines):
+				pixels = int(float(lines[y + 1]))
+				cms = float(lines[y + 2])
+				pixels_cm = float(lines[y + 3])
+		for color in default.colors_used:
+			if color not in thresholds or None in thresholds[color]:
+				raise ValueError('thresholds of ' + color + ' not found')
+		if pixels is None:
+			raise ValueError('units not found')
+		with self._lock:
+			self._thresholds = thresholds
+			self._pixels, self._cms, self._pixels_cm = pixels, cms, pixels_cm
+	
+	# Parses the file again if it was changed by another program
+	def refresh(self):
+		try:
+			stamp = self.file_stamp()
+			if stamp != self._stamp:
+				with open(self._file_name, 'rb') as f:
+					self.parse(f.read())
+				self._stamp = stamp
+		except (OSError, IOError, IndexError, ValueError):
+			pass
+	
+	# The 30 threshold values, in the order of default.colors_used
+	def thresholds(self):
+		with self._lock:
+			thr = []
+			for color in default.colors_used:
+				thr += self._thresholds[color]
+			return thr
+	
+	# Changes the thresholds of one color (not saved yet)
+	def set_thresholds(self, color, low, up):
+		with self._lock:
+			self._thresholds[color] = [int(v) for v in list(low) + list(up)]
+	
+	# The units: diameter in pixels, size in cms and pixels/cm
+	def units(self):
+		with self._lock:
+			return self._pixels, self._cms, self._pixels_cm
+	
+	# Changes the units (not saved yet). Values not given are kept.
+	def set_units(self, pixels=None, cms=None, pixels_cm=None):
+		with self._lock:
+			if pixels is not None:
+				self._pixels = int(pixels)
+			if cms is not None:
+				self._cms = float(cms)
+			if pixels_cm is not None:
+				self._pixels_cm = float(pixels_cm)
+	
+	# Contents of the file with the values in memory
+	def contents(self):
+		lines = ['Values for color thresholds.', '']
+		for color in default.colors_used:
+			values = self._thresholds[color]
+			for part, first in (('low', 0), ('up', 3)):
+				lines += [color, part, 'h=' + str(values[first]), \
+				's=' + str(values[first + 1]), 'v=' + str(values[first + 2]), '']
+		lines += ['(pixels, cms, pixels/cm)', 'units', str(self._pixels), \
+		str(self._cms), str(self._pixels_cm)]
+		return '\n'.join(lines) + '\n'
+	
+	# Writes all the changes at once (temporary file, then renaming)
+	def save(self):
+		with self._lock:
+			temp_name = self._file_name + '.tmp'
+			with open(temp_name, 'wb') as f:
+				f.write(self.contents())
+			replace_file(temp_name, self._file_name)
+			self._stamp = self.file_stamp()
+
+# This class keeps a frozen frame (or a short clip) for the threshold
+# adjustment. Its HSV conversion and the histograms of each channel are
+# made once, so a slider change only thresholds and opens the mask again
+# (and only if a value changed). The pixels of each class are counted
+# once per thresholds of that class.
+class threshold_tuner:
+	
+	sizes = [180, 256, 256]	# Values of h, s and v
+	
+	def __init__(self, frames):
+		if len(frames) == 0:
+			raise ValueError('no frames to tune')
+		self._hsv = [cv2.cvtColor(img, cv2.COLOR_BGR2HSV) for img in frames]
+		self._histograms = []
+		for hsv in self._hsv:
+			self._histograms.append([cv2.calcHist([hsv], [c], None, \
+			[self.sizes[c]], [0, self.sizes[c]]).ravel() for c in range(3)])
+		self._index = 0		# Frame shown
+		shape = self._hsv[0].shape[:2]
+		self._mask = np.zeros(shape, np.uint8)
+		self._opening = np.zeros(shape, np.uint8)
+		self._scratch = np.zeros(shape, np.uint8)
+		self._key = None	# Frame and thresholds of the mask
+		self._counts = {}	# Color: [frame and thresholds, pixels]
+		self._updates = 0	# Masks made
+	
+	# Next frame of the clip
+	def next(self):
+		self._index = (self._index + 1) % len(self._hsv)
+	
+	# Binary image and its opening with the given thresholds
+	def update(self, low, up):
+		key = (self._index, tuple(low), tuple(up))
+		if key != self._key:
+			cv2.inRange(self._hsv[self._index], np.array(low), np.array(up), \
+			self._mask)
+			cv2.morphologyEx(self._mask, cv2.MORPH_OPEN, default.kernel, \
+			self._opening)
+			self._key = key
+			self._updates += 1
+		return self._mask, self._opening
+	
+	# Pixels of each class (default.colors_used) of the frame shown, with
+	# the thresholds ({color: [h, s, v low, h, s, v up]})
+	def counts(self, thresholds):
+		pixels = []
+		for color in default.colors_used:
+			values = thresholds[color]
+			key = (self._index, tuple(values))
+			if self._counts.get(color, [None])[0] != key:
+				if self._key is not None and \
+				key == (self._key[0], self._key[1] + self._key[2]):
+					mask = self._mask
+				else:
+					mask = cv2.inRange(self._hsv[self._index], \
+					np.array(values[:3]), np.array(values[3:]), self._scratch)
+				self._counts[color] = [key, cv2.countNonZero(mask)]
+			pixels.append(self._counts[color][1])
+		return pixels
+	
+	# Histograms of h, s and v of the frame shown (log scale, one over the
+	# other) with the thresholds and the pixels of each class
+	def histogram_image(self, low, up, pixels):
+		img = np.zeros((3 * 70 + 20 * len(pixels), 256, 3), np.uint8)
+		for c in range(3):
+			histogram = np.log1p(self._histograms[self._index][c])
+			heights = (60 * histogram / max(histogram.max(), 1)).astype(int)
+			base = 70 * c + 65
+			for value in range(self.sizes[c]):
+				if heights[value] > 0:
+					cv2.line(img, (value, base), (value, base - heights[value]), \
+					(150, 150, 150), 1)
+			cv2.line(img, (low[c], base), (low[c], base - 62), (0, 255, 0), 1)
+			cv2.line(img, (up[c], base), (up[c], base - 62), (0, 0, 255), 1)
+			cv2.putText(img, 'hsv'[c], (240, base - 48), \
+			cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+		for k in range(len(pixels)):
+			cv2.putText(img, default.colors_used[k] + ' = ' + str(pixels[k]), \
+			(5, 3 * 70 + 20 * k + 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, \
+			(255, 255, 255), 1)
+		return img
+
+# This class keeps the process pool of the 'pool' execution mode and the
+# shared memory used with it: the frame (written once per frame) and the
+# red, green, blue and yellow binary images written by the workers.
+class segmentation_pool:
+	
+	def __init__(self, shape):
+		self._shape = shape
+		width, height, depth = shape
+		self._frame = RawArray('B', width * height * depth)
+		self._masks = RawArray('B', 4 * width * height)
+		self._pool = Pool(default.pool_size, pool_init, \
+		(self._frame, self._masks))
+		self._img = np.frombuffer(self._frame, np.uint8).reshape(shape)
+		self._openings = np.frombuffer(self._masks, np.uint8).reshape( \
+		(4, width, height))
+		# Bands of rows, one per process
+		edges = np.linspace(0, width, default.pool_size + 1).astype(int)
+		self._bands = zip(edges[:-1], edges[1:])
+	
+	# Closing the pool
+	def close(self):
+		self._pool.close()
+		self._pool.join()
+
+# This class keeps what the detection needs from one frame to the next:
+# the motion models (tracking mode), the process pool ('pool' execution
+# mode) and the robots structures (N robot mode).
+class detection_state:
+	
+	def __init__(self):
+		# Number of robots
+		if default.multi_robot:
+			self._bot_num = len(default.robot_colors)
+		else:
+			self._bot_num = 3
+		
+		# Robots and yellow colors structures of the N robot mode (reused)
+		self._robots, self._robot_yellows = [], []
+		# Motion models used in tracking mode
+		self._tracks = []
+		for x in range(self._bot_num):
+			self._robots.append(circle_data())
+			self._robot_yellows.append(circle_data())
+			self._tracks.append(robot_track())
+		
+		# Process pool (made with the first frame)
+		self._seg_pool = None
+	
+	# Closing the process pool, if any
+	def close(self):
+		if self._seg_pool is not None:
+			self._seg_pool.close()
+			self._seg_pool = None
+
+# This class keeps the images (and circle_data structures) the detection
+# makes on every frame, so the next frames write into the same memory:
+# OpenCV through its dst arguments and NumPy through out. Each image has
+# a name and is a view of a flat array with room for its whole captured
+# frame size (see reserve), so the processing image, the regions of interest
+# and the windows of the tracking and pyramid modes (of a different size
+# on each frame) all reuse it. An image is valid until its name is asked
+# for again. _allocations counts the arrays and structures made here;
+# after the first frames it must not grow. Arrays sized by the number of
+# objects found (labelling and statistics) are still made on every frame:
+# they are small and mostly taken by NumPy from its cache of freed blocks
+# (see benchmarks/bench_buffers.py, which counts all NumPy allocations).
+class frame_buffers:
+	
+	def __init__(self):
+		self._arrays = {}
+		self._circles = {}
+		self._allocations = 0
+		self._counted = 0	# Allocations at the last frame_allocations
+		self._frame = (0, 0)	# Rows and columns of the captured frames
+	
+	# Sizing the images for captured frames of the given shape
+	def reserve(self, shape):
+		self._frame = tuple(shape[:2])
+	
+	# Image of the given shape and type (its values are not cleared). Its
+	# room is its shape for a whole captured frame; by default the rows
+	# and columns of the frame with the channels of the shape.
+	def get(self, name, shape, dtype=np.uint8, room=None):
+		if room is None:
+			room = self._frame + tuple(shape[2:])
+		size = reduce(lambda a, b: a * b, shape, 1)
+		array = self._arrays.get(name)
+		if array is None or array.size < size or array.dtype != dtype or \
+		not default.reuse_buffers:
+			array = np.empty(max(size, reduce(lambda a, b: a * b, room, 1)), \
+			dtype)
+			self._arrays[name] = array
+			self._allocations += 1
+		return array[:size].reshape(shape)
+	
+	# List of number cleared circle_data structures
+	def circles(self, name, number):
+		structures = self._circles.get(name)
+		if structures is None or len(structures) != number or \
+		not default.reuse_buffers:
+			structures = [circle_data() for x in range(number)]
+			self._circles[name] = structures
+			self._allocations += 1
+		else:
+			for colour in structures:
+				colour.clear()
+		return structures
+	
+	# Allocations since the last call (those of a frame)
+	def frame_allocations(self):
+		count = self._allocations - self._counted
+		self._counted = self._allocations
+		return count
+
+# This class keeps the calibration of a camera (a JSON file): intrinsics
+# (camera matrix and distortion coefficients of its images of the given
+# size) and the homography from undistorted pixels (column, row) to the
+# floor (cm). Frames are never undistorted: a lookup map with the floor
+# position of every pixel is made once per frame size (and kept in
+# default.cache_dir, named by a hash of the calibration), and only the
+# centers of the robots and their yellows are looked up. Without a file
+# it is only a homography (no distortion).
+class camera_calibration:
+	
+	def __init__(self, file_name=None, homography=None):
+		self._file_name = file_name
+		self._size = None			# Columns and rows of the calibrated images
+		self._matrix = np.eye(3)	# Camera matrix
+		self._distortion = np.zeros(5)
+		self._homography = np.eye(3)
+		self._error = 0.0			# Reprojection error (pixels) of calibrate
+		self._map = None			# Floor position of every pixel
+		if file_name is not None:
+			self.load()
+		elif homography is not None:
+			self._homography = np.array(homography, np.float64).reshape(3, 3)
+	
+	def load(self):
+		with open(self._file_name) as f:
+			values = json.load(f)
+		self._size = values.get('size')
+		self._matrix = np.array(values['camera_matrix'], \
+		np.float64).reshape(3, 3)
+		self._distortion = np.array(values['distortion'], np.float64).ravel()
+		self._homography = np.array(values['homography'], \
+		np.float64).reshape(3, 3)
+		self._error = values.get('error', 0.0)
+		self._map = None
+	
+	# Writes the calibration (temporary file, then renaming)
+	def save(self, file_name):
+		values = {'size': self._size, 'camera_matrix': self._matrix.tolist(), \
+		'distortion': self._distortion.tolist(), \
+		'homography': self._homography.tolist(), 'error': self._error}
+		with open(file_name + '.tmp', 'w') as f:
+			json.dump(values, f, indent=1)
+		replace_file(file_name + '.tmp', file_name)
+		self._file_name = file_name
+	
+	# Camera matrix for frames of the given shape (the camera may give
+	# other sizes than the calibrated one)
+	def frame_matrix(self, shape):
+		if self._size is None:
+			return self._matrix
+		scale = np.array([[shape[1] / float(self._size[0]), 0, 0], \
+		[0, shape[0] / float(self._size[1]), 0], [0, 0, 1]])
+		return scale.dot(self._matrix)
+	
+	# Lookup map of frames of the given shape: [row, column] = floor x, y
+	def lookup(self, shape):
+		rows, cols = shape[:2]
+		if self._map is not None and self._map.shape[:2] == (rows, cols):
+			return self._map
+		key = hashlib.sha1(json.dumps([self._matrix.tolist(), \
+		self._distortion.tolist(), self._homography.tolist(), self._size, \
+		rows, cols])).hexdigest()
+		cache_name = os.path.join(default.cache_dir, key + '.npy')
+		if os.path.exists(cache_name):
+			self._map = np.load(cache_name)
+			return self._map
+		
+		# Undistorted position of every pixel (in pixels of the calibrated
+		# images), then on the floor
+		points = np.empty((rows, cols, 2), np.float64)
+		points[:, :, 0] = np.arange(cols)[None, :]
+		points[:, :, 1] = np.arange(rows)[:, None]
+		points = points.reshape(-1, 1, 2)
+		if self._distortion.any():
+			points = cv2.undistortPoints(points, self.frame_matrix(shape), \
+			self._distortion, P=self._matrix)
+		elif self._size is not None:
+			points = cv2.perspectiveTransform(points, \
+			self._matrix.dot(np.linalg.inv(self.frame_matrix(shape))))
+		self._map = cv2.perspectiveTransform(points, \
+		self._homography).reshape(rows, cols, 2).astype(np.float32)
+		
+		if not os.path.isdir(default.cache_dir):
+			os.makedirs(default.cache_dir)
+		f, temp_name = temp_file(cache_name)
+		with f:
+			np.save(f, self._map)
+		replace_file(temp_name, cache_name)
+		return self._map
+	
+	# Floor positions of points ([row, column]) of a frame
+	def floor_points(self, points, shape):
+		table = self.lookup(shape)
+		rows, cols = shape[:2]
+		return [[float(v) for v in table[min(max(int(p[0]), 0), rows - 1), \
+		min(max(int(p[1]), 0), cols - 1)]] for p in points]
+	
+	# Floor pose of the robots found on a frame: position of the body
+	# center and orientation of the yellow from it, counter-clockwise from
+	# the floor x axis when its y axis points up (as the orientations of
+	# the image)
+	def locate(self, colors, yellow_colors, shape):
+		for colour in colors:
+			if colour._pix_number == 0:
+				colour._floor, colour._floor_orientation = [], 0
+				continue
+			if colour._correspondence >= 0:
+				yellow = yellow_colors[colour._correspondence]._center_mass
+			else:
+				yellow = colour._center_mass
+			body, yellow = self.floor_points([colour._center_mass, yellow], shape)
+			colour._floor = body
+			colour._floor_orientation = int(round(math.degrees(math.atan2( \
+			yellow[1] - body[1], yellow[0] - body[0])))) % 360
+
+# This class merges the robots seen by the cameras (see arena_poses) into
+# the robots of the arena (default.robot_colors in N robot mode, red,
+# green and blue if not). A robot in the overlap of two cameras is seen by
+# both: of the detections of a color closer than default.merge_radius, the
+# one with more pixels (the least cut by the border of its image) is
+# kept. Robots found before take the closest detection of their color
+# and the rest take the biggest ones left, like in N robot mode. The
+# robots are circle_data in arena coordinates ([x, y], rounded).
+class camera_merger:
+	
+	def __init__(self):
+		if default.multi_robot:
+			self._bot_num = len(default.robot_colors)
+		else:
+			self._bot_num = 3
+		self._codes = [robot_color_code(x) for x in range(self._bot_num)]
+		self._robots = [circle_data() for x in range(self._bot_num)]
+		self._cameras = [-1] * self._bot_num	# Camera of each robot
+		self._duplicates = 0
+	
+	def merge(self, detections):
+		# Biggest first, so a duplicate is dropped for the bigger one
+		detections = sorted(detections, key=lambda d: -d[6])
+		kept = []
+		for d in detections:
+			if any(k[1] == d[1] and k[0] != d[0] and \
+			euclidean_dist(k[2:4], d[2:4]) <= default.merge_radius for k in kept):
+				self._duplicates += 1
+			else:
+				kept.append(d)
+		
+		for code in range(3):
+			indices = [x for x in range(self._bot_num) if self._codes[x] == code]
+			objects = [d for d in kept if d[1] == code][:len(indices)]
+			# Robots found before take the closest detection
+			taken = {}
+			known = [x for x in indices if self._robots[x]._pix_number > 0]
+			if len(known) > 0 and len(objects) > 0:
+				rows, cols = hungarian([[euclidean_dist( \
+				self._robots[x]._center_mass, o[2:4]) for o in objects] \
+				for x in known])
+				for k in range(len(rows)):
+					taken[cols[k]] = known[rows[k]]
+			# The rest take the detections left
+			left = [n for n in range(len(objects)) if n not in taken]
+			for x in indices:
+				if x not in taken.values() and len(left) > 0:
+					taken[left.pop(0)] = x
+			
+			for x in indices:
+				self._robots[x].clear()
+				self._robots[x]._center_mass = [0, 0]
+				self._cameras[x] = -1
+			for k in taken:
+				camera, code, ax, ay, orientation, yellow, pixels = objects[k]
+				robot = self._robots[taken[k]]
+				robot._center_mass = [int(round(ax)), int(round(ay))]
+				robot._orientation = orientation
+				robot._correspondence = taken[k] if yellow else -1
+				robot._pix_number = pixels
+				self._cameras[taken[k]] = camera
+		return self._robots
+
+# This class measures the time of each stage of a frame (capture,
+# detection stages, drawing and output). The stages call stage_lap when
+# they end; the time since the last lap is added to that stage (a stage
+# can run many times per frame, e.g. once per tracking window). stop keeps
+# the times of the frame: the last default.metrics_window frames for the
+# percentiles, plus the count and sum of all of them.
+class stage_timer:
+	
+	def __init__(self, window=None):
+		self._window = window or default.metrics_window
+		self._names = []	# Stages, in order of first use
+		self._times = {}	# Time (ms) of each stage on the last frames
+		self._sums = {}		# Time (ms) of each stage on all frames
+		self._frame = {}	# Times of the current frame
+		self._frames = 0	# Frames measured
+		self._gauges = []	# Other values: [[name, value], ...]
+		self._last = time.time()
+		self._dumped = time.time()	# Time of the last dump
+	
+	# Beginning of a frame
+	def start(self):
+		self._frame = {}
+		self._last = time.time()
+	
+	def lap(self, name):
+		now = time.time()
+		if name not in self._times:
+			self.add(name)
+		self._frame[name] = self._frame.get(name, 0.0) + \
+		(now - self._last) * 1000
+		self._last = now
+	
+	# New stage (0 ms on the frames before)
+	def add(self, name):
+		self._names.append(name)
+		self._times[name] = deque([0.0] * min(self._frames, self._window), \
+		self._window)
+		self._sums[name] = 0.0
+	
+	# End of a frame. 'frame' is the sum of all stages.
+	def stop(self):
+		if 'frame' not in self._times:
+			self.add('frame')
+		self._frame['frame'] = sum(self._frame.values())
+		for name in self._names:
+			value = self._frame.get(name, 0.0)
+			self._times[name].append(value)
+			self._sums[name] += value
+		self._frames += 1
+	
+	# Sets a value exported with the stage times (e.g. the scale)
+	def gauge(self, name, value):
+		for item in self._gauges:
+			if item[0] == name:
+				item[1] = value
+				return
+		self._gauges.append([name, value])
+	
+	# Percentiles of the time of each stage: [[name, [values]], ...]
+	def percentiles(self, q=(50, 95, 99)):
+		return [[name, list(np.percentile(self._times[name], q))] \
+		for name in self._names]
+	
+	# Stages with their p50, p95, p99, mean (last frames), count and sum
+	def summary(self):
+		rows = []
+		for name, values in self.percentiles():
+			rows.append([name] + values + [np.mean(self._times[name]), \
+			self._frames, self._sums[name]])
+		return rows
+	
+	# Text of the summary as CSV, JSON or Prometheus text format
+	# (times in seconds, as a summary metric)
+	def export(self, kind):
+		rows = self.summary()
+		if kind == 'csv':
+			lines = ['stage,p50_ms,p95_ms,p99_ms,mean_ms,count,sum_ms']
+			for row in rows:
+				lines.append(row[0] + ',' + ','.join('%.4f' % v \
+				for v in row[1:5]) + ',' + str(row[5]) + ',%.4f' % row[6])
+			if len(self._gauges) > 0:
+				lines += ['', 'gauge,value']
+				for name, value in self._gauges:
+					lines.append(name + ',' + str(value))
+		elif kind == 'json':
+			stages = {}
+			for row in rows:
+				stages[row[0]] = dict(zip(['p50_ms', 'p95_ms', 'p99_ms', \
+				'mean_ms', 'count', 'sum_ms'], row[1:]))
+			return json.dumps({'frames': self._frames, 'window': \
+			self._window, 'stages': stages, 'gauges': dict(self._gauges)}, \
+			indent=1, sort_keys=True) + '\n'
+		else:
+			lines = ['# HELP robot_tracker_stage_seconds Time of each stage ' + \
+			'of the frames.', '# TYPE robot_tracker_stage_seconds summary']
+			for row in rows:
+				for q, value in zip(['0.5', '0.95', '0.99'], row[1:4]):
+					lines.append('robot_tracker_stage_seconds{stage="%s",' \
+					'quantile="%s"} %.6f' % (row[0], q, value / 1000))
+				lines.append('robot_tracker_stage_seconds_sum{stage="%s"} %.6f' \
+				% (row[0], row[6] / 1000))
+				lines.append('robot_tracker_stage_seconds_count{stage="%s"} %d' \
+				% (row[0], row[5]))
+			for name, value in self._gauges:
+				lines.append('# TYPE robot_tracker_%s gauge' % name)
+				lines.append('robot_tracker_%s %s' % (name, value))
+		return '\n'.join(lines) + '\n'
+	
+	# Writes the summary to a file (temporary file, then renaming). The
+	# format is chosen by the extension: .csv, .json or else Prometheus.
+	def dump(self, file_name):
+		if self._frames == 0:
+			return
+		kind = os.path.splitext(file_name)[1].lower()[1:]
+		temp_name = file_name + '.tmp'
+		with open(temp_name, 'wb') as f:
+			f.write(self.export(kind))
+		replace_file(temp_name, file_name)
+		self._dumped = time.time()
+	
+	# Writes the summary if default.metrics_period seconds have passed
+	# since the last time
+	def dump_due(self, file_name):
+		if file_name and time.time() - self._dumped >= default.metrics_period:
+			self.dump(file_name)
+
+# This class shows the results on its own thread (display 'thread'), so
+# the detection never waits for the drawing and the window. The loop
+# offers every result, but only one per display period is taken: a copy
+# of the image and of the robots data, replacing any not shown yet.
+class display_view:
+	
+	def __init__(self, rate):
+		self._period = 1.0 / rate
+		self._condition = Condition()
+		self._result = None		# Newest result not shown
+		self._taken = 0			# Time of the last result taken
+		self._shown = 0			# Results shown
+		self._quit = 0			# 'q' pressed on the window
+		self._running = 1
+		self._thread = Thread(target=self._show)
+		self._thread.daemon = True
+		self._thread.start()
+	
+	def offer(self, img, colors, yellow_colors, matches, unmatched):
+		now = time.time()
+		if now - self._taken < self._period:
+			return
+		self._taken = now
+		result = (img.copy(), copy.deepcopy(colors), \
+		copy.deepcopy(yellow_colors), list(matches), list(unmatched))
+		with self._condition:
+			self._result = result
+			self._condition.notify()
+	
+	# Thread loop. The window belongs to this thread.
+	def _show(self):
+		cv2.namedWindow('center of mass')
+		cv2.setMouseCallback('center of mass', end_point)
+		while self._running:
+			with self._condition:
+				if self._result is None:
+					self._condition.wait(self._period)
+				result, self._result = self._result, None
+			if result is not None:
+				cv2.imshow('center of mass', draw_result(*result))
+				self._shown += 1
+			# Press "q" (quit) to exit
+			if cv2.waitKey(1) & 0xFF == ord('q'):
+				self._quit = 1
+		cv2.destroyWindow('center of mass')
+		cv2.waitKey(1)
+	
+	# Stopping the thread
+	def close(self):
+		self._running = 0
+		self._thread.join()
+
+# This class stops the detection without its window: Ctrl+C or SIGTERM
+# (signals, only when running on the main thread) or 'q' and Enter on
+# the console. The console is read by one thread for all hooks.
+class quit_hook:
+	
+	_reader = None		# Console thread
+	_active = None		# Hook stopped by the console
+	
+	def __init__(self):
+		self._quit = 0
+		self._handlers = []
+		for number in (signal.SIGINT, signal.SIGTERM):
+			try:
+				self._handlers.append((number, \
+				signal.signal(number, self._signal)))
+			except ValueError:
+				pass	# Not the main thread
+		quit_hook._active = self
+		if quit_hook._reader is None and sys.stdin.isatty():
+			quit_hook._reader = Thread(target=quit_hook._read)
+			quit_hook._reader.daemon = True
+			quit_hook._reader.start()
+	
+	def _signal(self, number, frame):
+		self._quit = 1
+	
+	@staticmethod
+	def _read():
+		while True:
+			line = sys.stdin.readline()
+			if not line:
+				break
+			if line.strip() == 'q' and quit_hook._active is not None:
+				quit_hook._active._quit = 1
+	
+	# Restoring the signal handlers
+	def close(self):
+		for number, handler in self._handlers:
+			signal.signal(number, handler)
+		if quit_hook._active is self:
+			quit_hook._active = None
+
+# This module replaces a file with a new one by renaming it. On Windows
+# the old file has to be removed first.
+def replace_file(temp_name, file_name):
+	try:
+		os.rename(temp_name, file_name)
+	except OSError:
+		os.remove(file_name)
+		os.rename(temp_name, file_name)
+
+# This module opens a new temporary file (binary) in the folder of a file,
+# with a name of its own: processes writing the same cache file (the
+# cameras of multi_camera) do not write over each other's before
+# replace_file.
+def temp_file(file_name):
+	handle, temp_name = tempfile.mkstemp('.tmp', \
+	os.path.basename(file_name) + '.', os.path.dirname(file_name) or '.')
+	return os.fdopen(handle, 'wb'), temp_name
+
+# This module returns the configuration store shared by all modules. It
+# is loaded the first time; after that, only a file changed by another
+# program is parsed again.
+def get_config():
+	if default.config is None:
+		default.config = config_store(default.file_name)
+	else:
+		default.config.refresh()
+	return default.config
+
+# This module returns the frame buffers shared by the detection modules
+# (made the first time)
+def get_buffers():
+	if default.buffers is None:
+		default.buffers = frame_buffers()
+	return default.buffers
+
+# This module ends a stage of the detection, if the stages are measured
+def stage_lap(name):
+	if default.stages is not None:
+		default.stages.lap(name)
 
 # This module assigns the gathered data to the corresponding variable.
 # It is used to make few module calls.
 def assignment(colour,minx, miny, maxx, maxy, pix_number, cumulative_x, cumulative_y, yellow):
-	colour._minx = minx * (int(1/default.multiple))
-	colour._miny = miny * (int(1/default.multiple))
-	colour._maxx = maxx * (int(1/default.multiple))
-	colour._maxy = maxy * (int(1/default.multiple))
+	assign_bounds(colour, minx, miny, maxx, maxy, pix_number)
 	colour._pix_number = pix_number
 	#colour._center_mass = center_of_mass
 	colour._cumulative_x = cumulative_x
@@ -99,25 +1554,60 @@ def assignment(colour,minx, miny, maxx, maxy, pix_number, cumulative_x, cumulati
 	if cumulative_x == 0 or cumulative_y == 0:
 		colour._center_mass = [0, 0]
 	elif yellow == 0:
-		colour._center_mass = [(cumulative_x/pix_number) * (int(1/default.multiple)),\
-		(cumulative_y/pix_number) * (int(1/default.multiple))]
+		colour._center_mass = [to_original(cumulative_x/float(pix_number)),\
+		to_original(cumulative_y/float(pix_number))]
 	else:
-		colour._center_mass = [(cumulative_x/pix_number) * (int(1/default.multiple)),\
-		(cumulative_y/pix_number) * (int(1/default.multiple))]
+		colour._center_mass = [to_original(cumulative_x/float(pix_number)),\
+		to_original(cumulative_y/float(pix_number))]
 	return colour		
 
 # The purpose of this module is the same as assignment, but with less
 # assignments.
 def assignment2(colour,minx, miny, maxx, maxy, pix_number, center_of_mass):
-	colour._minx = minx * (int(1/default.multiple))
-	colour._miny = miny * (int(1/default.multiple))
-	colour._maxx = maxx * (int(1/default.multiple))
-	colour._maxy = maxy * (int(1/default.multiple))
-	colour._pix_number = pix_number # * 2 *(int(1/default.multiple))
-	colour._center_mass = [center_of_mass[0] * (int(1/default.multiple)), \
-	center_of_mass[1] * (int(1/default.multiple))]
+	assign_bounds(colour, minx, miny, maxx, maxy, pix_number)
+	colour._pix_number = pix_number
+	if pix_number == 0:
+		colour._center_mass = [0, 0]
+	else:
+		colour._center_mass = [to_original(center_of_mass[0]), \
+		to_original(center_of_mass[1])]
 	return colour
 
+# This module assigns the boundaries of an object, taken to the original
+# image. A missing object (no pixels) keeps them at zero, as its center:
+# to_original does not give 0 for 0 when default.multiple is below 1.
+def assign_bounds(colour, minx, miny, maxx, maxy, pix_number):
+	if pix_number == 0:
+		colour._minx, colour._miny, colour._maxx, colour._maxy = 0, 0, 0, 0
+	else:
+		colour._minx, colour._miny = to_original(minx), to_original(miny)
+		colour._maxx, colour._maxy = to_original(maxx), to_original(maxy)
+
+# This module gives the max. distance (original pixels) of a yellow center
+# to the center of a robot: default.match_factor radii of its body (half
+# the size of its bounding box). It follows the marker size on the image,
+# whatever default.multiple is.
+def match_radius(colour):
+	size = max(colour._maxx - colour._minx, colour._maxy - colour._miny) + 1
+	return default.match_factor * size / 2.0
+
+# This module takes a coordinate of the processing image to the original
+# image (pixel centers). default.multiple can be any scale, not only 1/n.
+def to_original(value):
+	return int(round((value + 0.5) / default.multiple - 0.5))
+
+# This module takes a coordinate of the original image to the processing
+# image (inverse of to_original, without rounding)
+def to_processing(value):
+	return (value + 0.5) * default.multiple - 0.5
+
+# This module tells if an object (pixels of the processing image) has the
+# size of a marker. The limits are given for default.multiple; when the
+# scheduler changes it they change with default.area_scale.
+def marker_size(pixels):
+	return default.min_area * default.area_scale <= pixels <= \
+	default.max_area * default.area_scale
+
 # This module takes the actual coordinate values and compares it with
 # the max. and min. coordinates.
 def limits(a,b,minx, miny, maxx, maxy):
@@ -236,6 +1726,89 @@ def DFS2(image, labels2, x2, y2, count):
 
 	return labels2, count, pix_num, [cumul_x, cumul_y], [minix, miniy, maxix, maxiy]
 
+# This module labels every connected object (8-neighbourhood) of a
+# binary image in one vectorized call. Optionally, only the region given
+# by the relative boundaries is labelled. It returns a list with the same
+# data DFS2 gathers for each object:
+# [pixels, center x, center y, min x, min y, max x, max y]
+# Labels are int32, so there is no wrap-around with many objects.
+def label_objects(image, rel_minix=0, rel_miniy=0, rel_maxix=None, \
+rel_maxiy=None):
+	width, height = image.shape
+	if rel_maxix is None:
+		rel_maxix = width - 1
+	if rel_maxiy is None:
+		rel_maxiy = height - 1
+	roi = image[rel_minix:rel_maxix + 1, rel_miniy:rel_maxiy + 1]
+	if roi.size == 0:
+		return []
+
+	if hasattr(cv2, 'connectedComponentsWithStats'):
+		# OpenCV 3.0 or newer. A part of the image is copied first (the
+		# labelling needs contiguous rows).
+		buffers = get_buffers()
+		if not roi.flags.c_contiguous:
+			contiguous = buffers.get('labels_roi', roi.shape)
+			np.copyto(contiguous, roi)
+			roi = contiguous
+		count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+		roi, buffers.get('labels', roi.shape, np.int32), connectivity=8, \
+		ltype=cv2.CV_32S)
+		pixels = stats[1:, cv2.CC_STAT_AREA].astype(np.int64)
+		# Centroids are (column, row) means. Scaling them back gives the
+		# cumulative values used by DFS2.
+		cumulative_x = np.rint(centroids[1:, 1] * pixels).astype(np.int64)
+		cumulative_y = np.rint(centroids[1:, 0] * pixels).astype(np.int64)
+		minx = stats[1:, cv2.CC_STAT_TOP]
+		miny = stats[1:, cv2.CC_STAT_LEFT]
+		maxx = minx + stats[1:, cv2.CC_STAT_HEIGHT] - 1
+		maxy = miny + stats[1:, cv2.CC_STAT_WIDTH] - 1
+	else:
+		if ndimage is not None:
+			# OpenCV 2.4 with scipy available
+			labels, count = ndimage.label(roi > 0, np.ones((3,3), np.int32), \
+			output=np.int32)
+		else:
+			# Neither of them, DFS2 labels an int32 array. Its pixel counts
+			# take some pixels more than once, so only the labels are used.
+			labels = np.zeros(roi.shape, np.int32)
+			count = 0
+			for y in range(roi.shape[1]):
+				for x in range(roi.shape[0]):
+					if roi[x,y] > 0 and labels[x,y] == 0:
+						labels, count = DFS2(roi, labels, x, y, count)[:2]
+		if count == 0:
+			return []
+		xs, ys = np.nonzero(labels)
+		index = labels[xs, ys]
+		pixels = np.bincount(index, minlength=count + 1)[1:]
+		cumulative_x = np.bincount(index, xs, count + 1)[1:].astype(np.int64)
+		cumulative_y = np.bincount(index, ys, count + 1)[1:].astype(np.int64)
+		if ndimage is not None:
+			boxes = ndimage.find_objects(labels)
+			minx = np.array([box[0].start for box in boxes])
+			maxx = np.array([box[0].stop - 1 for box in boxes])
+			miny = np.array([box[1].start for box in boxes])
+			maxy = np.array([box[1].stop - 1 for box in boxes])
+		else:
+			minx = np.full(count, roi.shape[0], np.intp)
+			miny = np.full(count, roi.shape[1], np.intp)
+			maxx, maxy = np.zeros(count, np.intp), np.zeros(count, np.intp)
+			np.minimum.at(minx, index - 1, xs)
+			np.minimum.at(miny, index - 1, ys)
+			np.maximum.at(maxx, index - 1, xs)
+			np.maximum.at(maxy, index - 1, ys)
+
+	if len(pixels) == 0:
+		return []
+
+	# Same order as the column by column scan of DFS2
+	order = np.lexsort((minx, miny))
+	objects = np.column_stack((pixels, cumulative_x // pixels + rel_minix,
+	cumulative_y // pixels + rel_miniy, minx + rel_minix, miny + rel_miniy,
+	maxx + rel_minix, maxy + rel_miniy))[order]
+	return objects.tolist()
+
 # This module calculates the euclidean distance between two given points
 def euclidean_dist(xy_vals1, xy_vals2):
 	xval = abs(xy_vals1[0] - xy_vals2[0])
@@ -253,8 +1826,7 @@ def reducing_color(color_struct):
 	if color_len > 1:
 		for x in range(color_len):
 			try:
-				if color_struct[color_len - x - 1][0] < 320 or \
-				color_struct[color_len - x - 1][0] > 520:
+				if not marker_size(color_struct[color_len - x - 1][0]):
 					# Popping from structure if the object is too small or 
 					# too big
 					color_struct.pop(color_len - x - 1)
@@ -278,8 +1850,7 @@ def reducing_yellow(color_struct):
 	color_len = len(color_struct)
 	if color_len > 3:
 		for x in range(color_len):
-			if color_struct[color_len - x - 1][0] < 320 or \
-			color_struct[color_len - x - 1][0] > 520:
+			if not marker_size(color_struct[color_len - x - 1][0]):
 				#print x
 				color_struct.pop(color_len - x - 1)
 
@@ -290,190 +1861,92 @@ def reducing_yellow(color_struct):
 	
 	return color_struct
 
+# This module gets, in one vectorized pass, the data of several binary
+# layers inside the relative boundaries (max. values excluded). The layers
+# are coded into one image (bit k set = pixel in layer k) and histograms
+# of the codes per row and per column give, for each layer:
+# [pixels, cumulative x, cumulative y, min x, min y, max x, max y]
+# A layer without pixels gives zeros.
+def color_statistics(rel_minix, rel_miniy, rel_maxix, rel_maxiy, openings):
+	layers = len(openings)
+	codes = 1 << layers
+	data = [[0,0,0,0,0,0,0] for k in range(layers)]
+	if rel_maxix <= rel_minix or rel_maxiy <= rel_miniy:
+		return data
+
+	# Label-coded image (of the bincount index type, so it is not copied)
+	buffers = get_buffers()
+	shape = (rel_maxix - rel_minix, rel_maxiy - rel_miniy)
+	coded = buffers.get('coded', shape, np.intp)
+	bit = buffers.get('coded_bit', shape)
+	coded.fill(0)
+	for k in range(layers):
+		layer = openings[k][rel_minix:rel_maxix, rel_miniy:rel_maxiy]
+		np.minimum(layer, 1, bit)
+		np.left_shift(bit, k, bit)
+		coded |= bit
+	rows, cols = shape
+
+	# Histograms of codes per row and per column
+	index = buffers.get('coded_index', shape, np.intp)
+	np.add(coded, (np.arange(rows) * codes)[:, None], index)
+	row_hist = np.bincount(index.ravel(), minlength=rows * codes).reshape( \
+	rows, codes)
+	np.add(coded, (np.arange(cols) * codes)[None, :], index)
+	col_hist = np.bincount(index.ravel(), minlength=cols * codes).reshape( \
+	cols, codes)
+	# Which codes have each layer bit set
+	bits = (np.arange(codes)[:, None] >> np.arange(layers)[None, :]) & 1
+	row_count = row_hist.dot(bits)
+	col_count = col_hist.dot(bits)
+	xs = np.arange(rel_minix, rel_maxix)
+	ys = np.arange(rel_miniy, rel_maxiy)
+
+	for k in range(layers):
+		pixels = int(row_count[:, k].sum())
+		if pixels == 0:
+			continue
+		x_found = np.flatnonzero(row_count[:, k])
+		y_found = np.flatnonzero(col_count[:, k])
+		data[k] = [pixels, int(row_count[:, k].dot(xs)), int(col_count[:, k].dot(ys)),
+		int(xs[x_found[0]]), int(ys[y_found[0]]), int(xs[x_found[-1]]),
+		int(ys[y_found[-1]])]
+	return data
+
 # This module counts the number of pixels and gets some object data
 # if supposedly only the desired objects were detected. When it finishes
 # the image scan, it saves the data into a structure
 def color_det_count(colours, rel_minix, rel_miniy, rel_maxix, rel_maxiy,\
 opening_red, opening_green, opening_blue):
 
-	width, height = opening_red.shape
-	pixels_red, pixels_green, pixels_blue = 0, 0, 0
-	cumulative_x_red, cumulative_x_green, cumulative_x_blue = 0, 0, 0
-	cumulative_y_red, cumulative_y_green, cumulative_y_blue = 0, 0, 0
-	minx_red, miny_red, maxx_red, maxy_red = 0, 0, 0, 0
-	minx_green, miny_green, maxx_green, maxy_green = 0, 0, 0, 0
-	minx_blue, miny_blue, maxx_blue, maxy_blue = 0, 0, 0, 0
-
-	# Getting color data
-	for y in range(rel_miniy, rel_maxiy):
-		for x in range(rel_minix, rel_maxix):
-			# Red
-			if opening_red[x,y] > 0:
-				pixels_red += 1			# Counting pixels
-				cumulative_x_red += x	# Increasing cumulative
-				cumulative_y_red += y	# Increasing cumulative
-				# Getting limits
-				minx_red, miny_red, maxx_red, maxy_red = limits(
-				x,y,minx_red,miny_red,maxx_red,maxy_red)
-		
-			# Green
-			if opening_green[x,y] > 0:
-				pixels_green += 1		# Counting pixels
-				cumulative_x_green += x	# Increasing cumulative
-				cumulative_y_green += y	# Increasing cumulative
-				# Getting limits
-				minx_green, miny_green, maxx_green, maxy_green = limits(
-				x,y,minx_green,miny_green,maxx_green,maxy_green)
-			
-			#Blue
-			if opening_blue[x,y] > 0:
-				pixels_blue += 1		# Counting pixels
-				cumulative_x_blue += x	# Increasing cumulative
-				cumulative_y_blue += y	# Increasing cumulative
-				# Getting limits
-				minx_blue, miny_blue, maxx_blue, maxy_blue = limits(
-				x,y,minx_blue,miny_blue,maxx_blue,maxy_blue)
-
-	# Assigning data to color structure
+	# Getting color data of the three layers at once
+	data = color_statistics(rel_minix, rel_miniy, rel_maxix, rel_maxiy, \
+	[opening_red, opening_green, opening_blue])
+
+	# Assigning data to color structure (red, green, blue)
 	is_yellow = 0
-	# Red
-	colours[0] = assignment(colours[0], minx_red, miny_red, maxx_red, maxy_red,
-	pixels_red, cumulative_x_red, cumulative_y_red, is_yellow)
-	
-	# Green
-	colours[1] = assignment(colours[1], minx_green, miny_green, maxx_green, maxy_green,
-	pixels_green, cumulative_x_green, cumulative_y_green, is_yellow)
-	
-	# Blue
-	colours[2] = assignment(colours[2], minx_blue, miny_blue, maxx_blue, maxy_blue,
-	pixels_blue, cumulative_x_blue, cumulative_y_blue, is_yellow)
+	for k in range(len(data)):
+		pixels, cumulative_x, cumulative_y, minx, miny, maxx, maxy = data[k]
+		colours[k] = assignment(colours[k], minx, miny, maxx, maxy,
+		pixels, cumulative_x, cumulative_y, is_yellow)
 	
 	return colours
 
-# This module, instead of counting pixels per "layer", it applies the 
-# DFS module to gather data, because supposedly more than 1 object was 
-# detected. It then reduces each color list and makes an structure
+# This module, instead of counting pixels per "layer", it labels the
+# connected objects to gather data, because supposedly more than 1 object
+# was detected. It then reduces each color list and makes an structure
 # with the remaining data.
 def color_det_dfs(colours, rel_minix, rel_miniy, rel_maxix, rel_maxiy, \
 opening_red, opening_green, opening_blue):
 
-	width, height = opening_red.shape
-	red_counter, green_counter, blue_counter = 0, 0, 0
-	red_colors, green_colors, blue_colors = [], [], []
-	red_labels = np.zeros((width,height), np.uint8)
-	green_labels = np.zeros((width,height), np.uint8)
-	blue_labels = np.zeros((width,height), np.uint8)
-	cumulatives = 0
-	limits = 0
-	
-	# Getting color data
-	rel_minix, rel_miniy, rel_maxix, rel_maxiy = 0, 0, 0, 0
-	for y in range(height):
-		row = opening_red[:,y]
-		#print row
-		max_row = max(row)
-		if max_row > 0:
-			if rel_maxiy == 0 and rel_miniy == 0:
-				#rel_maxix, rel_minix = x, x
-				rel_maxiy, rel_miniy = y, y
-			else:
-				if y > rel_maxiy:
-					rel_maxiy = y
-					
-	for x in range(width):
-		col = opening_red[x,:]
-		max_col = max(col)
-		if max_col > 0:
-			if rel_maxix == 0 and rel_minix == 0:
-				rel_maxix, rel_minix = x, x
-				#rel_maxiy, rel_miniy = y, y
-			else:
-				if x > rel_maxix:
-					rel_maxix = x
-	#print rel_minix, rel_miniy, rel_maxix, rel_maxiy
-	
-	for y in range(rel_miniy, rel_maxiy):
-		for x in range(rel_minix, rel_maxix):
-			
-			if opening_red[x,y] > 0 and red_labels[x,y] == 0:
-				red_labels, red_counter, pixels, cumulatives, limits = DFS2(opening_red, 
-				red_labels, x, y, red_counter)
-			
-				red_colors.append([pixels, cumulatives[0]/pixels, cumulatives[1]/pixels,
-				limits[0], limits[1], limits[2], limits[3]])
-				#print 'red', red_colors
-				
-	rel_minix, rel_miniy, rel_maxix, rel_maxiy = 0, 0, 0, 0
-	for y in range(height):
-		row = opening_green[:,y]
-		#print row
-		max_row = max(row)
-		if max_row > 0:
-			if rel_maxiy == 0 and rel_miniy == 0:
-				#rel_maxix, rel_minix = x, x
-				rel_maxiy, rel_miniy = y, y
-			else:
-				if y > rel_maxiy:
-					rel_maxiy = y
-					
-	for x in range(width):
-		col = opening_green[x,:]
-		max_col = max(col)
-		if max_col > 0:
-			if rel_maxix == 0 and rel_minix == 0:
-				rel_maxix, rel_minix = x, x
-				#rel_maxiy, rel_miniy = y, y
-			else:
-				if x > rel_maxix:
-					rel_maxix = x
-	#print rel_minix, rel_miniy, rel_maxix, rel_maxiy
-	
-	for y in range(rel_miniy, rel_maxiy):
-		for x in range(rel_minix, rel_maxix):
-		
-			if opening_green[x,y] > 0 and green_labels[x,y] == 0:
-				green_labels, green_counter, pixels, cumulatives, limits = DFS2(opening_green, 
-				green_labels, x, y, green_counter)
-			
-				green_colors.append([pixels, cumulatives[0]/pixels, cumulatives[1]/pixels,
-				limits[0], limits[1], limits[2], limits[3]])
-				#print 'green', green_colors
-				
-	rel_minix, rel_miniy, rel_maxix, rel_maxiy = 0, 0, 0, 0
-	for y in range(height):
-		row = opening_blue[:,y]
-		#print row
-		max_row = max(row)
-		if max_row > 0:
-			if rel_maxiy == 0 and rel_miniy == 0:
-				#rel_maxix, rel_minix = x, x
-				rel_maxiy, rel_miniy = y, y
-			else:
-				if y > rel_maxiy:
-					rel_maxiy = y
-					
-	for x in range(width):
-		col = opening_blue[x,:]
-		max_col = max(col)
-		if max_col > 0:
-			if rel_maxix == 0 and rel_minix == 0:
-				rel_maxix, rel_minix = x, x
-				#rel_maxiy, rel_miniy = y, y
-			else:
-				if x > rel_maxix:
-					rel_maxix = x
-	#print rel_minix, rel_miniy, rel_maxix, rel_maxiy
-	
-	for y in range(rel_miniy, rel_maxiy):
-		for x in range(rel_minix, rel_maxix):
-	
-			if opening_blue[x,y] > 0 and blue_labels[x,y] == 0:
-				blue_labels, blue_counter, pixels, cumulatives, limits = DFS2(opening_blue, 
-				blue_labels, x, y, blue_counter)
-			
-				blue_colors.append([pixels, cumulatives[0]/pixels, cumulatives[1]/pixels,
-				limits[0], limits[1], limits[2], limits[3]])
-				#print 'blue', blue_colors
+	# Getting color data. Each layer is labelled in one call inside the
+	# relative boundaries of the mixed image.
+	red_colors = label_objects(opening_red, rel_minix, rel_miniy, \
+	rel_maxix, rel_maxiy)
+	green_colors = label_objects(opening_green, rel_minix, rel_miniy, \
+	rel_maxix, rel_maxiy)
+	blue_colors = label_objects(opening_blue, rel_minix, rel_miniy, \
+	rel_maxix, rel_maxiy)
 
 	# Popping small or large undesirable objects on each color structure
 	# and keeping the biggest one of the remainders
@@ -545,9 +2018,7 @@ opening_red, opening_green, opening_blue):
 def yellow_det_count(yellow_colours, rel_minix, rel_miniy, rel_maxix, \
 rel_maxiy, opening_yellow,colours):
 	
-	width, height = opening_yellow.shape
 	yellow_counter = 0
-	yellow_labels = np.zeros((width,height), np.uint8)
 	pixels_1, pixels_2, pixels_3 = 0, 0, 0
 	cumulative_x_1, cumulative_x_2, cumulative_x_3 = 0, 0, 0
 	cumulative_y_1, cumulative_y_2, cumulative_y_3 = 0, 0, 0
@@ -561,11 +2032,11 @@ rel_maxiy, opening_yellow,colours):
 		
 	for a in range(len(colours)):
 		#print data[a]
-		difx = (colours[a]._maxx - colours[a]._minx) / (int(1/default.multiple))
-		dify = (colours[a]._maxy - colours[a]._miny) / (int(1/default.multiple))
+		difx = (colours[a]._maxx - colours[a]._minx) * default.multiple
+		dify = (colours[a]._maxy - colours[a]._miny) * default.multiple
 		# Scaling center of mass
-		center = [colours[a]._center_mass[0] / (int(1/default.multiple)),\
-		colours[a]._center_mass[1]/(int(1/default.multiple))]
+		center = [to_processing(colours[a]._center_mass[0]),\
+		to_processing(colours[a]._center_mass[1])]
 		#print 'center = '+ str(center)
 		offset = 0.1
 		multiplier = 1.5
@@ -627,34 +2098,15 @@ rel_maxiy, opening_yellow,colours):
 	
 	return yellow_colours
 
-# This module applies the DFS2 to gather the data of multiple objects
+# This module labels the yellow objects to gather the data of multiple
+# objects
 def yellow_det_dfs(yellow_colours, rel_minix, rel_miniy, rel_maxix, rel_maxiy, \
 opening_yellow):
 
-	width, height = opening_yellow.shape
-	yellow_counter = 0
-	yellow_labels = np.zeros((width,height), np.uint8)
-	yellow_colors2 = []
-	first = 0
-	yellow_pixels = 0
-	cumulatives_yellow = 0
-	limits_yellow = 0
-	
-	# Applying DFS2 and gathering needed data
-	for y in range(rel_miniy, rel_maxiy):
-		for x in range(rel_minix, rel_maxix):
-			if opening_yellow[x,y] > 0 and yellow_labels[x,y] == 0:
-
-				yellow_labels, yellow_counter, yellow_pixels, \
-				cumulatives_yellow, limits_yellow = DFS2(opening_yellow,\
-				yellow_labels, x, y, yellow_counter)
-				
-				yellow_colors2.append([yellow_pixels, 
-				cumulatives_yellow[0]/yellow_pixels, cumulatives_yellow[1]/yellow_pixels, 
-				limits_yellow[0], limits_yellow[1], limits_yellow[2], 
-				limits_yellow[3]])
+	# Labelling objects and gathering needed data
+	yellow_colors2 = label_objects(opening_yellow, rel_minix, rel_miniy, \
+	rel_maxix, rel_maxiy)
 
-	
 	# Reducing yellow color structure
 	yellow_colors2 = reducing_yellow(yellow_colors2)
 
@@ -679,6 +2131,741 @@ opening_yellow):
 	
 	return yellow_colours
 	
+# This module compiles the 30 threshold values into lookup tables. Each
+# threshold (red2, red3, green, blue, yellow) is a box in HSV space, so
+# an HSV triple is inside threshold k when bit k is set in the table of
+# its H, its S and its V value (256 entries per channel). A second table
+# maps the 5 bits of a pixel to the red, green, blue and yellow classes.
+def threshold_tables(thr):
+	lut = np.zeros((256, 1, 3), np.uint8)
+	for k in range(len(thr) / 6):
+		for c in range(3):
+			low, up = thr[6*k + c], thr[6*k + 3 + c]
+			lut[low:up + 1, 0, c] |= 1 << k
+	
+	# Red is red2 or red3 (bits 0 and 1)
+	codes = np.arange(256)
+	classes = np.zeros((4, 256), np.uint8)
+	classes[0][(codes & 3) > 0] = 255
+	classes[1][(codes & 4) > 0] = 255
+	classes[2][(codes & 8) > 0] = 255
+	classes[3][(codes & 16) > 0] = 255
+	return lut, classes
+
+# This module binarizes an image (or part of it) with the thresholds and
+# applies the opening and dilation. The HSV image is read only once: one
+# lookup of the threshold tables codes every pixel with the thresholds it
+# is inside of. Small windows (tracking and pyramid modes) get the
+# morphology of all classes in one call (see below); it is not faster on
+# whole images (see benchmarks/bench_morphology.py), so they get it class
+# by class. It returns the red, green, blue and yellow binary images.
+def segmentation(img, thr_data, window=False):
+	buffers = get_buffers()
+	plane = img.shape[:2]
+	
+	# RGB to HSV transformation
+	hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, buffers.get('hsv', img.shape))
+	stage_lap('hsv')
+	
+	# Thresholding the HSV image: bits of the thresholds each channel is
+	# inside of, then bits of the thresholds the pixel is inside of
+	coded_h, coded_s, coded_v = cv2.split(cv2.LUT(hsv, thr_data._lut, \
+	buffers.get('coded_hsv', img.shape)), [buffers.get('coded_h', plane), \
+	buffers.get('coded_s', plane), buffers.get('coded_v', plane)])
+	coded = cv2.bitwise_and(coded_h, coded_s, coded_h)
+	coded = cv2.bitwise_and(coded, coded_v, coded)
+	if not window:
+		# Binary images of all classes, read from the coded image
+		masks = []
+		for k in range(4):
+			masks.append(cv2.LUT(coded, thr_data._classes[k], \
+			buffers.get('mask%d' % k, plane)))
+		stage_lap('threshold')
+		
+		# Applying Opening operation (Erode then dilate) and dilating images
+		# to recover and approx. original size
+		openings = []
+		for k in range(4):
+			opening = cv2.morphologyEx(masks[k], cv2.MORPH_OPEN, default.kernel, \
+			buffers.get('opened', plane))
+			openings.append(cv2.dilate(opening, default.kernel, \
+			buffers.get('opening%d' % k, plane), iterations=1))
+		stage_lap('morphology')
+		return openings
+	
+	# Binary images of all classes, read from the coded image. They are
+	# the tiles of one image (one below the other), so the morphology of
+	# all of them is one call. Between tiles there are gap rows as high
+	# as the reach of the dilation: max. value before the erosion and 0
+	# before the dilation, so a tile never reaches the next one (the same
+	# as the border of the image).
+	rows, cols = plane
+	gap = default.dilation_kernel.shape[0] / 2
+	frame_rows, frame_cols = buffers._frame
+	tiles = buffers.get('masks', (4, rows + gap, cols), \
+	room=(4, frame_rows + gap, frame_cols))
+	eroded = buffers.get('eroded', tiles.shape, room=(4, frame_rows + gap, \
+	frame_cols))
+	for k in range(4):
+		cv2.LUT(coded, thr_data._classes[k], tiles[k, :rows])
+	tiles[:, rows:] = 255
+	stage_lap('threshold')
+	
+	# Applying Opening operation (Erode then dilate) and dilating images to
+	# recover and approx. original size. Both dilations are one with the
+	# kernel dilated by itself.
+	cv2.erode(tiles.reshape(-1, cols), default.kernel, \
+	eroded.reshape(-1, cols), iterations=1)
+	eroded[:, rows:] = 0
+	cv2.dilate(eroded.reshape(-1, cols), default.dilation_kernel, \
+	tiles.reshape(-1, cols), iterations=1)
+	red_opening, green_opening, blue_opening, yellow_opening = \
+	tiles[0, :rows], tiles[1, :rows], tiles[2, :rows], tiles[3, :rows]
+	stage_lap('morphology')
+	
+	# Images of the frame buffers: valid until the next segmentation
+	return red_opening, green_opening, blue_opening, yellow_opening
+
+# This module gets the max. and min. coordinates with pixels of a binary
+# image. Instead of scanning the whole image, further processes only scan
+# this area of interest.
+def relative_limits(image):
+	buffers = get_buffers()
+	limits = []
+	# Rows and columns with pixels, and the same reversed (argmax of a
+	# reversed view would copy it): first ones of both
+	for axis in [1, 0]:
+		room = buffers._frame[1 - axis:2 - axis]
+		found = image.any(axis=axis, out=buffers.get('found', \
+		image.shape[1 - axis:2 - axis], np.bool_, room))
+		first = int(found.argmax())
+		if not found[first]:
+			return 0, 0, 0, 0
+		reversed_found = buffers.get('found_reversed', found.shape, np.bool_, \
+		room)
+		np.copyto(reversed_found[::-1], found)
+		limits.append([first, len(found) - 1 - int(reversed_found.argmax())])
+	return limits[0][0], limits[1][0], limits[0][1], limits[1][1]
+
+# This module gets the colors and yellow colors data searching the whole
+# image. It also returns the number of processed pixels.
+def full_detection(img, thr_data, bot_num):
+	width, height, depth = img.shape
+	colors, yellow_colors = openings_detection(segmentation(img, thr_data), \
+	bot_num)
+	return colors, yellow_colors, width * height
+
+# This module gets the colors and yellow colors data from the binary
+# images (red, green, blue and yellow) of the whole image
+def openings_detection(openings, bot_num):
+	red_opening, green_opening, blue_opening, yellow_opening = openings
+	width, height = red_opening.shape
+	
+	# Images mixed. This is latter used to get relative boundaries
+	# to save time in future processes
+	color_glb = cv2.bitwise_or(red_opening, green_opening, \
+	get_buffers().get('mixed', red_opening.shape))
+	color_glb = cv2.bitwise_or(color_glb, blue_opening, color_glb)
+	color_glb_opening = cv2.bitwise_or(color_glb, yellow_opening, color_glb)
+	rel_minx, rel_miny, rel_maxx, rel_maxy = relative_limits(color_glb_opening)
+	stage_lap('roi')
+	
+	# Colors structure
+	colors = get_buffers().circles('colors', bot_num)
+	yellow_colors = get_buffers().circles('yellow_colors', bot_num)
+	
+	# If colors are detected correctly (Boundaries less than
+	# a quarter of the image) it only counts the pixels. If not,
+	# it labels the objects to get rid of undesired ones
+	if (rel_maxy - rel_miny) < height / 4 and \
+	(rel_maxx - rel_minx) < width / 4:
+		colors = color_det_count(colors, rel_minx, rel_miny, rel_maxx, \
+		rel_maxy, red_opening, green_opening, blue_opening)
+	else:
+		colors = color_det_dfs(colors, rel_minx, rel_miny, rel_maxx, rel_maxy, \
+		red_opening, green_opening, blue_opening)
+	
+	yellow_colors = yellow_det_count(yellow_colors, rel_minx, rel_miny, \
+	rel_maxx, rel_maxy, yellow_opening, colors)
+	stage_lap('statistics')
+	
+	return colors, yellow_colors
+
+# This module gets the colors and yellow colors data only inside windows
+# around the predicted position of each robot. The window includes the
+# yellow marker. If a robot is not found (or was lost before), the whole
+# image is searched. The models are updated with the results.
+def tracking_detection(img, thr_data, tracks):
+	width, height, depth = img.shape
+	bot_num = len(tracks)
+	scale = default.multiple
+	colors = get_buffers().circles('colors', bot_num)
+	yellow_colors = get_buffers().circles('yellow_colors', bot_num)
+	pixels = 0
+	lost = 0
+	
+	for x in range(bot_num):
+		lost += tracks[x]._lost
+	
+	for x in range(bot_num):
+		if lost > 0:
+			break
+		track = tracks[x]
+		# Window around the predicted position (processing coordinates)
+		center = track.predict()
+		half = max(default.track_window * max(track._size) + \
+		max(abs(track._velocity[0]), abs(track._velocity[1])), \
+		default.track_min_window / scale) * scale
+		minx = int(max(center[0] * scale - half, 0))
+		miny = int(max(center[1] * scale - half, 0))
+		maxx = int(min(center[0] * scale + half + 1, width))
+		maxy = int(min(center[1] * scale + half + 1, height))
+		if maxx <= minx or maxy <= miny:
+			lost += 1
+			break
+		pixels += (maxx - minx) * (maxy - miny)
+		
+		# Color of this robot and the yellow object closest to it
+		data, yellow = window_statistics(img, thr_data, x, minx, miny, \
+		maxx, maxy, [center[0] * scale, center[1] * scale])
+		if data[0] == 0:
+			lost += 1
+			break
+		colors[x] = assignment(colors[x], data[3], data[4], data[5], data[6], \
+		data[0], data[1], data[2], 0)
+		if yellow is not None:
+			yellow_colors[x] = assignment(yellow_colors[x], yellow[3], \
+			yellow[4], yellow[5], yellow[6], yellow[0], yellow[1], yellow[2], 1)
+		else:
+			yellow_colors[x]._center_mass = [0, 0]
+		stage_lap('statistics')
+	
+	if lost > 0:
+		# At least one robot is lost, searching the whole image
+		colors, yellow_colors, pixels = full_detection(img, thr_data, bot_num)
+	
+	for x in range(bot_num):
+		tracks[x].update(colors[x])
+	
+	return colors, yellow_colors, pixels
+
+# This module gets, inside a window of an image (rows minx to maxx and
+# columns miny to maxy, not included), the data of robot x: the object of
+# its color closest to center (its expected position) and the yellow
+# object closest to it. Yellow objects smaller than half the color one
+# are not markers (both circles have the same size). The data is in
+# coordinates of the image, [pixels, cumulative x, cumulative y, minx,
+# miny, maxx, maxy]; the yellow is None if there is none.
+def window_statistics(img, thr_data, x, minx, miny, maxx, maxy, center):
+	openings = segmentation(img[minx:maxx, miny:maxy], thr_data, True)
+	data = closest_object(openings[x], [center[0] - minx, center[1] - miny])
+	if data is None:
+		return [0,0,0,0,0,0,0], None
+	body = [data[1] / float(data[0]), data[2] / float(data[0])]
+	yellow = closest_object(openings[3], body, data[0] / 2)
+	
+	# Back to coordinates of the image
+	data = [data[0], data[1] + data[0] * minx, data[2] + data[0] * miny, \
+	data[3] + minx, data[4] + miny, data[5] + minx, data[6] + miny]
+	if yellow is not None:
+		yellow = [yellow[0], yellow[1] + yellow[0] * minx, \
+		yellow[2] + yellow[0] * miny, yellow[3] + minx, yellow[4] + miny, \
+		yellow[5] + minx, yellow[6] + miny]
+	return data, yellow
+
+# This module gets the data (as color_statistics) of the object of a
+# binary image closest to a point, if it has at least min_pixels. The
+# sums are exact: they are counted again inside its bounding box.
+def closest_object(image, point, min_pixels=1):
+	objects = [o for o in label_objects(image) if o[0] >= min_pixels]
+	if len(objects) == 0:
+		return None
+	distances = []
+	for y in range(len(objects)):
+		distances.append(euclidean_dist(point, objects[y][1:3]))
+	o = objects[distances.index(min(distances))]
+	return color_statistics(o[3], o[4], o[5] + 1, o[6] + 1, [image])[0]
+
+# This module gives window_statistics data of the original image to a
+# color structure (no scaling)
+def refined_data(colour, data):
+	colour._minx, colour._miny, colour._maxx, colour._maxy = data[3:7]
+	colour._pix_number = data[0]
+	colour._cumulative_x, colour._cumulative_y = data[1], data[2]
+	colour._center_mass = [int(round(data[1] / float(data[0]))), \
+	int(round(data[2] / float(data[0])))]
+	return colour
+
+# This module finds the robots on the processing image (default.multiple,
+# usually small) with full_detection, and then measures each one again on
+# the original image, only inside a window around it. Robots and yellows
+# not found again keep the data of the small image.
+def pyramid_detection(img, img_or, thr_data, bot_num):
+	colors, yellow_colors, pixels = full_detection(img, thr_data, bot_num)
+	width, height, depth = img_or.shape
+	
+	for x in range(bot_num):
+		colour = colors[x]
+		if colour._pix_number == 0:
+			continue
+		# Window around the robot, big enough for its yellow
+		center = colour._center_mass
+		half = max(default.track_window * max(colour._maxx - colour._minx, \
+		colour._maxy - colour._miny), default.track_min_window)
+		minx, miny = int(max(center[0] - half, 0)), int(max(center[1] - half, 0))
+		maxx = int(min(center[0] + half + 1, width))
+		maxy = int(min(center[1] + half + 1, height))
+		if maxx <= minx or maxy <= miny:
+			continue
+		pixels += (maxx - minx) * (maxy - miny)
+		
+		data, yellow = window_statistics(img_or, thr_data, x, minx, miny, \
+		maxx, maxy, center)
+		if data[0] > 0:
+			refined_data(colour, data)
+		if yellow is not None:
+			refined_data(yellow_colors[x], yellow)
+		stage_lap('refine')
+	
+	return colors, yellow_colors, pixels
+
+# This module runs in each process of the pool when it starts. It keeps
+# the shared memory of the frame and binary images.
+def pool_init(frame, masks):
+	global pool_frame, pool_masks
+	pool_frame, pool_masks = frame, masks
+
+# This module is the work of one band of rows in the 'pool' execution
+# mode. It runs segmentation on the band of the shared frame, with the
+# rows the morphology reaches from the next bands, and writes the binary
+# images of its own rows to the shared ones. They are the same as the
+# rows of the segmentation of the whole frame.
+def pool_band_worker(args):
+	start, stop, shape, thr_data = args
+	width, height, depth = shape
+	img = np.frombuffer(pool_frame, np.uint8).reshape(shape)
+	openings = np.frombuffer(pool_masks, np.uint8).reshape((4, width, height))
+	
+	reach = default.kernel.shape[0] / 2 + default.dilation_kernel.shape[0] / 2
+	top, bottom = max(start - reach, 0), min(stop + reach, width)
+	band = segmentation(img[top:bottom], thr_data)
+	for k in range(4):
+		openings[k, start:stop] = band[k][start - top:stop - top]
+	return stop - start
+
+# This module is the same as full_detection, but the segmentation of the
+# bands of the frame runs on the processes of the pool. The frame is
+# written once to shared memory; the statistics are the ones of
+# full_detection, on the shared binary images.
+def pool_detection(img, thr_data, bot_num, seg_pool):
+	width, height, depth = img.shape
+	
+	# Publishing the frame
+	seg_pool._img[...] = img
+	jobs = [(start, stop, img.shape, thr_data) for start, stop in \
+	seg_pool._bands]
+	seg_pool._pool.map(pool_band_worker, jobs)
+	stage_lap('pool')
+	
+	colors, yellow_colors = openings_detection(seg_pool._openings, bot_num)
+	return colors, yellow_colors, width * height
+
+# This module calculates the orientations (degrees, 0 to 359) of robots
+# given the centers of mass of their yellows and their colors (arrays of
+# [x, y], one row per robot). 0 points to the right of the image and 90
+# to the top.
+def orientation_angles(yellow_centers, color_centers):
+	yellow_centers = np.asarray(yellow_centers, np.float64).reshape(-1, 2)
+	color_centers = np.asarray(color_centers, np.float64).reshape(-1, 2)
+	x_val = color_centers[:, 0] - yellow_centers[:, 0]
+	y_val = yellow_centers[:, 1] - color_centers[:, 1]
+	angle_deg = np.degrees(np.arctan2(y_val, x_val))
+	# 0 to 90 -> 90 to 0, 90 to 180 -> 360 to 270, negative -> 90 to 180
+	angle_deg = np.where(angle_deg > 90, 450 - angle_deg, 90 - angle_deg)
+	return angle_deg.astype(int).tolist()
+
+# This module solves the assignment problem (Hungarian method): it gives
+# each row of the cost matrix a different column so the total cost is
+# the minimum. With more rows than columns some rows get no column. It
+# returns the lists of assigned rows and columns.
+def hungarian(cost):
+	cost = np.asarray(cost, np.float64)
+	transposed = cost.shape[0] > cost.shape[1]
+	if transposed:
+		cost = cost.T
+	n, m = cost.shape
+	# Potentials of rows (u) and columns (v); p[j] is the row of column j
+	# (1-indexed, 0 = none)
+	u, v = np.zeros(n + 1), np.zeros(m + 1)
+	p, way = np.zeros(m + 1, int), np.zeros(m + 1, int)
+	for i in range(1, n + 1):
+		p[0] = i
+		j0 = 0
+		minv = np.full(m + 1, np.inf)
+		used = np.zeros(m + 1, bool)
+		while True:
+			used[j0] = True
+			i0 = p[j0]
+			free = ~used[1:]
+			reduced = cost[i0 - 1] - u[i0] - v[1:]
+			better = free & (reduced < minv[1:])
+			minv[1:][better] = reduced[better]
+			way[1:][better] = j0
+			candidates = np.where(free, minv[1:], np.inf)
+			j1 = int(np.argmin(candidates)) + 1
+			delta = candidates[j1 - 1]
+			columns = np.flatnonzero(used)
+			u[p[columns]] += delta
+			v[columns] -= delta
+			minv[1:][free] -= delta
+			j0 = j1
+			if p[j0] == 0:
+				break
+		# Augmenting path
+		while j0 != 0:
+			j1 = way[j0]
+			p[j0] = p[j1]
+			j0 = j1
+	columns = [j - 1 for j in range(1, m + 1) if p[j] > 0]
+	rows = [p[j + 1] - 1 for j in columns]
+	if transposed:
+		return columns, rows
+	return rows, columns
+
+# This module assigns yellow centers to robot centers so the total
+# distance is the minimum, with only pairs closer than the radius of each
+# robot (radii, see match_radius). Candidate pairs come from a distance
+# matrix of all of them or, if a grid index of the robot centers is
+# given, from the grid. Robots and yellows linked by candidate pairs are
+# solved together. It returns, for each robot, the index of its yellow
+# (-1 if not matched) and their distance.
+def yellow_assignment(centers, yellow_centers, radii, grid=None):
+	matched = [-1] * len(centers)
+	distances = [0] * len(centers)
+	if len(centers) == 0 or len(yellow_centers) == 0:
+		return matched, distances
+	radius = max(radii)
+	
+	# Candidate pairs [robot, yellow, distance]
+	if grid is None:
+		robot_xy = np.asarray(centers, np.float64).reshape(-1, 2)
+		yellow_xy = np.asarray(yellow_centers, np.float64).reshape(-1, 2)
+		dist = np.sqrt(((robot_xy[:, None, :] - yellow_xy[None, :, :]) ** 2).sum(2))
+		rows, cols = np.nonzero(dist <= np.asarray(radii, np.float64)[:, None])
+		pairs = zip(rows.tolist(), cols.tolist(), dist[rows, cols].tolist())
+	else:
+		pairs = []
+		for y in range(len(yellow_centers)):
+			for x, distance in grid.within(yellow_centers[y], radius):
+				if distance <= radii[x]:
+					pairs.append((x, y, distance))
+	
+	# Groups of robots and yellows linked by pairs (yellow y is node
+	# len(centers) + y)
+	parent = range(len(centers) + len(yellow_centers))
+	def root(a):
+		while parent[a] != a:
+			parent[a] = parent[parent[a]]
+			a = parent[a]
+		return a
+	for x, y, distance in pairs:
+		parent[root(x)] = root(len(centers) + y)
+	groups = {}
+	for x, y, distance in pairs:
+		groups.setdefault(root(x), []).append((x, y, distance))
+	
+	# Optimal assignment of each group. Pairs that are not candidates
+	# cost more than any candidate and are discarded.
+	for group in groups.values():
+		robots = sorted(set(g[0] for g in group))
+		yellows = sorted(set(g[1] for g in group))
+		cost = np.full((len(robots), len(yellows)), radius * 1000.0 + 1)
+		for x, y, distance in group:
+			cost[robots.index(x), yellows.index(y)] = distance
+		rows, cols = hungarian(cost)
+		for r, c in zip(rows, cols):
+			if cost[r, c] <= radii[robots[r]]:
+				matched[robots[r]] = yellows[c]
+				distances[robots[r]] = cost[r, c]
+	return matched, distances
+
+# This module matches the yellow colors with the colors (3 robot mode),
+# sets the correspondence and orientation of the matched colors and
+# returns the list of [color index, distance] of the matches and the
+# list of colors without yellow.
+def yellow_matching(colors, yellow_colors):
+	found = [x for x in range(len(colors)) if colors[x]._pix_number > 0]
+	yellow_found = [y for y in range(len(yellow_colors)) \
+	if yellow_colors[y]._pix_number > 0]
+	matched, distances = yellow_assignment( \
+	[colors[x]._center_mass for x in found], \
+	[yellow_colors[y]._center_mass for y in yellow_found], \
+	[match_radius(colors[x]) for x in found])
+	
+	for x in range(len(colors)):
+		colors[x]._correspondence = -1
+	for k in range(len(found)):
+		if matched[k] >= 0:
+			colors[found[k]]._correspondence = yellow_found[matched[k]]
+	return set_orientations(colors, yellow_colors, distances, found, matched)
+
+# This module calculates the orientation of all the matched robots at
+# once. It returns the matches and the robots without yellow.
+def set_orientations(colors, yellow_colors, distances, found, matched):
+	pairs = [k for k in range(len(found)) if matched[k] >= 0]
+	angles = orientation_angles( \
+	[yellow_colors[colors[found[k]]._correspondence]._center_mass for k in pairs],
+	[colors[found[k]]._center_mass for k in pairs])
+	matches = []
+	for k in range(len(pairs)):
+		colors[found[pairs[k]]]._orientation = angles[k]
+		matches.append([found[pairs[k]], distances[pairs[k]]])
+	unmatched = [x for x in range(len(colors)) if colors[x]._correspondence < 0]
+	return matches, unmatched
+
+# This module gets the data of N robots (default.robot_colors) searching
+# the whole image. Every object of a robot color with the size of a marker
+# is a robot; robots already found take the closest object to their last
+# position and the remaining ones take the biggest objects left. Yellow
+# objects are assigned to robots with yellow_assignment, taking candidate
+# pairs from a grid index. The yellow of each robot is left in the same
+# index of yellow_colors. Both lists are reused every frame. It returns
+# the matches and the robots without yellow like yellow_matching.
+def multi_detection(img, thr_data, robots, yellow_colors):
+	openings = segmentation(img, thr_data)
+	layers = ['red', 'green', 'blue']
+	
+	for color in layers:
+		indices = [x for x in range(len(robots)) \
+		if default.robot_colors[x] == color]
+		if len(indices) == 0:
+			continue
+		# Objects with the size of a marker, biggest first
+		objects = [obj for obj in label_objects(openings[layers.index(color)]) \
+		if marker_size(obj[0])]
+		objects.sort(key=lambda obj: -obj[0])
+		objects = objects[:len(indices)]
+		centers = [[to_original(o[1]), to_original(o[2])] for o in objects]
+		radii = [match_radius(robots[x]) for x in indices]
+		grid = spatial_grid(centers, max(radii))
+		
+		# Robots found before take the closest object (inside their radius)
+		taken = {}
+		for x in indices:
+			if robots[x]._pix_number > 0:
+				k = grid.nearest(robots[x]._center_mass, match_radius(robots[x]), \
+				taken)
+				if k >= 0:
+					taken[k] = x
+		# The rest take the objects left
+		left = [n for n in range(len(objects)) if n not in taken]
+		for x in indices:
+			if x not in taken.values() and len(left) > 0:
+				taken[left.pop(0)] = x
+		
+		for x in indices:
+			assignment2(robots[x], 0, 0, 0, 0, 0, [0, 0])
+		for k in taken:
+			o = objects[k]
+			assignment2(robots[taken[k]], o[3], o[4], o[5], o[6], o[0], o[1:3])
+	
+	# Matching yellow objects with the robots found
+	yellow_objects = [obj for obj in label_objects(openings[3]) \
+	if marker_size(obj[0])]
+	stage_lap('statistics')
+	found = [x for x in range(len(robots)) if robots[x]._pix_number > 0]
+	radii = [match_radius(robots[x]) for x in found]
+	grid = spatial_grid([robots[x]._center_mass for x in found], \
+	max(radii + [1]))
+	matched, distances = yellow_assignment( \
+	[robots[x]._center_mass for x in found], \
+	[[to_original(obj[1]), to_original(obj[2])] for obj in yellow_objects], \
+	radii, grid)
+	
+	# Yellow of each robot (in the same index)
+	for x in range(len(robots)):
+		assignment2(yellow_colors[x], 0, 0, 0, 0, 0, [0, 0])
+		robots[x]._correspondence = -1
+	for k in range(len(found)):
+		if matched[k] >= 0:
+			o = yellow_objects[matched[k]]
+			assignment2(yellow_colors[found[k]], o[3], o[4], o[5], o[6], o[0], \
+			o[1:3])
+			robots[found[k]]._correspondence = found[k]
+	matches, unmatched = set_orientations(robots, yellow_colors, distances, \
+	found, matched)
+	stage_lap('matching')
+	return matches, unmatched
+
+# This module runs the whole detection on a captured image, without
+# showing anything: resizing, getting colors and yellow colors data with
+# the chosen mode and matching them. It returns the colors, the yellow
+# colors, the matches, the robots without yellow and the number of
+# processed pixels.
+def detect_frame(img_or, thr_data, state):
+	get_buffers().reserve(img_or.shape)
+	
+	# Processing image (the original one at size 1). Its size is the one
+	# of OpenCV (rounded to nearest even), so the buffer is used.
+	if default.multiple == 1.0:
+		img = img_or
+	else:
+		width, height, depth = img_or.shape
+		img = cv2.resize(img_or, None, get_buffers().get('resized', \
+		(int(np.rint(width * default.multiple)), \
+		int(np.rint(height * default.multiple)), depth)), \
+		default.multiple, default.multiple, cv2.INTER_LINEAR)
+	width, height, depth = img.shape
+	stage_lap('resize')
+	
+	# Getting colors and yellow colors data. Tracking mode only
+	# processes windows around the predicted robot positions.
+	if default.multi_robot:
+		colors, yellow_colors = state._robots, state._robot_yellows
+		matches, unmatched = multi_detection(img, thr_data, colors, \
+		yellow_colors)
+		allocation_gauges()
+		return colors, yellow_colors, matches, unmatched, width * height
+	elif default.tracking:
+		colors, yellow_colors, pixels = tracking_detection(img, \
+		thr_data, state._tracks)
+	elif default.pyramid:
+		colors, yellow_colors, pixels = pyramid_detection(img, img_or, \
+		thr_data, state._bot_num)
+	elif default.exec_mode == 'pool':
+		if state._seg_pool is None or state._seg_pool._shape != img.shape:
+			state.close()
+			state._seg_pool = segmentation_pool(img.shape)
+		colors, yellow_colors, pixels = pool_detection(img, \
+		thr_data, state._bot_num, state._seg_pool)
+	else:
+		colors, yellow_colors, pixels = full_detection(img, \
+		thr_data, state._bot_num)
+	
+	# Choosing which yellow color corresponds to which color(
+	# red, green, blue) and calculating orientation
+	matches, unmatched = yellow_matching(colors, yellow_colors)
+	stage_lap('matching')
+	allocation_gauges()
+	return colors, yellow_colors, matches, unmatched, pixels
+
+# This module publishes the allocations of the frame buffers (those of
+# the last frame and all of them) with the stage times, if measured
+def allocation_gauges():
+	if default.stages is not None:
+		buffers = get_buffers()
+		default.stages.gauge('buffer_allocations', buffers.frame_allocations())
+		default.stages.gauge('buffer_allocations_total', buffers._allocations)
+
+# This module makes the names of the robots shown on the result image.
+# In N robot mode: first letter of the color and index among the robots
+# of that color.
+def robot_names():
+	if not default.multi_robot:
+		return ['R = ', 'G = ', 'B = ']
+	names = []
+	for x in range(len(default.robot_colors)):
+		color = default.robot_colors[x]
+		index = default.robot_colors[:x].count(color)
+		names.append(color[0].upper() + str(index) + ' = ')
+	return names
+
+# This module draws the results of a frame on its image: centers of
+# mass, bounding boxes, orientations, positions, boundaries and end points.
+def draw_result(img2, colors, yellow_colors, matches, unmatched):
+	# Showing centers of mass on a new image and bounding boxes
+	#img2 = cv2.imread(img_name)
+	color = (0,255,0)
+	for x in range(len(colors)):
+		#print colors[x]._minx, colors[x]._miny, colors[x]._maxx, \
+		#colors[x]._maxy
+		img2[colors[x]._center_mass[0], colors[x]._center_mass[1]] = (0,255,0)
+		img2 = print_box(img2,colors[x],color)
+		#print 'color = ' + str(colors[x]._center_mass)
+	
+	# Showing centers of mass on a new image and bounding boxes
+	#img2 = cv2.imread('equ_3.png')
+	color = (0,255,255)
+	for x in range(len(yellow_colors)):
+		if len(yellow_colors[x]._center_mass) > 0:
+			img2[yellow_colors[x]._center_mass[0], yellow_colors[x]._center_mass[1]] = (0,255,255)
+			img2 = print_box(img2,yellow_colors[x],color)
+	
+	#cv2.imshow('center of mass',img2)
+	#cv2.waitKey(0)
+	
+	#*********************************
+	# Restoring original image size
+	width, height, depth = img2.shape
+	#*********************************
+	
+	# Printing orientations of the matched robots
+	font = cv2.FONT_HERSHEY_SIMPLEX # Font used to write on result image
+	for z, distance in matches:
+		(a, b) = colors[z]._center_mass
+		# Printing angle as a string on image
+		cv2.putText(img2,str(colors[z]._orientation),(b,a),font,0.75,
+		(255,255,255),1)
+	
+	farben = robot_names()
+	# Printing robots without yellow (not matched)
+	if len(unmatched) > 0:
+		cv2.putText(img2,'Not matched: ' + ', '.join(farben[x][:-3] \
+		for x in unmatched),(0,20),font,0.5,(255,255,255),1)
+	
+	row = 35
+	# Printing positions (in pixels) on image (row, column), or on the
+	# floor (in cm) with a calibration
+	
+	for x in range(len(colors)):
+		if len(colors[x]._floor) > 0:
+			position = '[%.1f, %.1f] cm' % tuple(colors[x]._floor)
+		else:
+			position = str(colors[x]._center_mass)
+		cv2.putText(img2,farben[x] + position,(15,row),font,0.75,
+						(255,255,255),1)
+		row += 20
+	
+
+	# Printing boundaries by getting biggest area
+	h, w, max_area, indx, area= 0, 0, 0, 0, 0
+	for x in range(len(colors)):
+		h = colors[x]._maxy - colors[x]._miny
+		w = colors[x]._maxx - colors[x]._minx
+		#areas.append(h*w)
+		area = h * w
+		if area > max_area:
+			indx = x
+	miny = 0 + (colors[indx]._maxy - colors[indx]._miny)
+	minx = 0 + (colors[indx]._maxx - colors[indx]._minx)
+	maxy = (height) - (colors[indx]._maxy - colors[indx]._miny)
+	maxx = (width) - (colors[indx]._maxx - colors[indx]._minx)
+	
+	cv2.rectangle(img2,(minx,miny),(maxy,maxx),(0,0,255),1)
+	
+	# End points (set with the mouse, see end_point)
+	if (default.x != 0) and (default.y != 0):
+		cv2.circle(img2,(default.x,default.y),10,(255,255,0),1)
+		cv2.circle(img2,(default.xgreen,default.ygreen),10,(255,255,0),1)
+		cv2.circle(img2,(default.xblue,default.yblue),10,(255,255,0),1)
+	
+	return img2
+
+# This module makes the message sent to each robot: position (column,
+# row from the bottom), orientation and end point (x1 y1 angle x2 y2).
+# Only the first 3 robots have an end point (see end_point).
+def robot_messages(colors, width):
+	ends = [[default.x, default.y], [default.xgreen, default.ygreen], \
+	[default.xblue, default.yblue]]
+	messages = []
+	for x in range(len(colors)):
+		end = ends[x] if x < len(ends) else [0, 0]
+		messages.append(str(colors[x]._center_mass[1]) + ' ' + \
+		str(width - colors[x]._center_mass[0]) + ' ' + \
+		str(colors[x]._orientation) + ' ' + \
+		str(end[0]) + ' ' + str(width - end[1]))
+	return messages
+
 # Mouse callback module for end point. It just draws a circle
 # It has too positions offsets for the other robots.
 def end_point(event,x,y,flags,param):
@@ -701,489 +2888,117 @@ def robot_detection():
 	# Bluetooth connection with arduino
 	#ser = serial.Serial(12, 9600, timeout = 0)
 	
-	# Bluetooth connection with e puck
-	#ser = serial.Serial(9, 115200, timeout = 0)	# Red
-	#ser2 = serial.Serial(14, 115200, timeout = 0)	# Green
-	#ser3 = serial.Serial(17, 115200, timeout = 0)	# Blue
+	# Bluetooth connection with e puck, one writer per robot
+	# (e.g. default.serial_ports = [9, 14, 17] for red, green and blue)
+	writers = []
+	for port in default.serial_ports:
+		writers.append(serial_writer(port) if port is not None else None)
 	
-	# Getting thresholds from file
-	try:
-		file = open(default.file_name, 'r')
-		thr = read_thres(file)
-	except IOError, ErrorValue:
-		print 'File not found or corrupted. Using threshold defaults.'
-		thr = default.def_vals
+	# Poses for the network (see default.udp_address)
+	publisher = None
+	if default.udp_address:
+		publisher = pose_publisher(default.udp_address)
+	
+	# Getting thresholds from file. Changes to the file are used from
+	# the next frame on.
+	thr_cache = threshold_cache(default.file_name)
 	
 	# Getting conversion units from file
 	try:
-		file = open(default.file_name, 'r')
-		pix_cm = int(read_units(file,3))		# Reading pix/cm
-	except IOError, ErrorValue:
+		pix_cm = int(get_config().units()[2])		# Reading pix/cm
+	except (IOError, OSError, ValueError), ErrorValue:
 		print 'File not found or corrupted. Using default conversion value.'
 		pix_cm = default.pixels_cm
 	
-	#print_count = 1
-	# Initializing time variables
-	pretimemax, pretimemin, meanpretime = 0, 0, 0
-	protimemax, protimemin, meanprotime = 0, 0, 0
-	totalpromax, totalpromin, meantotalpro = 0, 0, 0
-	timeser1max, timeser1min, meantimeser = 0, 0, 0
-	timestrmax, timestrmin, meantimestr = 0, 0, 0
-	totalsermax, totalsermin, meantotalser = 0, 0, 0
-	
-	timez = 0
-	# Starting time counter to measure elapsed time
-	e1 = cv2.getTickCount()
+	# Time of each stage of the frames
+	default.stages = stage_timer()
 	
 	# Choosing camera to work with
-	cap = cv2.VideoCapture(default.cam_num)
+	cap = frame_grabber(default.cam_num)
 	
-	cv2.namedWindow('center of mass')
+	# Result window (see default.display) and other ways to quit
+	view = None
+	if default.display == 'window':
+		cv2.namedWindow('center of mass')
+		# Event handler in result image
+		cv2.setMouseCallback('center of mass', end_point)
+	elif default.display == 'thread':
+		view = display_view(default.display_rate)
+	hook = quit_hook()
 	
+	# Data kept between frames
+	state = detection_state()
 	
-	while(True):
+	# Floor poses of the robots (see default.calibration)
+	calibration = None
+	if default.calibration:
+		calibration = camera_calibration(default.calibration)
+	
+	# Poses for programs on this computer (see default.pose_table)
+	table = None
+	if default.pose_table:
+		table = pose_table(default.pose_table, state._bot_num)
+	# Poses of every frame (see default.trajectory_log)
+	log = None
+	if default.trajectory_log:
+		log = trajectory_log(default.trajectory_log, state._bot_num)
+	# Processing size changes to hold the deadline (see default.deadline)
+	scheduler = None
+	if default.deadline:
+		scheduler = deadline_scheduler(default.deadline)
+	
+	while not hook._quit:
 		# Reading capture from chosen camera
+		default.stages.start()
 		ret, img_or = cap.read()
 		
 		# If it has an image
 		if(ret):
-			# Number of robots
-			bot_num = 3
-			
-			# Colors structure
-			colors = []
-			for x in range(bot_num):
-				colors.append(circle_data())
-			
-			# For total processing time
-			e3 = cv2.getTickCount()
-			
-			# Open image manually, used for tests
-			#img_name = 'pic18.png'
-			#img = cv2.imread(img_name)
-			img = cv2.resize(img_or,None,fx=default.multiple, \
-			fy=default.multiple,interpolation = cv2.INTER_LINEAR)
-			width, height, depth = img.shape
-			#print width, height
-
-			# Preprocessing time
-			t5 = cv2.getTickCount()
-			
-			# RGB to HSV transformation
-			hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-			#cv2.imshow('hsv',hsv)
-
 			# Colors. (Thresholds for binarization)
-			# Red seems to work better with 2 thresholds
-			red_low2 = np.array([thr[0], thr[1], thr[2]])
-			red_up2 = np.array([thr[3], thr[4], thr[5]])
-			red_low3 = np.array([thr[6], thr[7], thr[8]])
-			red_up3 = np.array([thr[9], thr[10], thr[11]])
-
-			green_low = np.array([thr[12], thr[13], thr[14]])
-			green_up = np.array([thr[15], thr[16], thr[17]])
-
-			blue_low = np.array([thr[18], thr[19], thr[20]])
-			blue_up = np.array([thr[21], thr[22], thr[23]])
-
-			yellow_low = np.array([thr[24], thr[25], thr[26]])
-			yellow_up = np.array([thr[27], thr[28], thr[29]])
-
-			# Thresholding the HSV images
-			#red = cv2.inRange(hsv, red_low, red_up)
-			red = np.zeros((height,width,3), np.uint8)
-			red2 = cv2.inRange(hsv, red_low2, red_up2)
-			red3 = cv2.inRange(hsv, red_low3, red_up3)
-			red = cv2.bitwise_or(red2, red3, red)
-			green = cv2.inRange(hsv, green_low, green_up)
-			blue = cv2.inRange(hsv, blue_low, blue_up)
-			yellow = cv2.inRange(hsv, yellow_low, yellow_up)
-			#color_global = cv2.inRange(hsv, color_global_low, color_global_up)
-			
-			'''
-			# Showing hsv binary images
-			cv2.imshow('red',red)
-			cv2.waitKey(1)
-			cv2.imshow('green',green)
-			cv2.waitKey(0)
-			cv2.imshow('blue',blue)
-			cv2.waitKey(0)
-			cv2.imshow('yellow',yellow)
-			cv2.waitKey(0)
-			'''
-			
-			# Applying Opening operation (Erode then dilate)
-			kernel = np.ones((5,5),np.uint8)
-			#erode_img = cv2.erode(img,kernel,iterations=2)
-			red_opening2 = cv2.morphologyEx(red, cv2.MORPH_OPEN, kernel)
-			green_opening2 = cv2.morphologyEx(green, cv2.MORPH_OPEN, kernel)
-			blue_opening2 = cv2.morphologyEx(blue, cv2.MORPH_OPEN, kernel)
-			yellow_opening2 = cv2.morphologyEx(yellow, cv2.MORPH_OPEN, kernel)
-			#color_glb_opening2 = cv2.morphologyEx(color_global, cv2.MORPH_OPEN, kernel)
-			
-			# Dilating images to recover and approx. original size
-			red_opening = cv2.dilate(red_opening2, kernel, iterations=1)
-			green_opening = cv2.dilate(green_opening2, kernel, iterations=1)
-			blue_opening = cv2.dilate(blue_opening2, kernel, iterations=1)
-			yellow_opening = cv2.dilate(yellow_opening2, kernel, iterations=1)
-			#color_glb_opening = cv2.dilate(color_glb_opening2, kernel, iterations=2)
-			
-			# Images mixed. This is latter used to get relative boundaries
-			# to save time in future processes
-			color_glb2 = np.zeros((height,width,3), np.uint8)
-			color_glb3 = np.zeros((height,width,3), np.uint8)
-			color_glb = np.zeros((height,width,3), np.uint8)
-			color_glb2 = cv2.bitwise_or(red_opening, green_opening, color_glb2)
-			color_glb3 = cv2.bitwise_or(color_glb2, blue_opening, color_glb3)
-			color_glb_opening = cv2.bitwise_or(color_glb3, yellow_opening, color_glb)
-			
-			'''
-			# Showing opening images
-			cv2.imshow('red open',red_opening)
-			cv2.waitKey(1)
-			cv2.imshow('green open',green_opening)
-			cv2.waitKey(0)
-			cv2.imshow('blue open',blue_opening)
-			cv2.waitKey(0)
-			cv2.imshow('yellow open',yellow_opening)
-			cv2.waitKey(0)
-			#cv2.imshow('image',hsv)
-			#cv2.waitKey(0)
-			cv2.imshow('global open', color_glb_opening)
-			cv2.waitKey(0)
-			'''
-			
-			# End of processing time
-			t6 = cv2.getTickCount()
-			
-			# Getting max and min relative values for further 
-			# image processing. Instead of scanning the whole image,
-			# it'll only scan the area of interest.
-
-			rel_minx, rel_miny, rel_maxx, rel_maxy = 0, 0, 0, 0
-			for y in range(height):
-				row = color_glb_opening[:,y]
-				#print row
-				max_row = max(row)
-				if max_row > 0:
-					if rel_maxy == 0 and rel_miny == 0:
-						#rel_maxx, rel_minx = x, x
-						rel_maxy, rel_miny = y, y
-					else:
-						if y > rel_maxy:
-							rel_maxy = y
-							
-			for x in range(width):
-				col = color_glb_opening[x,:]
-				max_col = max(col)
-				if max_col > 0:
-					if rel_maxx == 0 and rel_minx == 0:
-						rel_maxx, rel_minx = x, x
-						#rel_maxy, rel_miny = y, y
-					else:
-						if x > rel_maxx:
-							rel_maxx = x
-			
-			#print rel_maxx, rel_maxy, rel_minx, rel_miny
-			
-			# If colors are detected correctly (Boundaries less than
-			# a quarter of the image) it only counts the pixels. If not,
-			# it applies DFS
-			if (rel_maxy - rel_miny) < height / 4 and \
-			(rel_maxx - rel_minx) < width / 4:
-				
-				colors = color_det_count(colors, rel_minx, rel_miny, rel_maxx, \
-				rel_maxy, red_opening, green_opening, blue_opening)
-				
-			else:
-				
-				colors = color_det_dfs(colors, rel_minx, rel_miny, rel_maxx, rel_maxy, \
-				red_opening, green_opening, blue_opening)
-				
-			# Showing centers of mass on a new image and bounding boxes
-			img2 = img_or
-			#img2 = cv2.imread(img_name)
-			color = (0,255,0)
-			for x in range(len(colors)):
-				#print colors[x]._minx, colors[x]._miny, colors[x]._maxx, \
-				#colors[x]._maxy
-				img2[colors[x]._center_mass[0], colors[x]._center_mass[1]] = (0,255,0)
-				img2 = print_box(img2,colors[x],color)
-				#print 'color = ' + str(colors[x]._center_mass)
+			thr_data = thr_cache.check()
+			stage_lap('capture')
+			t1 = time.time()
 			
-			# Colors structure
-			yellow_colors = []
-			for x in range(bot_num):
-				yellow_colors.append(circle_data())
-
-			# If colors are detected correctly (Boundaries less than
-			# a quarter of the image) it only applies DFS. If not,
-			# it applies DFS2 to get rid of undesired objects
-			if (rel_maxy - rel_miny) < height / 4 and \
-			(rel_maxx - rel_minx) < width / 4:
-				
-				yellow_colors = yellow_det_count(yellow_colors, rel_minx, rel_miny, \
-				rel_maxx, rel_maxy, yellow_opening, colors)
-				
-			else:
-
-				yellow_colors = yellow_det_count(yellow_colors, rel_minx, rel_miny, \
-				rel_maxx, rel_maxy, yellow_opening, colors)
-			
-			# Showing centers of mass on a new image and bounding boxes
-			#img2 = cv2.imread('equ_3.png')
-			color = (0,255,255)
-			for x in range(len(yellow_colors)):
-				if len(yellow_colors[x]._center_mass) == 0:
-					yellow_colors[x]._center_mass = [width / 2 , height / 2]
-				else:
-					img2[yellow_colors[x]._center_mass[0], yellow_colors[x]._center_mass[1]] = (0,255,255)
-					img2 = print_box(img2,yellow_colors[x],color)
-			
-			#cv2.imshow('center of mass',img2)
-			#cv2.waitKey(0)
+			# Detection (offline tests: see replay)
+			colors, yellow_colors, matches, unmatched, pixels = \
+			detect_frame(img_or, thr_data, state)
+			if calibration is not None:
+				calibration.locate(colors, yellow_colors, img_or.shape)
 			
-			#*********************************
-			# Restoring original image size
-			width, height, depth = img2.shape
-			#*********************************
-			
-			# Choosing which yellow color corresponds to which color(
-			# red, green, blue) and calculating orientation
-			font = cv2.FONT_HERSHEY_SIMPLEX # Font used to write on result image
-			minimum = 0
-			#distances = []
-			# Getting the euclidean distance between the centers of mass
-			for x in range(len(yellow_colors)):
-				distances = []
-				xy_vals = []
-				
-				for y in range(len(colors)):
-					distance = euclidean_dist(yellow_colors[x]._center_mass, 
-					colors[y]._center_mass)
-					distances.append(distance)
-					x_val = -yellow_colors[x]._center_mass[0] + \
-					colors[y]._center_mass[0]
-					y_val = -((height) - yellow_colors[x]._center_mass[1]) + \
-					((height) - colors[y]._center_mass[1])
-					xy_vals.append([x_val, y_val])
-				
-				# Choosing the minimum distance and calculating the 
-				# Orientation in degrees
-				minimum = min(distances)
-				for z in range(len(distances)):
-					if minimum == distances[z]:
-						angle_rad = math.atan2(xy_vals[z][1], xy_vals[z][0])
-						angle_deg = math.degrees(angle_rad)
-						
-						if angle_deg >= 0 and angle_deg <= 90:
-							angle_deg = 90 - angle_deg
-						elif angle_deg > 90 and angle_deg <= 180:
-							angle_deg = 360 + (90 - angle_deg)
-						else: 
-							angle_deg = 90 + (-1 * angle_deg)
-						
-						colors[z]._correspondence = x
-						colors[z]._orientation = int(angle_deg)
-						(a, b) = colors[z]._center_mass
-						# Printing angle as a string on image
-						if distances[z] <= 30:
-							cv2.putText(img2,str(int(angle_deg)),(b,a),font,0.75,
-							(255,255,255),1)
-						else:
-							cv2.putText(img2,'Color not detected',(0,20),font,0.5,
-							(255,255,255),1)
-			
-			row = 35
-			farben = ['R = ', 'G = ', 'B = ']
-			# Printing positions (in pixels) on image (row, column)
-			
-			for x in range(len(colors)):
-				cv2.putText(img2,farben[x] + str(colors[x]._center_mass),(15,row),font,0.75,
-								(255,255,255),1)
-				row += 20
-			
-
-			# Printing boundaries by getting biggest area
-			h, w, max_area, indx, area= 0, 0, 0, 0, 0
-			for x in range(len(colors)):
-				h = colors[x]._maxy - colors[x]._miny
-				w = colors[x]._maxx - colors[x]._minx
-				#areas.append(h*w)
-				area = h * w
-				if area > max_area:
-					indx = x
-			miny = 0 + (colors[indx]._maxy - colors[indx]._miny)
-			minx = 0 + (colors[indx]._maxx - colors[indx]._minx)
-			maxy = (height) - (colors[indx]._maxy - colors[indx]._miny)
-			maxx = (width) - (colors[indx]._maxx - colors[indx]._minx)
-			
-			cv2.rectangle(img2,(minx,miny),(maxy,maxx),(0,0,255),1)
-			
-			e2 = cv2.getTickCount() # Getting time after processing
-			# Calculating elapsed time
-			time = (e2 - e1) / cv2.getTickFrequency()
-			print time - timez
-			timez = time
-			
-			# Event handler in img2 (result image)
-			cv2.setMouseCallback('center of mass', end_point)
-			if (default.x != 0) and (default.y != 0):
-				cv2.circle(img2,(default.x,default.y),10,(255,255,0),1)
-				cv2.circle(img2,(default.xgreen,default.ygreen),10,(255,255,0),1)
-				cv2.circle(img2,(default.xblue,default.yblue),10,(255,255,0),1)
-			
-			# Showing result image
-			cv2.imshow('center of mass',img2)
-			# Press "q" (quit) to exit
-			if cv2.waitKey(1) & 0xFF == ord('q'):
-				break
+			# Showing the results (see default.display). The drawing is made
+			# on a copy: a frame given again by the grabber stays clean.
+			if default.display == 'window':
+				cv2.imshow('center of mass', draw_result(img_or.copy(), colors, \
+				yellow_colors, matches, unmatched))
+				# Press "q" (quit) to exit
+				if cv2.waitKey(1) & 0xFF == ord('q'):
+					break
+			elif view is not None:
+				view.offer(img_or, colors, yellow_colors, matches, unmatched)
+				if view._quit:
+					break
+			stage_lap('drawing')
 			
-			t3 = cv2.getTickCount()
-			# Storing data into string (x1,y1,angle,x2,y2)
-			string = str(colors[0]._center_mass[1]) + ' ' + \
-			str(width - colors[0]._center_mass[0]) + ' ' + \
-			str(colors[0]._orientation) + ' ' + \
-			str(default.x) + ' ' + str(width - default.y)
+			# Sending the poses to the robots (see default.serial_ports)
+			messages = robot_messages(colors, img_or.shape[0])
+			for x in range(min(len(writers), len(messages))):
+				if writers[x] is not None:
+					writers[x].post(messages[x])
+			if publisher is not None:
+				publisher.publish(cap._frame_num, cap._frame_time, colors)
+			if table is not None:
+				table.write(cap._frame_num, cap._frame_time, colors)
+			if log is not None:
+				log.append(cap._frame_num, cap._frame_time, colors)
 			#ser.write(str(colors[1]._orientation)+'\n') # Servo write
-			t1 = cv2.getTickCount()
-			#ser.write(string)
-			t2 = cv2.getTickCount()
-			time2 = (t2 - t1) / cv2.getTickFrequency()
-			#print 'time serial = ' + str(time2)
-			
-			string2 = str(colors[1]._center_mass[1]) + ' ' + \
-			str(width - colors[1]._center_mass[0]) + ' ' + \
-			str(colors[1]._orientation) + ' ' + \
-			str(default.xgreen) + ' ' + str(width - default.ygreen)
-			#ser2.write(string2)
-			
-			string3 = str(colors[2]._center_mass[1]) + ' ' + \
-			str(width - colors[2]._center_mass[0]) + ' ' + \
-			str(colors[2]._orientation) + ' ' + \
-			str(default.xblue) + ' ' + str(width - default.yblue)
-			#ser3.write(string3)
-			
-			# Uncomment next lines to measure time in 20 frames
-			# to see the performance
-			'''
-			t4 = cv2.getTickCount()
-			# Total send time
-			time3 = (t4 - t3) / cv2.getTickFrequency()
-			#print 'time serial = ' + str(time3)
 			
-			# Build string time
-			time4 = (t1 - t3) / cv2.getTickFrequency()
-			
-			# Preprocessing time
-			time5 = (t6 - t5) / cv2.getTickFrequency()
-			
-			# Image processing time
-			time6 = (e2 - t6) / cv2.getTickFrequency()
-			
-			# Image processing time
-			time7 = (e2 - e3) / cv2.getTickFrequency()
-			
-			# Time information for benchmarking
-			# Preprocessing (max and min)
-			if pretimemax == 0:
-				pretimemin = time5
-				pretimemax = time5
-			else:
-				if pretimemax < time5:
-					pretimemax = time5
-				if pretimemin > time5:
-					pretimemin = time5
-			meanpretime += time5
-			
-			# Image processing (max and min)
-			if protimemax == 0:
-				protimemax = time6
-				protimemin = time6
-			else:
-				if protimemax < time6:
-					protimemax = time6
-				if protimemin > time6:
-					protimemin = time6
-			meanprotime += time6
-			
-			# Total image processing (max and min)
-			if totalpromax == 0:
-				totalpromax = time7
-				totalpromin = time7
-			else:
-				if totalpromax < time7:
-					totalpromax = time7
-				if totalpromin > time7:
-					totalpromin = time7
-			meantotalpro += time7
-			
-			# Data communication of first robot (max and min)
-			if timeser1max == 0:
-				timeser1max = time2
-				timeser1min = time2
-			else:
-				if timeser1max < time2:
-					timeser1max = time2
-				if timeser1min > time2:
-					timeser1min = time2
-			meantimeser += time2
-			
-			# Time of building a string to send (max and min)
-			if timestrmax == 0:
-				timestrmax = time4
-				timestrmin = time4
-			else:
-				if timestrmax < time4:
-					timestrmax = time4
-				if timestrmin > time4:
-					timestrmin = time4
-			meantimestr += time4
-					
-			# Total send time (max and min)
-			if totalsermax == 0:
-				totalsermax = time3
-				totalsermin = time3
-			else:
-				if totalsermax < time3:
-					totalsermax = time3
-				if totalsermin > time3:
-					totalesermin = time3
-			meantotalser += time3
-					
-			# Printing time information for benchmarking
-			if print_count == 20:
-				print '*********************************************'
-				print 'Max preprocessing time = ' + str(pretimemax)
-				print 'Min preprocessing time = ' + str(pretimemin)
-				print 'Preprocessing time = ' + str(meanpretime/20)
-				
-				print 'Max processing time = ' + str(protimemax)
-				print 'Min processing time = ' + str(protimemin)
-				print 'Mean processing time = ' + str(meanprotime/20)
-				
-				print 'Max total processing time = ' + str(totalpromax)
-				print 'Min total processing time = ' + str(totalpromin)
-				print 'Mean total processing time = ' + str(meantotalpro/20)
-				
-				print 'Max send time (1 robot) = ' + str(timeser1max)
-				print 'Min send time (1 robot) = ' + str(timeser1min)
-				print 'Mean time serial (1 sent) = ' + str(meantimeser/20)
-				
-				print 'Max build string time = ' + str(timestrmax)
-				print 'Min build string time = ' + str(timestrmin)
-				print 'Mean time serial (build string) = ' + str(meantimestr/20)
-				
-				print 'Max total send time = ' + str(totalsermax)
-				print 'Min total send time = ' + str(totalsermin)
-				print 'Mean time serial (total) = ' + str(meantotalser/20)
-				
-				print '\nTotal time of this run = ' + str(time)
-				print '*********************************************'
-				break
+			stage_lap('output')
+			if scheduler is not None:
+				scheduler.update((time.time() - t1) * 1000)
 			
-			print_count += 1
-			'''
+			# Time of the stages (see default.metrics_file)
+			default.stages.stop()
+			default.stages.dump_due(default.metrics_file)
 			
 			'''
 			# Moving LEGO robot according to the detected angle
@@ -1201,16 +3016,50 @@ def robot_detection():
 	default.ygreen = 0
 	default.xblue = 0
 	default.yblue = 0
-	#ser.close()	# Closing serial communication
-	#ser2.close()
-	#ser3.close()
+	# Closing serial communication
+	for x in range(len(writers)):
+		if writers[x] is not None:
+			writers[x].close()
+			print 'Port ' + str(writers[x]._port) + ': sent = %d, dropped = ' \
+			'%d, failures = %d, write time = %.2f ms (max. %.2f ms)' % \
+			writers[x].stats()
+	if publisher is not None:
+		print 'Pose datagrams sent = ' + str(publisher._sent) + \
+		', failures = ' + str(publisher._failures)
+		publisher.close()
+	if table is not None:
+		table.close()
+	if log is not None:
+		log.close()
+	if scheduler is not None:
+		print 'Frames over the deadline = ' + str(scheduler._overruns) + \
+		', scale changes = ' + str(scheduler._changes)
+		scheduler.close()
+	captured, delivered, dropped, stale = cap.stats()
+	print 'Frames captured = ' + str(captured) + ', processed = ' + \
+	str(delivered) + ', dropped = ' + str(dropped) + ', stale = ' + str(stale)
 	cap.release() # Releasing capture
-	cv2.destroyAllWindows()
+	state.close()
+	hook.close()
+	if view is not None:
+		view.close()
+		print 'Results shown = ' + str(view._shown)
+	elif default.display == 'window':
+		cv2.destroyAllWindows()
+	
+	# Time of the stages of the last frames
+	if default.stages._frames > 0:
+		print 'Stage (ms): p50, p95, p99'
+		for name, values in default.stages.percentiles():
+			print name + ' = ' + ', '.join('%.2f' % v for v in values)
+		if default.metrics_file:
+			default.stages.dump(default.metrics_file)
+	default.stages = None
 
 # This module only shows the real time captures of the camera
 def show_cam():
 	# Selecting camera
-	cap = cv2.VideoCapture(default.cam_num)
+	cap = frame_grabber(default.cam_num)
 
 	while(True):
 		# Capture frame
@@ -1225,31 +3074,6 @@ def show_cam():
 	cap.release()
 	cv2.destroyAllWindows()
 
-def write_new_vals(color,hmini,smini,vmini,hmaxi,smaxi,vmaxi,file1):
-	with file1 as f:
-		lines = f.readlines()
-		
-	# Writing values
-	for y in range(len(lines)):
-		if lines[y] == color:
-			for z in range(y,len(lines)):
-				print 'equal'
-				if lines[z] == 'low\n':
-					lines[z+1] = 'h=' + str(hmini) + '\n'
-					lines[z+2] = 's=' + str(smini) + '\n'
-					lines[z+3] = 'v=' + str(vmini) + '\n'
-				
-				if lines[z] == 'up\n':
-					lines[z+1] = 'h=' + str(hmaxi) + '\n'
-					lines[z+2] = 's=' + str(smaxi) + '\n'
-					lines[z+3] = 'v=' + str(vmaxi) + '\n'
-					break
-	#file1.close()
-
-	file1 = open(default.file_name, 'w')
-	with file1 as f:
-		f.writelines(lines)
-	
 # Module used in thres_adj	
 def nothing(x):
 	pass
@@ -1257,7 +3081,14 @@ def nothing(x):
 # This module helps choosing the needed thresholds by applying 
 # thresholds via sliders and showing the result images
 
-def thres_adj():
+def thres_adj(source=None):
+
+	# A recorded video (or folder of images) is tuned frozen
+	if source:
+		frames = list(islice(replay_frames(source), default.freeze_frames))
+		if len(frames) == 0:
+			print 'No frames could be read from ' + source + '.'
+			return
 
 	# Creating window
 	cv2.namedWindow('sliders')
@@ -1282,16 +3113,20 @@ def thres_adj():
 	#Save diameter in pixels
 	cv2.createTrackbar('save diam.','save data',0,1,nothing)
 
-	# Choosing camera
-	cap = cv2.VideoCapture(default.cam_num)
+	# The camera is frozen and back to live with "f"; "n" shows the next
+	# frame of the clip.
+	cap, tuner, shown = None, None, None
+	if source:
+		tuner = threshold_tuner(frames)
+	else:
+		cap = frame_grabber(default.cam_num)
 
 	while(True):
-		ret, img = cap.read()
+		ret = True
+		if tuner is None:
+			ret, img = cap.read()
 		# If there is a capture
 		if(ret):
-			# RGB to HSV transformation
-			hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-			
 			# Get current positions of four trackbars
 			hmin = cv2.getTrackbarPos('Hmin','sliders')
 			smin = cv2.getTrackbarPos('Smin','sliders')
@@ -1304,23 +3139,54 @@ def thres_adj():
 			low = np.array([hmin, smin, vmin])
 			up = np.array([hmax, smax, vmax])
 
-			# Thresholding the HSV image
-			mask = cv2.inRange(hsv, low, up)
-
-			# Showing binary image
-			cv2.imshow('mask',mask)
-			# Press "q" to exit
-			if cv2.waitKey(1) & 0xFF == ord('q'):
-				break
-			
-			# Applying opening operation
-			kernel = np.ones((5,5),np.uint8) # Square kernel matrix
-			#erode_img = cv2.erode(mask,kernel,iterations=2)
-			opening = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-			cv2.imshow('open',opening)
-			# Press "q" to exit
-			if cv2.waitKey(1) & 0xFF == ord('q'):
+			if tuner is None:
+				# RGB to HSV transformation
+				hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+				# Thresholding the HSV image
+				mask = cv2.inRange(hsv, low, up)
+				# Applying opening operation
+				opening = cv2.morphologyEx(mask, cv2.MORPH_OPEN, default.kernel)
+			else:
+				# Same images if no slider moved
+				updates = tuner._updates
+				mask, opening = tuner.update(low, up)
+				# Pixels of each class: saved thresholds, sliders for the
+				# chosen color
+				try:
+					thresholds = get_config().thresholds()
+				except (IOError, OSError, ValueError):
+					thresholds = default.def_vals
+				thresholds = dict((default.colors_used[k], \
+				thresholds[6 * k:6 * k + 6]) for k in range(5))
+				thresholds[default.colors_used[cv2.getTrackbarPos('r2r3gby', \
+				'save data')]] = [hmin, smin, vmin, hmax, smax, vmax]
+				pixels = tuner.counts(thresholds)
+				if tuner._updates != updates or pixels != shown:
+					cv2.imshow('histograms', tuner.histogram_image(low, up, \
+					pixels))
+				shown = pixels
+
+			# Showing binary image and its opening
+			if tuner is None or tuner._updates != updates:
+				cv2.imshow('mask',mask)
+				cv2.imshow('open',opening)
+			# Press "q" to exit, "f" to freeze or go live, "n" for the next
+			# frame of the clip
+			key = cv2.waitKey(1) & 0xFF
+			if key == ord('q'):
 				break
+			elif key == ord('f') and cap is not None:
+				if tuner is None:
+					frames = [img]
+					while len(frames) < default.freeze_frames:
+						ret, img = cap.read()
+						if ret:
+							frames.append(img)
+					tuner, shown = threshold_tuner(frames), None
+				else:
+					tuner = None
+			elif key == ord('n') and tuner is not None:
+				tuner.next()
 			
 			# Getting trackbar positions to choose whether to save
 			# or not
@@ -1331,25 +3197,24 @@ def thres_adj():
 			get_diam = cv2.getTrackbarPos('save diam.','save data')
 			
 			if get_save == 1:
-				# Getting thresholds from file
+				# Saving thresholds of the chosen color
 				try:
-					file = open(default.file_name, 'r')
+					config = get_config()
 					colour = default.colors_used[get_color]
 					#print colour
-					write_new_vals(colour,hmin,smin,vmin,hmax,smax,
-					vmax,file)
-					#time.sleep(500)
-					#print 'time elapsed'
+					config.set_thresholds(colour, [hmin, smin, vmin],
+					[hmax, smax, vmax])
+					config.save()
 					# Resetting
 					cv2.createTrackbar('save','save data',0,1,nothing)
-				except IOError, ErrorValue:
+				except (IOError, OSError, ValueError), ErrorValue:
 					print 'File not found or corrupted. Please, \
 					place a working file in project folder.'
 					
 			if get_diam == 1:
 				# 
 				try:
-					file = open(default.file_name, 'r')
+					config = get_config()
 					width, height = opening.shape
 					rel_minx, rel_miny, rel_maxx, rel_maxy = 0, 0, 0, 0
 					for y in range(height):
@@ -1367,84 +3232,28 @@ def thres_adj():
 					# diameter in pixels
 					diam_pix = rel_maxy - rel_miny
 					# Writing data to text file
-					write_units(file,diam_pix,1)
+					config.set_units(pixels=diam_pix)
+					config.save()
 					print 'Diameter data overwritten.'
 
 					# Resetting
 					cv2.createTrackbar('save diam.','save data',0,1,nothing)
-				except IOError, ErrorValue:
+				except (IOError, OSError, ValueError), ErrorValue:
 					print 'File not found or corrupted. Please, \
 					place a working file in project folder.'
 				
 	# Releasing capture
-	cap.release()
+	if cap is not None:
+		cap.release()
 	cv2.destroyAllWindows()
 
-# This module reads a line from a target file
-def read_line_thres(lines2, y2,thres):
-	h, s, v = '', '', ''
-	for a in range(2,len(lines2[y2+2])):
-		if lines2[y2+2][a] == '\n':
-			break
-		h += lines2[y2+2][a]
-	#print 'h=' , int(h)
-	thres.append(int(h))
-	
-	for a in range(2,len(lines2[y2+3])):
-		if lines2[y2+3][a] == '\n':
-			break
-		s += lines2[y2+3][a]
-	#print 's=' , int(s)
-	thres.append(int(s))
-	
-	for a in range(2,len(lines2[y2+4])):
-		if lines2[y2+4][a] == '\n':
-			break
-		v += lines2[y2+4][a]
-	#print 'v=' , int(v)
-	thres.append(int(v))
-	
-	return thres
-
-# This module reads a target file in the same project folder	
-def read_thres(file1):
-	color_thres = default.colors_used
-	with file1 as f:
-		lines = f.readlines()
-
-	up = 'up\n'
-	low = 'low\n'
-	thresholds = []	
-
-	for x in range(len(color_thres)):
-		for y in range(len(lines)):
-			first = 0
-			if lines[y] == color_thres[x]:
-				if lines[y+1] == low and lines[y] == color_thres[x]:
-
-					thresholds = read_line_thres(lines, y, thresholds)
-
-				if lines[y+1] == up and lines[y] == color_thres[x]:
-					thresholds = read_line_thres(lines, y, thresholds)
-					break
-
-	return thresholds
-	
 # This module shows the binary images with the current thresholds	
 def show_hsv_binary():
 	# Choosing camera
-	cap = cv2.VideoCapture(default.cam_num)
+	cap = frame_grabber(default.cam_num)
 
-	# Getting thresholds from file
-	try:
-		file = open(default.file_name, 'r')
-		thr = read_thres(file)
-		#file = open(default.file_name, 'r') # Reopen file
-		#value_units = read_units(file)
-		#print value_units
-	except IOError, ErrorValue:
-		print 'File not found or corrupted. Using defaults.'
-		thr = default.def_vals
+	# Getting thresholds from file (changes are shown at once)
+	thr_cache = threshold_cache(default.file_name)
 
 	while(True):
 		# Capture frame
@@ -1452,6 +3261,7 @@ def show_hsv_binary():
 		
 		# If there is an image
 		if(ret):
+			thr = thr_cache.check()._values
 
 			# Size of frame
 			width, height,depth = frame.shape
@@ -1503,39 +3313,6 @@ def show_hsv_binary():
 	cap.release()
 	cv2.destroyAllWindows()
 
-# This Module reads the units used in pixels/cm from a text file
-def read_units(file1,num):
-	
-	with file1 as f:
-		lines = f.readlines()
-
-	unit = 'units\n'
-
-	for x in range(len(lines)):
-		if lines[x] == unit:
-			unit_val = float(lines[x+num])
-			break
-		
-	return unit_val
-
-# This Module writes the units to a text file
-def write_units(file1,unit_val,num):
-	
-	with file1 as f:
-		lines = f.readlines()
-
-	unit = 'units\n'
-
-	for x in range(len(lines)):
-		if lines[x] == unit:
-			lines[x+num] = str(unit_val) + '\n'
-			break
-	
-	file1 = open(default.file_name, 'w')
-	with file1 as f:
-		f.writelines(lines)
-	#print 'Data overwritten.'
-
 # Module to save the diameter of a detected	circle
 def units_selection():
 	# Thread to show thres_adj module simultaneously
@@ -1545,18 +3322,14 @@ def units_selection():
 		val = e.get()
 		# Saving size in cms entered by the user
 		try:
-			# Size in cms
-			file = open(default.file_name, 'r')
-			write_units(file,val,2)
+			# Size in cms and updated pixels/cm, saved together
+			config = get_config()
+			pix_cm = config.units()[0]/float(val)
+			config.set_units(cms=val, pixels_cm=pix_cm)
+			config.save()
 			print 'Size in centimeters overwritten.'
-			# Updating pixels/cm
-			file = open(default.file_name, 'r')
-			pix = int(read_units(file,1))
-			pix_cm = pix/float(val)
-			file = open(default.file_name, 'r')
-			write_units(file,pix_cm,3)
 			print 'Value of pixles/cm updated.'
-		except IOError, ErrorValue:
+		except (IOError, OSError, ValueError, ZeroDivisionError), ErrorValue:
 			print 'File not found or corrupted. Couldn\'t overwrite data.'
 
 	units = Tk()
@@ -1566,9 +3339,541 @@ def units_selection():
 	time.sleep(1)
 	mainloop()
 	
+# This module gives the color code of a robot in the pose datagrams
+# (0 red, 1 green, 2 blue)
+def robot_color_code(x):
+	if default.multi_robot:
+		return ['red', 'green', 'blue'].index(default.robot_colors[x])
+	return x
+
+# This module packs the data of the robots as in the pose table and the
+# trajectory log (pose_table.robot_type). Missing robots are zeros.
+def pack_robots(colors, robots):
+	data = []
+	for x in range(min(len(colors), robots)):
+		c = colors[x]
+		data.append(pose_table.robot.pack(c._center_mass[0], c._center_mass[1], \
+		c._orientation, c._minx, c._miny, c._maxx, c._maxy, \
+		c._correspondence, c._pix_number, robot_color_code(x)))
+	data.append('\0' * (pose_table.robot.size * (robots - len(data))))
+	return ''.join(data)
+
+# This module opens a trajectory log without loading it: it returns the
+# header and a read only numpy.memmap with one record per frame, e.g.
+# records['robots']['center_mass'][:, 0] is the path of robot 0.
+def read_trajectory(file_name):
+	header = np.fromfile(file_name, trajectory_log.header_type, 1)[0]
+	if header['magic'] != 'RTLG':
+		raise ValueError(file_name + ' is not a trajectory log')
+	record_type = trajectory_log.record_type(int(header['robots']))
+	count = (os.path.getsize(file_name) - trajectory_log.header_type.itemsize) \
+	/ record_type.itemsize
+	if count == 0:
+		return header, np.zeros(0, record_type)
+	return header, np.memmap(file_name, record_type, 'r', \
+	trajectory_log.header_type.itemsize, (count,))
+
+# This module reads a pose datagram (see pose_publisher) of any version.
+# It returns the frame number, the capture time and a list of [index,
+# color code, row, column, orientation, yellow found] per robot, or None
+# if it is not a pose datagram.
+def decode_poses(data):
+	if len(data) < 3 or data[:2] != 'RT' or \
+	ord(data[2]) not in pose_publisher.layouts:
+		return None
+	header, robot = pose_publisher.layouts[ord(data[2])]
+	if len(data) < header.size:
+		return None
+	magic, version, count, frame_num, frame_time = header.unpack_from(data)
+	if len(data) != header.size + count * robot.size:
+		return None
+	robots = [list(robot.unpack_from(data, header.size + x * robot.size)) \
+	for x in range(count)]
+	return frame_num, frame_time, robots
+
+# This module tells if an IPv4 address (dotted numbers, a host name must
+# be resolved first) is a multicast one (224.0.0.0 to 239.255.255.255)
+def multicast_address(host):
+	return 224 <= int(host.split('.')[0]) <= 239
+
+# This module prints the poses sent by the tracker to an UDP address
+# (host:port, multicast or not) until Ctrl+C is pressed. It is used to
+# test the pose publisher.
+def subscribe(address):
+	host, port = address.rsplit(':', 1)
+	host = socket.gethostbyname(host)
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	if multicast_address(host):
+		sock.bind(('', int(port)))
+		sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, \
+		socket.inet_aton(host) + socket.inet_aton('0.0.0.0'))
+	else:
+		sock.bind((host, int(port)))
+	letters = 'RGB'
+	try:
+		while True:
+			data = sock.recv(65536)
+			poses = decode_poses(data)
+			if poses is None:
+				continue
+			frame_num, frame_time, robots = poses
+			print 'Frame %d, %.3f s old: ' % (frame_num, time.time() - \
+			frame_time) + ', '.join('%s%d = [%d, %d] %d%s' % \
+			(letters[r[1]], r[0], r[2], r[3], r[4], '' if r[5] else ' (no yellow)') \
+			for r in robots)
+	except KeyboardInterrupt:
+		pass
+	sock.close()
+
+# This module gives the images to replay: the frames of a video file or
+# the image files of a folder (in name order).
+def replay_frames(source):
+	if os.path.isdir(source):
+		names = sorted(os.listdir(source))
+		for name in names:
+			if os.path.splitext(name)[1].lower() in default.image_types:
+				img = cv2.imread(os.path.join(source, name))
+				if img is not None:
+					yield img
+	else:
+		cap = cv2.VideoCapture(source)
+		while(True):
+			ret, img = cap.read()
+			if not ret:
+				break
+			yield img
+		cap.release()
+
+# This module runs the detection, without showing anything and as fast as
+# possible, on a recorded video or a folder of images. The poses of each
+# robot on each frame and the detection times are written to a CSV file.
+def replay(source, output_name, max_frames=0):
+	thr_cache = threshold_cache(default.file_name)
+	state = detection_state()
+	calibration = None
+	if default.calibration:
+		calibration = camera_calibration(default.calibration)
+	default.stages = stage_timer()
+	names = [name[:-3] for name in robot_names()]
+	total_time, frame = 0.0, 0
+	publisher = None
+	if default.udp_address:
+		publisher = pose_publisher(default.udp_address)
+	table = None
+	if default.pose_table:
+		table = pose_table(default.pose_table, state._bot_num)
+	log = None
+	if default.trajectory_log:
+		log = trajectory_log(default.trajectory_log, state._bot_num)
+	scheduler = None
+	if default.deadline:
+		scheduler = deadline_scheduler(default.deadline)
+	
+	with open(output_name, 'w') as output:
+		# Floor poses (cm) at the end, with a calibration
+		output.write('frame,robot,x,y,orientation,correspondence,' + \
+		'processed_pixels,time_ms' + \
+		(',x_cm,y_cm,floor_orientation' if calibration else '') + '\n')
+		for img in replay_frames(source):
+			t1 = time.time()
+			default.stages.start()
+			colors, yellow_colors, matches, unmatched, pixels = \
+			detect_frame(img, thr_cache.check(), state)
+			if calibration is not None:
+				calibration.locate(colors, yellow_colors, img.shape)
+			default.stages.stop()
+			default.stages.dump_due(default.metrics_file)
+			elapsed = time.time() - t1
+			total_time += elapsed
+			if scheduler is not None:
+				scheduler.update(elapsed * 1000)
+			
+			for x in range(len(colors)):
+				values = [str(frame), names[x], \
+				str(colors[x]._center_mass[0]), str(colors[x]._center_mass[1]), \
+				str(colors[x]._orientation), str(colors[x]._correspondence), \
+				str(pixels), '%.3f' % (elapsed * 1000)]
+				if calibration is not None:
+					values += ['%.2f' % v for v in colors[x]._floor or [0, 0]] + \
+					[str(colors[x]._floor_orientation)]
+				output.write(','.join(values) + '\n')
+			if publisher is not None:
+				publisher.publish(frame, t1, colors)
+			if table is not None:
+				table.write(frame, t1, colors)
+			if log is not None:
+				log.append(frame, t1, colors)
+			frame += 1
+			if frame == max_frames:
+				break
+	state.close()
+	if publisher is not None:
+		publisher.close()
+	if table is not None:
+		table.close()
+	if log is not None:
+		log.close()
+	if scheduler is not None:
+		print 'Frames over the deadline = ' + str(scheduler._overruns) + \
+		', scale changes = ' + str(scheduler._changes) + \
+		', last multiple = ' + str(default.multiple)
+		scheduler.close()
+	
+	print 'Frames = ' + str(frame)
+	if frame > 0:
+		print 'Mean detection time = ' + str(total_time / frame)
+		print 'Frames per second = ' + str(frame / max(total_time, 1e-9))
+		if default.metrics_file:
+			default.stages.dump(default.metrics_file)
+	default.stages = None
+	
+# This module finds the inner corners of the chessboard (default.board)
+# on an image. It returns them (refined) or None.
+def board_corners(img):
+	gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+	found, corners = cv2.findChessboardCorners(gray, default.board)
+	if not found:
+		return None
+	criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+	cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+	return corners
+
+# This module calibrates the camera with views of a chessboard (see
+# default.board and default.board_square) from a video or image folder,
+# and writes the calibration file (camera_calibration). The floor is the
+# board on the floor image: x along its first row of corners, from the
+# first one (cm). Without it, the floor is the image scaled by the
+# pixels/cm of the configuration file, as before.
+def calibrate(source, floor_name=None, file_name=None):
+	columns, rows = default.board
+	board = np.zeros((rows * columns, 3), np.float32)
+	board[:, :2] = np.mgrid[0:columns, 0:rows].T.reshape(-1, 2) * \
+	default.board_square
+	
+	object_points, image_points, size = [], [], None
+	for img in replay_frames(source):
+		corners = board_corners(img)
+		if corners is not None:
+			object_points.append(board)
+			image_points.append(corners)
+			size = (img.shape[1], img.shape[0])
+	print 'Images with the chessboard = ' + str(len(image_points))
+	if len(image_points) < 3:
+		print 'At least 3 are needed.'
+		return None
+	error, matrix, distortion, rvecs, tvecs = cv2.calibrateCamera( \
+	object_points, image_points, size, None, None)
+	calibration = camera_calibration()
+	calibration._size = list(size)
+	calibration._matrix, calibration._distortion = matrix, distortion.ravel()
+	calibration._error = error
+	
+	if floor_name:
+		img = cv2.imread(floor_name)
+		corners = board_corners(img) if img is not None else None
+		if corners is None:
+			print 'Chessboard not found on the floor image.'
+			return None
+		undistorted = cv2.undistortPoints(corners, \
+		calibration.frame_matrix(img.shape), distortion, P=matrix)
+		calibration._homography = cv2.findHomography( \
+		undistorted.reshape(-1, 2), board[:, :2])[0]
+	else:
+		try:
+			pix_cm = get_config().units()[2]
+		except (IOError, OSError, ValueError):
+			pix_cm = default.pixels_cm
+		calibration._homography = np.diag([1.0 / pix_cm, 1.0 / pix_cm, 1.0])
+	
+	calibration.save(file_name or default.calibration_file)
+	print 'Reprojection error = ' + str(error) + ' pixels'
+	return calibration
+
+# This module reads the cameras file of multi_camera (JSON):
+#	{"merge_radius": 50, "cameras": [{"source": 0,
+#	"thresholds": "vals0.txt", "homography": [[...], [...], [...]]}, ...]}
+# The source is a camera number or a recorded video (or image folder).
+# Instead of the homography, "points": {"image": [[column, row], ...],
+# "arena": [[x, y], ...]} (4 or more) can be given to compute it, or
+# "calibration": a calibration file (see calibrate) whose floor is the
+# arena. Without any of them, image and arena coordinates are the same.
+def load_cameras(file_name):
+	with open(file_name) as f:
+		config = json.load(f)
+	default.merge_radius = config.get('merge_radius', default.merge_radius)
+	cameras = config['cameras']
+	for camera in cameras:
+		if not isinstance(camera['source'], int):
+			camera['source'] = str(camera['source'])
+		camera['thresholds'] = str(camera.get('thresholds', default.file_name))
+		if 'calibration' in camera:
+			camera['calibration'] = camera_calibration(str(camera['calibration']))
+		elif 'homography' in camera:
+			camera['calibration'] = camera_calibration( \
+			homography=camera['homography'])
+		elif 'points' in camera:
+			camera['calibration'] = camera_calibration(homography= \
+			cv2.findHomography(np.array(camera['points']['image'], np.float64), \
+			np.array(camera['points']['arena'], np.float64))[0])
+		else:
+			camera['calibration'] = camera_calibration()
+	return cameras
+
+# This module gives the frames of a camera (number) while running is set,
+# or of a recorded video or image folder (see replay_frames)
+def camera_frames(source, running):
+	if not isinstance(source, int):
+		for img in replay_frames(source):
+			yield img
+		return
+	cap = frame_grabber(source)
+	while running.is_set():
+		ret, img = cap.read()
+		if ret:
+			yield img
+	cap.release()
+
+# This module gives the floor poses of the robots found by a camera
+# (number, see camera_calibration.locate) as [camera, color code, x, y,
+# orientation, yellow found, pixels]
+def arena_poses(number, colors):
+	poses = []
+	for x in range(len(colors)):
+		if colors[x]._pix_number > 0:
+			poses.append([number, robot_color_code(x), colors[x]._floor[0], \
+			colors[x]._floor[1], colors[x]._floor_orientation, \
+			colors[x]._correspondence >= 0, colors[x]._pix_number])
+	return poses
+
+# This module is the process of a camera of multi_camera. It runs the
+# detection with the thresholds of the camera and puts the arena poses of
+# every frame in the results queue; a frame number None means the camera
+# has no more frames.
+def camera_worker(number, camera, results, running):
+	signal.signal(signal.SIGINT, signal.SIG_IGN)	# Quitting is for the main one
+	thr_cache = threshold_cache(camera['thresholds'])
+	state = detection_state()
+	frame = 0
+	for img in camera_frames(camera['source'], running):
+		if not running.is_set():
+			break
+		colors, yellow_colors = detect_frame(img, thr_cache.check(), state)[:2]
+		camera['calibration'].locate(colors, yellow_colors, img.shape)
+		results.put((number, frame, time.time(), arena_poses(number, colors)))
+		frame += 1
+	state.close()
+	results.put((number, None, time.time(), []))
+
+# This module tracks the robots of an arena seen by several cameras (see
+# load_cameras). Each camera is detected on its own process; this one
+# merges their poses (camera_merger). Frames of recorded videos are merged
+# in order (the same frame of every video); of live cameras, the newest
+# one of each camera. The poses of the arena are written to a CSV file
+# (and sent as in replay). It stops when a camera has no more frames
+# (after merging the ones it gave).
+def multi_camera(file_name, output_name, max_frames=0):
+	cameras = load_cameras(file_name)
+	live = any(isinstance(camera['source'], int) for camera in cameras)
+	results = Queue(default.camera_queue * len(cameras))
+	running = Event()
+	running.set()
+	workers = []
+	for number in range(len(cameras)):
+		worker = Process(target=camera_worker, args=(number, cameras[number], \
+		results, running))
+		worker.daemon = True
+		worker.start()
+		workers.append(worker)
+	
+	hook = quit_hook()
+	merger = camera_merger()
+	names = [name[:-3] for name in robot_names()]
+	pending = [deque() for camera in cameras]
+	ended = []	# Cameras without more frames
+	publisher = None
+	if default.udp_address:
+		publisher = pose_publisher(default.udp_address)
+	table = None
+	if default.pose_table:
+		table = pose_table(default.pose_table, merger._bot_num)
+	log = None
+	if default.trajectory_log:
+		log = trajectory_log(default.trajectory_log, merger._bot_num)
+	
+	frame, start = 0, time.time()
+	with open(output_name, 'w') as output:
+		output.write('frame,robot,x,y,orientation,correspondence,pixels,' + \
+		'camera\n')
+		while not hook._quit and (max_frames == 0 or frame < max_frames) \
+		and all([len(pending[n]) > 0 for n in ended]):
+			try:
+				number, camera_frame, stamp, poses = results.get(True, \
+				default.grab_timeout)
+			except Empty:
+				continue
+			if camera_frame is None:
+				ended.append(number)
+				continue
+			pending[number].append((stamp, poses))
+			if min([len(p) for p in pending]) == 0:
+				continue
+			
+			# One frame of each camera
+			detections, frame_time = [], 0
+			for p in pending:
+				stamp, poses = p[-1] if live else p[0]
+				if live:
+					p.clear()
+				else:
+					p.popleft()
+				detections += poses
+				frame_time = max(frame_time, stamp)
+			robots = merger.merge(detections)
+			
+			for x in range(len(robots)):
+				output.write(','.join([str(frame), names[x], \
+				str(robots[x]._center_mass[0]), str(robots[x]._center_mass[1]), \
+				str(robots[x]._orientation), str(robots[x]._correspondence), \
+				str(robots[x]._pix_number), str(merger._cameras[x])]) + '\n')
+			if publisher is not None:
+				publisher.publish(frame, frame_time, robots)
+			if table is not None:
+				table.write(frame, frame_time, robots)
+			if log is not None:
+				log.append(frame, frame_time, robots)
+			frame += 1
+	elapsed = time.time() - start
+	
+	# Stopping the cameras (they may be waiting for room in the queue)
+	running.clear()
+	for worker in workers:
+		while worker.is_alive():
+			try:
+				results.get(True, 0.05)
+			except Empty:
+				pass
+		worker.join()
+	hook.close()
+	if publisher is not None:
+		publisher.close()
+	if table is not None:
+		table.close()
+	if log is not None:
+		log.close()
+	
+	print 'Cameras = ' + str(len(cameras)) + ', frames = ' + str(frame)
+	print 'Frames per second = ' + str(frame / max(elapsed, 1e-9))
+	print 'Duplicates merged = ' + str(merger._duplicates)
+
 # Main function
 if __name__ == "__main__":
 	
+	# Command line options. Without --replay, --cameras, --detect,
+	# --subscribe or --calibrate the master control is shown.
+	parser = argparse.ArgumentParser(description='Robot Tracker')
+	parser.add_argument('--replay', metavar='SOURCE',
+	help='run the detection without GUI on a video file or image folder')
+	parser.add_argument('--output', default='poses.csv',
+	help='CSV file for the poses of --replay and --cameras')
+	parser.add_argument('--max-frames', type=int, default=0,
+	help='stop --replay or --cameras after this number of frames')
+	parser.add_argument('--cameras', metavar='FILE',
+	help='track the arena with the cameras of this JSON file')
+	parser.add_argument('--calibrate', metavar='SOURCE',
+	help='calibrate the camera with a video or folder of chessboard images')
+	parser.add_argument('--floor', metavar='IMAGE',
+	help='image of the chessboard on the floor (--calibrate)')
+	parser.add_argument('--board', default='%dx%d' % default.board,
+	help='inner corners of the chessboard, columns x rows (--calibrate)')
+	parser.add_argument('--square', type=float, default=default.board_square,
+	help='size of the chessboard squares in cm (--calibrate)')
+	parser.add_argument('--calibration', metavar='FILE',
+	help='calibration file: written by --calibrate, gives floor poses (cm)')
+	parser.add_argument('--tune', metavar='SOURCE',
+	help='adjust the thresholds on frames of a video or a folder of images')
+	parser.add_argument('--freeze', type=int, default=default.freeze_frames,
+	help='frames kept when freezing the threshold adjustment (clip)')
+	parser.add_argument('--multiple', type=float, default=default.multiple,
+	help='size of processing image from original')
+	parser.add_argument('--deadline', type=float, metavar='MS',
+	help='lower the processing size while frames take longer than this')
+	parser.add_argument('--tracking', action='store_true',
+	help='process only windows around the predicted robot positions')
+	parser.add_argument('--pyramid', action='store_true',
+	help='find robots on the processing image, measure them on the original')
+	parser.add_argument('--match-factor', type=float,
+	default=default.match_factor, help='max. distance of a yellow to its '
+	'robot, in radii of the robot body')
+	parser.add_argument('--exec-mode', choices=['serial', 'pool'],
+	default=default.exec_mode, help='execution mode of the detection (pool: '
+	'segmentation on several processes, for machines with several cores)')
+	parser.add_argument('--robots', metavar='COLORS',
+	help='N robot mode, body color of each robot (e.g. red,red,green)')
+	parser.add_argument('--detect', action='store_true',
+	help='run the detection on the camera without the master control')
+	parser.add_argument('--display', choices=['window', 'thread', 'off'],
+	default=default.display, help='how the results are shown')
+	parser.add_argument('--display-rate', type=float,
+	default=default.display_rate, help='results shown per second (thread)')
+	parser.add_argument('--serial', metavar='PORTS',
+	help='serial port of each robot, e.g. /dev/rfcomm0,,/dev/rfcomm2')
+	parser.add_argument('--udp', metavar='HOST:PORT',
+	help='send the poses of every frame to this UDP address')
+	parser.add_argument('--subscribe', metavar='HOST:PORT',
+	help='print the poses sent to this UDP address')
+	parser.add_argument('--pose-table', metavar='FILE',
+	help='keep the poses of the last frame in this memory mapped file')
+	parser.add_argument('--log', metavar='FILE',
+	help='append the poses of every frame to this binary file')
+	parser.add_argument('--metrics', metavar='FILE',
+	help='write the stage times to FILE (.csv, .json or Prometheus text)')
+	parser.add_argument('--metrics-period', type=float,
+	default=default.metrics_period, help='seconds between metrics writes')
+	args = parser.parse_args()
+	
+	default.multiple = args.multiple
+	default.deadline = args.deadline
+	default.board = tuple(int(v) for v in args.board.split('x'))
+	default.board_square = args.square
+	default.freeze_frames = max(args.freeze, 1)
+	default.tracking = default.tracking or args.tracking
+	default.pyramid = default.pyramid or args.pyramid
+	default.exec_mode = args.exec_mode
+	default.match_factor = args.match_factor
+	default.metrics_file = args.metrics
+	default.metrics_period = args.metrics_period
+	default.display = args.display
+	default.udp_address = args.udp
+	default.pose_table = args.pose_table
+	default.trajectory_log = args.log
+	if args.serial:
+		default.serial_ports = [port or None for port in args.serial.split(',')]
+	default.display_rate = args.display_rate
+	if args.robots:
+		default.multi_robot = True
+		default.robot_colors = args.robots.split(',')
+	
+	if args.subscribe:
+		subscribe(args.subscribe)
+		sys.exit(0)
+	if args.calibrate:
+		calibrate(args.calibrate, args.floor, args.calibration)
+		sys.exit(0)
+	default.calibration = args.calibration
+	if args.replay:
+		replay(args.replay, args.output, args.max_frames)
+		sys.exit(0)
+	if args.cameras:
+		multi_camera(args.cameras, args.output, args.max_frames)
+		sys.exit(0)
+	if args.tune:
+		thres_adj(args.tune)
+		sys.exit(0)
+	if args.detect:
+		robot_detection()
+		sys.exit(0)
+	
 	master = Tk() # Creating master control
 	#msg = Message(master, text = "Author: Rolando Morales")
 	#msg.config(aspect=300,font=('times', 12, 'italic'))